@@ -205,6 +205,15 @@ def create_app():
     def home():
         return redirect(url_for("auth.login"))
 
+    # Compteurs par entité : table créée au démarrage, l'écouteur de flush
+    # (Code/models/entity_stats.py) n'a pas à vérifier son existence
+    from Code.models.entity_stats import ensure_entity_stats_schema
+    with app.app_context():
+        try:
+            ensure_entity_stats_schema()
+        except Exception as e:
+            print(f"[APP] ⚠️ Table entity_stats non créée au démarrage: {e}")
+
     # Fermer proprement les connexions après chaque requête
     @app.teardown_appcontext
     def shutdown_session(exception=None):
@@ -12,3 +12,9 @@ from .models import (
     activity_roles,
     task_roles
 )
+
+# Maintien des compteurs entity_stats (événements de session)
+from . import entity_stats  # noqa: E402,F401
+
+# Invalidation des profils de compétences (événements de session)
+from . import user_profiles  # noqa: E402,F401
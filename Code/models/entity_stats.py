@@ -0,0 +1,243 @@
+# Code/models/entity_stats.py
+"""
+Compteurs matérialisés par entité (table entity_stats).
+
+- Insertions / suppressions ORM d'activités, rôles, utilisateurs, outils et
+  liens : compteurs ajustés dans la même transaction (événement after_flush).
+- Écritures groupées hors ORM (INSERT Core de reconcile_activities,
+  Query.delete()...) : non vues par les événements ; la synchronisation de
+  cartographie recompte son entité (record_entity_sync) et
+  Code/scripts/rebuild_entity_stats.py recalcule tout en cas de dérive.
+- Entité sans ligne de stats : ligne créée à la première lecture
+  (entities_with_stats), à partir de vrais COUNT.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import bindparam, event, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from Code.extensions import db
+from Code.models.models import Activities, Entity, EntityStats, Link, Role, Tool, User
+
+
+# Modèle compté -> colonne de entity_stats
+COUNTED_MODELS = {
+    Activities: "activities_count",
+    Role: "roles_count",
+    User: "users_count",
+    Tool: "tools_count",
+    Link: "links_count",
+}
+
+_BATCH_SIZE = 500
+
+# Vrai une fois la table créée / vérifiée (au démarrage de l'application, cf. Code/app.py)
+_schema_ready = False
+# Process sans ensure_entity_stats_schema() (scripts) : existence vérifiée une
+# seule fois, au premier flush concerné (None : pas encore vérifiée)
+_table_seen = None
+
+
+def ensure_entity_stats_schema():
+    """Crée la table entity_stats si elle n'existe pas (idempotent)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    EntityStats.__table__.create(db.engine, checkfirst=True)
+    _schema_ready = True
+
+
+def _stats_table_exists(connection):
+    global _table_seen
+    if _schema_ready:
+        return True
+    if _table_seen is None:
+        _table_seen = inspect(connection).has_table(EntityStats.__tablename__)
+    return _table_seen
+
+
+# ============================================================
+# MAINTENANCE PAR ÉVÉNEMENTS DE SESSION
+# ============================================================
+def _entity_id_of(obj):
+    # Valeur déjà chargée uniquement : relire un objet supprimé échouerait
+    value = inspect(obj).attrs.entity_id.loaded_value
+    return value if isinstance(value, int) else None
+
+
+@event.listens_for(Session, "after_flush")
+def _track_entity_counts(session, flush_context):
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for obj in session.new:
+        column = COUNTED_MODELS.get(type(obj))
+        if column and obj.entity_id is not None:
+            deltas[obj.entity_id][column] += 1
+
+    for obj in session.deleted:
+        column = COUNTED_MODELS.get(type(obj))
+        entity_id = _entity_id_of(obj) if column else None
+        if entity_id is not None:
+            deltas[entity_id][column] -= 1
+
+    # Objet déplacé d'une entité à l'autre
+    for obj in session.dirty:
+        column = COUNTED_MODELS.get(type(obj))
+        if not column or obj in session.new:
+            continue
+        history = inspect(obj).attrs.entity_id.history
+        if not history.has_changes():
+            continue
+        for old_id in history.deleted:
+            if old_id is not None:
+                deltas[old_id][column] -= 1
+        for new_id in history.added:
+            if new_id is not None:
+                deltas[new_id][column] += 1
+
+    if not deltas:
+        return
+
+    connection = session.connection()
+    if not _stats_table_exists(connection):
+        return
+
+    table = EntityStats.__table__
+    now = datetime.utcnow()
+    for entity_id, columns in deltas.items():
+        values = {column: table.c[column] + delta for column, delta in columns.items() if delta}
+        if not values:
+            continue
+        # Pas de ligne : elle sera créée (avec de vrais COUNT) à la première lecture
+        connection.execute(
+            update(table).where(table.c.entity_id == entity_id).values(updated_at=now, **values)
+        )
+
+
+# ============================================================
+# RECALCUL / LECTURE
+# ============================================================
+def _count_rows(entity_ids):
+    """entity_id -> {colonne: nombre} par COUNT groupés (un par modèle et lot de 500)."""
+    counts = {entity_id: dict.fromkeys(COUNTED_MODELS.values(), 0) for entity_id in entity_ids}
+    for model, column in COUNTED_MODELS.items():
+        for i in range(0, len(entity_ids), _BATCH_SIZE):
+            rows = db.session.execute(
+                select(model.entity_id, func.count())
+                .where(model.entity_id.in_(entity_ids[i:i + _BATCH_SIZE]))
+                .group_by(model.entity_id)
+            )
+            for entity_id, count in rows:
+                counts[entity_id][column] = count
+    return counts
+
+
+def rebuild_entity_stats(entity_ids=None, sync_stats=None):
+    """
+    Recalcule les compteurs des entités données (toutes par défaut) et valide.
+    sync_stats : résultat de synchronisation à enregistrer comme dernière synchro.
+    Retourne le nombre d'entités recalculées.
+    """
+    ensure_entity_stats_schema()
+    if entity_ids is None:
+        entity_ids = list(db.session.scalars(select(Entity.id)))
+    entity_ids = sorted(set(entity_ids))
+    if not entity_ids:
+        return 0
+
+    counts = _count_rows(entity_ids)
+    existing = set()
+    for i in range(0, len(entity_ids), _BATCH_SIZE):
+        existing.update(db.session.scalars(
+            select(EntityStats.entity_id).where(EntityStats.entity_id.in_(entity_ids[i:i + _BATCH_SIZE]))
+        ))
+
+    now = datetime.utcnow()
+    sync_values = {}
+    if sync_stats is not None:
+        sync_values = {
+            "last_sync_at": now,
+            "last_sync_mode": "cached" if sync_stats.get("cached") else sync_stats.get("mode"),
+            "last_sync_total": sync_stats.get("total_in_svg"),
+            "last_sync_added": sync_stats.get("added"),
+            "last_sync_renamed": sync_stats.get("renamed"),
+            "last_sync_errors": len(sync_stats.get("errors") or []),
+        }
+
+    table = EntityStats.__table__
+    new_rows = [
+        dict(entity_id=entity_id, updated_at=now, **counts[entity_id], **sync_values)
+        for entity_id in entity_ids if entity_id not in existing
+    ]
+    update_rows = [
+        dict({f"b_{k}": v for k, v in counts[entity_id].items()}, b_entity_id=entity_id)
+        for entity_id in entity_ids if entity_id in existing
+    ]
+
+    try:
+        if new_rows:
+            db.session.execute(insert(table), new_rows)
+        if update_rows:
+            db.session.execute(
+                update(table)
+                .where(table.c.entity_id == bindparam("b_entity_id"))
+                .values(
+                    updated_at=now,
+                    **{column: bindparam(f"b_{column}") for column in COUNTED_MODELS.values()},
+                    **sync_values
+                ),
+                update_rows
+            )
+        db.session.commit()
+    except IntegrityError:
+        # Ligne créée entre-temps par une autre requête : ses compteurs sont justes
+        db.session.rollback()
+    return len(entity_ids)
+
+
+def entities_with_stats(*criteria):
+    """
+    [(Entity, EntityStats)] en UNE requête (jointure externe), triées par nom.
+    Les lignes de stats manquantes sont créées puis la requête relancée.
+    """
+    ensure_entity_stats_schema()
+    statement = (
+        select(Entity, EntityStats)
+        .outerjoin(EntityStats, EntityStats.entity_id == Entity.id)
+        .where(*criteria)
+        .order_by(Entity.name)
+    )
+    rows = db.session.execute(statement).all()
+    missing = [entity.id for entity, stats in rows if stats is None]
+    if missing:
+        rebuild_entity_stats(missing)
+        rows = db.session.execute(statement).all()
+    return rows
+
+
+def record_entity_sync(entity_id, sync_stats):
+    """Après une synchronisation de cartographie : recompte l'entité et note la synchro."""
+    try:
+        rebuild_entity_stats([entity_id], sync_stats=sync_stats)
+    except Exception as e:
+        db.session.rollback()
+        print(f"[STATS] ⚠️ Statistiques non mises à jour (entity_id={entity_id}): {e}")
+
+
+def stats_payload(stats):
+    """Champs JSON exposés par les API d'entités (zéros si pas de ligne)."""
+    if stats is None:
+        return dict({column: 0 for column in COUNTED_MODELS.values()}, last_sync=None)
+    return {
+        **{column: getattr(stats, column) for column in COUNTED_MODELS.values()},
+        "last_sync": {
+            "at": stats.last_sync_at.isoformat(timespec="seconds") if stats.last_sync_at else None,
+            "mode": stats.last_sync_mode,
+            "total_in_svg": stats.last_sync_total,
+            "added": stats.last_sync_added,
+            "renamed": stats.last_sync_renamed,
+            "errors": stats.last_sync_errors,
+        } if stats.last_sync_at else None,
+    }
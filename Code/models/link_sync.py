@@ -0,0 +1,131 @@
+# Code/models/link_sync.py
+"""
+Réconciliation ensembliste des liens d'une entité (table links).
+
+Un lien est identifié par son contenu : (type, source, cible, description).
+Les liens voulus (connecteurs de la cartographie) sont comparés à ceux déjà
+en base :
+- lien inchangé : la ligne est gardée, son id aussi (les performances y
+  sont rattachées par performances.link_id) ;
+- lien nouveau : INSERT groupé ;
+- lien disparu (ou doublon d'un lien gardé) : DELETE groupé, performances
+  rattachées supprimées avec (ON DELETE CASCADE, non appliqué par SQLite).
+
+Les liens orphelins (source ou cible supprimée) partent en un seul DELETE
+avec anti-jointure (NOT EXISTS), sans charger les liens.
+"""
+from sqlalchemy import and_, delete, exists, insert, or_, select
+
+from Code.extensions import db
+from Code.models.models import Activities, Data, Link, Performance
+
+
+LINK_COLUMNS = ("type", "source_activity_id", "source_data_id", "target_activity_id", "target_data_id", "description")
+
+_BATCH_SIZE = 500
+
+
+def link_key(row):
+    """Identité d'un lien (dict ou ligne) : (type, source, cible, description)."""
+    if isinstance(row, dict):
+        return tuple(row.get(column) for column in LINK_COLUMNS)
+    return tuple(getattr(row, column) for column in LINK_COLUMNS)
+
+
+def _scoped(statement, entity_id):
+    links = Link.__table__
+    return statement if entity_id is None else statement.where(links.c.entity_id == entity_id)
+
+
+def delete_links(ids):
+    """DELETE groupé des liens ids et de leurs performances."""
+    links = Link.__table__
+    performances = Performance.__table__
+    for i in range(0, len(ids), _BATCH_SIZE):
+        batch = ids[i:i + _BATCH_SIZE]
+        db.session.execute(delete(performances).where(performances.c.link_id.in_(batch)))
+        db.session.execute(delete(links).where(links.c.id.in_(batch)))
+
+
+def delete_endpoint_links(activity_ids=(), data_ids=()):
+    """
+    Supprime les liens (et leurs performances) dont une extrémité va être
+    supprimée : à appeler avant le DELETE des activités / données (clés étrangères).
+    """
+    links = Link.__table__
+    activity_ids, data_ids = list(activity_ids), list(data_ids)
+    for ids, columns in ((activity_ids, (links.c.source_activity_id, links.c.target_activity_id)),
+                         (data_ids, (links.c.source_data_id, links.c.target_data_id))):
+        for i in range(0, len(ids), _BATCH_SIZE):
+            batch = ids[i:i + _BATCH_SIZE]
+            link_ids = db.session.scalars(select(links.c.id).where(or_(*(column.in_(batch) for column in columns)))).all()
+            delete_links(link_ids)
+
+
+def sync_entity_links(entity_id, rows):
+    """
+    Aligne les liens de l'entité sur rows (dicts des colonnes LINK_COLUMNS).
+    entity_id None : tous les liens de la table (import historique sans entité).
+    Ne commite pas. Retourne {"kept", "added", "removed"}.
+    """
+    links = Link.__table__
+    performances = Performance.__table__
+
+    wanted = {}
+    for row in rows:
+        wanted.setdefault(link_key(row), row)
+
+    # Un lien de même contenu en double : on garde celui qui porte une performance, sinon le plus ancien
+    existing = db.session.execute(
+        _scoped(
+            select(links.c.id, *(links.c[column] for column in LINK_COLUMNS), performances.c.id.label("performance_id"))
+            .outerjoin(performances, performances.c.link_id == links.c.id)
+            .order_by(performances.c.id.is_(None), links.c.id),
+            entity_id,
+        )
+    ).all()
+
+    kept = set()
+    removed_ids = []
+    for row in existing:
+        key = link_key(row)
+        if key in wanted and key not in kept:
+            kept.add(key)
+        else:
+            removed_ids.append(row.id)
+
+    new_rows = [
+        {"entity_id": entity_id, **{column: row.get(column) for column in LINK_COLUMNS}}
+        for key, row in wanted.items() if key not in kept
+    ]
+
+    delete_links(removed_ids)
+    if new_rows:
+        db.session.execute(insert(links), new_rows)
+
+    return {"kept": len(kept), "added": len(new_rows), "removed": len(removed_ids)}
+
+
+def delete_orphan_links(entity_id=None):
+    """
+    Supprime en une requête les liens dont une extrémité n'existe plus
+    (activité ou donnée supprimée). Ne commite pas. Retourne le nombre de liens supprimés.
+    """
+    links = Link.__table__
+    performances = Performance.__table__
+    acts = Activities.__table__
+    data = Data.__table__
+
+    def missing(column, table):
+        return and_(column.isnot(None), ~exists().where(table.c.id == column))
+
+    orphan = or_(
+        missing(links.c.source_activity_id, acts),
+        missing(links.c.source_data_id, data),
+        missing(links.c.target_activity_id, acts),
+        missing(links.c.target_data_id, data),
+    )
+    orphan_ids = _scoped(select(links.c.id).where(orphan), entity_id)
+
+    db.session.execute(delete(performances).where(performances.c.link_id.in_(orphan_ids)))
+    return db.session.execute(_scoped(delete(links).where(orphan), entity_id)).rowcount
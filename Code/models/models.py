@@ -150,6 +150,154 @@ class Entity(db.Model):
         return cls.query.order_by(cls.name)
 
 
+class EntityCartoState(db.Model):
+    """
+    Empreinte de la cartographie d'une entité.
+    - svg_hash    : SHA-256 du fichier carto.svg (sert aussi d'ETag)
+    - shapes_hash : SHA-256 de l'ensemble des formes extraites (shape_id, nom)
+    - sync_result : dernier résultat de synchronisation (JSON)
+    Permet de ne pas re-synchroniser une cartographie inchangée.
+    """
+    __tablename__ = 'entity_carto_state'
+
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), primary_key=True)
+    svg_hash = db.Column(db.String(64), nullable=True)
+    shapes_hash = db.Column(db.String(64), nullable=True)
+    sync_result = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class EntityStats(db.Model):
+    """
+    Compteurs matérialisés d'une entité (listes d'entités, diagnostic) :
+    tenus à jour par les événements de session (Code/models/entity_stats.py)
+    et recalculés à chaque synchronisation de cartographie.
+    """
+    __tablename__ = 'entity_stats'
+
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), primary_key=True)
+    activities_count = db.Column(db.Integer, nullable=False, default=0)
+    roles_count = db.Column(db.Integer, nullable=False, default=0)
+    users_count = db.Column(db.Integer, nullable=False, default=0)
+    tools_count = db.Column(db.Integer, nullable=False, default=0)
+    links_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # Dernière synchronisation de la cartographie
+    last_sync_at = db.Column(db.DateTime, nullable=True)
+    last_sync_mode = db.Column(db.String(20), nullable=True)
+    last_sync_total = db.Column(db.Integer, nullable=True)
+    last_sync_added = db.Column(db.Integer, nullable=True)
+    last_sync_renamed = db.Column(db.Integer, nullable=True)
+    last_sync_errors = db.Column(db.Integer, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CartoVersion(db.Model):
+    """
+    Index de l'historique des cartographies d'une entité (Code/routes/carto_history.py).
+    - content_hash : SHA-256 du SVG importé (un objet stocké par contenu distinct)
+    - base_hash    : contenu dont l'objet est un delta (None : copie complète)
+    - stored_bytes : octets ajoutés sur disque par cette version (0 si dédupliquée)
+    - stats        : résultat de synchronisation résumé (JSON)
+    """
+    __tablename__ = 'carto_versions'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False, index=True)
+    version = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    base_hash = db.Column(db.String(64), nullable=True)
+    codec = db.Column(db.String(10), nullable=False)
+    filename = db.Column(db.String(255), nullable=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    stored_bytes = db.Column(db.Integer, nullable=False, default=0)
+    stats = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('entity_id', 'version', name='uq_entity_carto_version'),
+    )
+
+
+class RomeCacheEntry(db.Model):
+    """
+    Réponse d'un appel à l'API ROME mise en cache (Code/routes/rome_cache.py).
+    - cache_key  : SHA-256 de l'endpoint et des paramètres
+    - payload    : réponse JSON compressée (zlib)
+    - fetched_at : date de l'appel réseau (fraîcheur, éviction des plus anciennes)
+    """
+    __tablename__ = 'rome_cache'
+
+    cache_key = db.Column(db.String(64), primary_key=True)
+    endpoint = db.Column(db.String(100), nullable=False)
+    params = db.Column(db.Text, nullable=True)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class UserCompetencyProfile(db.Model):
+    """
+    Profil de compétences précalculé d'un utilisateur (Code/models/user_profiles.py) :
+    libellés (rôles, activités, savoirs...) avec formes normalisées et tokens,
+    en JSON compressé (zlib). Supprimé dès qu'une de ses sources change.
+    """
+    __tablename__ = 'user_competency_profiles'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    labels_count = db.Column(db.Integer, nullable=False, default=0)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ProjectionResult(db.Model):
+    """
+    Résultat complet d'une projection métier (Code/routes/projection_results.py),
+    relu par la pagination et les réouvertures de la page tant qu'il reste valide.
+    - profile_hash   : empreinte du profil de compétences analysé
+    - source_version : source ROME (version du référentiel local ou API) et paramètres de matching
+    - payload        : {"full": [...], "partial": [...]} classés, JSON compressé (zlib)
+    """
+    __tablename__ = 'projection_results'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    mode = db.Column(db.String(20), primary_key=True)
+    profile_hash = db.Column(db.String(40), nullable=False)
+    source_version = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class RomeFiche(db.Model):
+    """
+    Fiche métier du référentiel ROME local (Code/routes/rome_referential.py).
+    - version : version / date de mise à jour de la fiche, sinon SHA-1 de son contenu
+    - payload : fiche JSON complète compressée (zlib), au format de /fiche-metier
+    """
+    __tablename__ = 'rome_fiches'
+
+    code = db.Column(db.String(10), primary_key=True)
+    libelle = db.Column(db.String(255), nullable=False, default="")
+    version = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    imported_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class RomeIndexTerm(db.Model):
+    """
+    Index inversé du référentiel ROME local : token normalisé → fiches.
+    weight : poids du token dans la fiche (libellé > appellations > compétences)
+    """
+    __tablename__ = 'rome_index'
+
+    token = db.Column(db.String(64), primary_key=True)
+    code = db.Column(db.String(10), db.ForeignKey('rome_fiches.code', ondelete='CASCADE'),
+                     primary_key=True, index=True)
+    weight = db.Column(db.Integer, nullable=False, default=1)
+
+
 # -------------------------------------------------------------------
 # Modèles principaux
 # -------------------------------------------------------------------
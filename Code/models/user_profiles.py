@@ -0,0 +1,264 @@
+# Code/models/user_profiles.py
+"""
+Profils de compétences précalculés (table user_competency_profiles), point
+de départ de la projection métier.
+
+- Construction : requêtes groupées (rôles, activités, puis une par type
+  d'élément : compétences, savoirs, savoir-faire, softskills, aptitudes) au
+  lieu du chargement paresseux activité par activité. Stocké en JSON
+  compressé : [[libellé, forme normalisée, tokens], ...].
+- Écritures ORM sur les sources (UserRole, Role, Activities et leurs
+  éléments, User supprimé) : profils concernés supprimés dans la même
+  transaction (événement after_flush).
+- Écritures hors ORM sur ces tables (SQL texte de roles.py, Query.delete(),
+  UPDATE / DELETE Core des imports) : non attribuables à un utilisateur,
+  tous les profils sont supprimés à la validation. Un INSERT d'activités ou
+  de rôles ne touche aucun profil et ne déclenche rien.
+- Profil absent : reconstruit à la première lecture.
+"""
+import hashlib
+import json
+import re
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import delete, event, insert, inspect, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from Code.extensions import db
+from Code.models.models import (
+    Activities, Aptitude, Competency, Role, Savoir, SavoirFaire, Softskill, User, UserCompetencyProfile,
+    UserRole, activity_roles,
+)
+
+
+# Éléments d'activité repris dans le profil -> colonne du libellé (ordre du profil)
+PROFILE_ITEM_MODELS = {
+    Competency: "description",
+    Savoir: "description",
+    SavoirFaire: "description",
+    Softskill: "habilete",
+    Aptitude: "description",
+}
+
+# Attributs dont la modification change un profil
+WATCHED_ATTRIBUTES = {
+    UserRole: ("user_id", "role_id"),
+    Role: ("name",),
+    Activities: ("name",),
+    **{model: (column, "activity_id") for model, column in PROFILE_ITEM_MODELS.items()},
+}
+
+# Tables sources : une écriture hors ORM sur l'une d'elles invalide tous les profils
+SOURCE_TABLES = {"user_roles", "activity_roles"} | {model.__tablename__ for model in WATCHED_ATTRIBUTES}
+# ... sauf un INSERT dans ces tables : une activité ou un rôle nouveau n'est
+# relié à aucun utilisateur tant que user_roles / activity_roles n'ont pas
+# changé (synchro de cartographie, import VSDX, application d'un plan)
+INSERT_NEUTRAL_TABLES = {Activities.__tablename__, Role.__tablename__}
+
+_DML_TABLE = re.compile(r"^\s*(insert\s+(?:or\s+\w+\s+)?into|update|delete\s+from)\s+[\"`]?(\w+)", re.I)
+_STALE_ALL_KEY = "user_profiles_stale"
+_BATCH_SIZE = 500
+ZLIB_LEVEL = 6
+
+_schema_ready = False
+_table_seen = False
+
+
+def ensure_user_profile_schema():
+    """Crée la table user_competency_profiles si elle n'existe pas (idempotent)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    UserCompetencyProfile.__table__.create(db.engine, checkfirst=True)
+    _schema_ready = True
+
+
+def _profiles_table_exists(connection):
+    global _table_seen
+    if not _table_seen:
+        _table_seen = inspect(connection).has_table(UserCompetencyProfile.__tablename__)
+    return _table_seen
+
+
+def _batches(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), _BATCH_SIZE):
+        yield ids[i:i + _BATCH_SIZE]
+
+
+# ============================================================
+# INVALIDATION PAR ÉVÉNEMENTS DE SESSION
+# ============================================================
+def _int_values(obj, attr):
+    """Valeurs actuelle et précédente d'un attribut entier (chargées uniquement)."""
+    history = inspect(obj).attrs[attr].history
+    return {value for value in chain(history.added, history.deleted, history.unchanged) if isinstance(value, int)}
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_changed_profiles(session, flush_context):
+    user_ids, role_ids, activity_ids = set(), set(), set()
+
+    for obj in chain(session.new, session.dirty, session.deleted):
+        model = type(obj)
+        attributes = WATCHED_ATTRIBUTES.get(model)
+        if attributes is None:
+            if model is User and obj in session.deleted:
+                user_ids |= _int_values(obj, "id")
+            continue
+        if obj not in session.new and obj not in session.deleted:
+            state = inspect(obj)
+            if not any(state.attrs[attr].history.has_changes() for attr in attributes):
+                continue
+        if model is UserRole:
+            user_ids |= _int_values(obj, "user_id")
+        elif model is Role:
+            role_ids |= _int_values(obj, "id")
+        elif model is Activities:
+            activity_ids |= _int_values(obj, "id")
+        else:
+            activity_ids |= _int_values(obj, "activity_id")
+
+    if not (user_ids or role_ids or activity_ids):
+        return
+    connection = session.connection()
+    if not _profiles_table_exists(connection):
+        return
+
+    table = UserCompetencyProfile.__table__
+    user_roles = UserRole.__table__
+    conditions = [table.c.user_id.in_(batch) for batch in _batches(user_ids)]
+    conditions += [
+        table.c.user_id.in_(select(user_roles.c.user_id).where(user_roles.c.role_id.in_(batch)))
+        for batch in _batches(role_ids)
+    ]
+    conditions += [
+        table.c.user_id.in_(
+            select(user_roles.c.user_id)
+            .join(activity_roles, activity_roles.c.role_id == user_roles.c.role_id)
+            .where(activity_roles.c.activity_id.in_(batch))
+        )
+        for batch in _batches(activity_ids)
+    ]
+    connection.execute(delete(table).where(or_(*conditions)))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _watch_bulk_writes(orm_execute_state):
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table_name = getattr(getattr(statement, "table", None), "name", None)
+        is_insert = orm_execute_state.is_insert
+    elif isinstance(statement, TextClause):
+        match = _DML_TABLE.match(statement.text)
+        if not match:
+            return
+        table_name = match.group(2).lower()
+        is_insert = match.group(1).lower().startswith("insert")
+    else:
+        return
+    if table_name in SOURCE_TABLES and not (is_insert and table_name in INSERT_NEUTRAL_TABLES):
+        orm_execute_state.session.info[_STALE_ALL_KEY] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _drop_all_profiles(session):
+    if session.info.pop(_STALE_ALL_KEY, False):
+        connection = session.connection()
+        if _profiles_table_exists(connection):
+            connection.execute(delete(UserCompetencyProfile.__table__))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bulk_writes(session):
+    session.info.pop(_STALE_ALL_KEY, None)
+
+
+# ============================================================
+# CONSTRUCTION / LECTURE
+# ============================================================
+def profile_labels(user_id):
+    """
+    Libellés de l'utilisateur : ses rôles, puis pour chaque activité de ces
+    rôles son nom et ses éléments (dans l'ordre de PROFILE_ITEM_MODELS), sans doublons.
+    """
+    roles = db.session.execute(
+        select(Role.id, Role.name)
+        .join(UserRole, UserRole.role_id == Role.id)
+        .where(UserRole.user_id == user_id)
+        .order_by(Role.id)
+    ).all()
+    labels = [name for _, name in roles]
+
+    role_ids = [role_id for role_id, _ in roles]
+    activities = []
+    for batch in _batches(role_ids):
+        activities += db.session.execute(
+            select(Activities.id, Activities.name)
+            .join(activity_roles, activity_roles.c.activity_id == Activities.id)
+            .where(activity_roles.c.role_id.in_(batch))
+        ).all()
+    activities = sorted(set(activities))
+
+    items = defaultdict(list)
+    for model, column in PROFILE_ITEM_MODELS.items():
+        for batch in _batches([activity_id for activity_id, _ in activities]):
+            for activity_id, label in db.session.execute(
+                select(model.activity_id, getattr(model, column))
+                .where(model.activity_id.in_(batch))
+                .order_by(model.id)
+            ):
+                items[activity_id].append(label)
+    for activity_id, name in activities:
+        labels.append(name)
+        labels.extend(items[activity_id])
+
+    return list(dict.fromkeys(label.strip() for label in labels if label and label.strip()))
+
+
+def profile_hash(profile):
+    """Empreinte (SHA-1) du contenu d'un profil."""
+    return hashlib.sha1(json.dumps(profile, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _load_profile(user_id):
+    payload = db.session.scalar(
+        select(UserCompetencyProfile.payload).where(UserCompetencyProfile.user_id == user_id)
+    )
+    return json.loads(zlib.decompress(payload).decode("utf-8")) if payload is not None else None
+
+
+def user_competency_profile(user_id):
+    """
+    Profil de l'utilisateur : [[libellé, forme normalisée, tokens], ...],
+    depuis la table, ou construit et enregistré s'il est absent.
+    """
+    ensure_user_profile_schema()
+    profile = _load_profile(user_id)
+    if profile is not None:
+        return profile
+
+    # Import différé : projection_metier importe les modèles
+    from Code.routes.projection_metier import _normalize, _tokenize
+
+    profile = [
+        [label, _normalize(label), list(dict.fromkeys(_tokenize(label)))]
+        for label in profile_labels(user_id)
+    ]
+    try:
+        db.session.execute(insert(UserCompetencyProfile).values(
+            user_id=user_id,
+            labels_count=len(profile),
+            payload=zlib.compress(json.dumps(profile, ensure_ascii=False).encode("utf-8"), ZLIB_LEVEL),
+            built_at=datetime.utcnow(),
+        ))
+        db.session.commit()
+    except IntegrityError:
+        # Profil enregistré entre-temps par une autre requête
+        db.session.rollback()
+    return profile
@@ -1,13 +1,19 @@
 from .activities_bp import activities_bp
 from flask import jsonify
 import os, io, contextlib, traceback
-from Code.scripts.extract_visio import process_visio_file, print_summary
+from Code.models.models import Entity
+from Code.scripts.extract_visio import import_vsdx, process_visio_file, print_summary
 
 @activities_bp.route('/update-cartography', methods=['GET'])
 def update_cartography():
     try:
         vsdx_path = os.path.join("Code", "example.vsdx")
-        process_visio_file(vsdx_path)
+        entity_id = Entity.get_active_id()
+        if entity_id:
+            # Import limité à l'entité active (pages lues en parallèle)
+            import_vsdx(vsdx_path, entity_id)
+        else:
+            process_visio_file(vsdx_path)
         summary_output = io.StringIO()
         with contextlib.redirect_stdout(summary_output):
             print_summary()
@@ -6,21 +6,43 @@ import os
 import shutil
 import datetime
 import re
+import json
+import hashlib
+import heapq
+import tempfile
 import xml.etree.ElementTree as ET
 
 from flask import (
     Blueprint,
+    current_app,
     render_template,
     request,
     jsonify,
     redirect,
-    url_for,
-    send_file
+    url_for
 )
 
-from sqlalchemy import or_
+from sqlalchemy import or_, select, insert, update, bindparam
 from Code.extensions import db
-from Code.models.models import Activities, Entity
+from Code.models.models import Activities, Entity, EntityCartoState, EntityStats
+from Code.models.entity_stats import entities_with_stats, ensure_entity_stats_schema, record_entity_sync, stats_payload
+from Code.routes.carto_assets import precompress_svg, send_svg
+from Code.routes.carto_jobs import enqueue_job, get_job, list_jobs, register_job_handler
+from Code.routes.carto_graph import extract_process_graph, graph_signature, reconcile_process_graph
+from Code.routes.carto_plan import apply_plan, build_plan, discard_plan, load_plan, new_plan_id, plan_source_path, save_plan
+from Code.routes.carto_history import delete_history, get_version, history_usage, list_versions, load_content, record_version
+from Code.routes.carto_slim import original_svg_path, slim_svg
+from Code.routes.carto_tiles import BACKDROP, build_tiles, load_manifest, tile_path, base_path
+from Code.routes.carto_shape_index import (
+    activities_db_state,
+    build_shape_index,
+    diff_shape_index,
+    delta_shape_ids,
+    load_shape_index,
+    save_shape_index,
+    clear_shape_index,
+    load_last_delta
+)
 
 
 # ============================================================
@@ -42,12 +64,84 @@ def get_entity_svg_path(entity_id):
     return os.path.join(ENTITIES_DIR, f"entity_{entity_id}", "carto.svg")
 
 
+def resolve_entity_svg_path(entity_id):
+    """SVG de l'entité, ou l'ancien SVG global en secours (None si aucun)."""
+    svg_path = get_entity_svg_path(entity_id)
+    if not os.path.exists(svg_path) and os.path.exists(OLD_SVG_PATH):
+        svg_path = OLD_SVG_PATH
+    return svg_path if os.path.exists(svg_path) else None
+
+
 def ensure_entity_dir(entity_id):
     entity_dir = os.path.join(ENTITIES_DIR, f"entity_{entity_id}")
     os.makedirs(entity_dir, exist_ok=True)
     return entity_dir
 
 
+# ============================================================
+# EMPREINTES DE CARTOGRAPHIE (hash de contenu)
+# ============================================================
+_carto_schema_ready = False
+
+# path -> ((mtime_ns, taille), sha256) : évite de re-hacher un fichier inchangé
+_file_hash_cache = {}
+
+
+def ensure_carto_schema():
+    """Crée la table entity_carto_state si elle n'existe pas (idempotent)."""
+    global _carto_schema_ready
+    if _carto_schema_ready:
+        return
+    EntityCartoState.__table__.create(db.engine, checkfirst=True)
+    _carto_schema_ready = True
+
+
+def file_sha256(path):
+    """SHA-256 d'un fichier, lu par blocs (pas de chargement complet en mémoire)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_file_hash(path):
+    """Hash du fichier, mémorisé tant que sa date de modification et sa taille ne changent pas."""
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _file_hash_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    digest = file_sha256(path)
+    _file_hash_cache[path] = (key, digest)
+    return digest
+
+
+def shapes_sha256(svg_activities):
+    """SHA-256 de l'ensemble des formes extraites, indépendant de leur ordre dans le SVG."""
+    digest = hashlib.sha256()
+    for shape_id, name in sorted((str(a["shape_id"]), a["name"]) for a in svg_activities):
+        digest.update(f"{shape_id}\x1f{name}\x1e".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_carto_state(entity_id):
+    """Retourne l'empreinte enregistrée pour l'entité (ou None)."""
+    ensure_carto_schema()
+    return EntityCartoState.query.filter_by(entity_id=entity_id).first()
+
+
+def _cached_sync_result(state):
+    if not state or not state.sync_result:
+        return None
+    try:
+        stats = json.loads(state.sync_result)
+    except ValueError:
+        return None
+    stats["cached"] = True
+    return stats
+
+
 # ============================================================
 # PAGE CARTOGRAPHIE
 # ============================================================
@@ -59,14 +153,21 @@ def activities_map_page():
     active_entity_id = session.get('active_entity_id')
     
     svg_exists = False
+    svg_version = None
     if active_entity:
-        svg_path = get_entity_svg_path(active_entity.id)
-        svg_exists = os.path.exists(svg_path)
-        if not svg_exists and os.path.exists(OLD_SVG_PATH):
+        svg_path = resolve_entity_svg_path(active_entity.id)
+        if svg_path:
             svg_exists = True
+            svg_version = get_file_hash(svg_path)
     
+    # Seules les colonnes utiles (liste + correspondance mID → activité),
+    # sans charger les objets Activities complets
     if active_entity:
-        rows = Activities.query.filter_by(entity_id=active_entity.id).order_by(Activities.id).all()
+        rows = db.session.execute(
+            select(Activities.id, Activities.name, Activities.shape_id)
+            .where(Activities.entity_id == active_entity.id)
+            .order_by(Activities.id)
+        ).all()
     else:
         rows = []
     
@@ -102,6 +203,7 @@ def activities_map_page():
     return render_template(
         "activities_map.html",
         svg_exists=svg_exists,
+        svg_version=svg_version,
         shape_activity_map=shape_activity_map,
         activities=rows,
         active_entity=active_entity_dict,
@@ -119,15 +221,91 @@ def serve_svg():
     if not active_entity:
         return jsonify({"error": "Aucune entité active"}), 404
     
-    svg_path = get_entity_svg_path(active_entity.id)
+    svg_path = resolve_entity_svg_path(active_entity.id)
     
-    if not os.path.exists(svg_path) and os.path.exists(OLD_SVG_PATH):
-        svg_path = OLD_SVG_PATH
-    
-    if not os.path.exists(svg_path):
+    if not svg_path:
         return jsonify({"error": "SVG non trouvé"}), 404
     
-    return send_file(svg_path, mimetype='image/svg+xml')
+    # Variante gzip/brotli selon Accept-Encoding, ETag fort = hash du contenu,
+    # 304 sur If-None-Match / If-Modified-Since, cache long si ?v=<hash>
+    return send_svg(svg_path, get_file_hash(svg_path))
+
+
+# ============================================================
+# TUILES (cartographies très volumineuses)
+# ============================================================
+def _active_tiles():
+    """(entité active, dossier, version du SVG, manifeste) ou None si pas de tuiles à jour."""
+    active_entity = Entity.get_active()
+    if not active_entity:
+        return None
+    svg_path = resolve_entity_svg_path(active_entity.id)
+    if not svg_path:
+        return None
+    entity_dir = os.path.join(ENTITIES_DIR, f"entity_{active_entity.id}")
+    version = get_file_hash(svg_path)
+    manifest = load_manifest(entity_dir, version)
+    if manifest is None:
+        return None
+    return active_entity, entity_dir, version, manifest
+
+
+@activities_map_bp.route("/svg/tiles")
+def svg_tiles_manifest():
+    """
+    Manifeste des tuiles de l'entité active : niveaux, emprise de chaque tuile
+    et correspondance mID → activité des formes qu'elle contient.
+    404 si les tuiles ne sont pas (encore) générées : le front charge alors /svg.
+    """
+    tiles = _active_tiles()
+    if not tiles:
+        return jsonify({"error": "Tuiles non disponibles"}), 404
+    active_entity, _, _, manifest = tiles
+    
+    rows = db.session.execute(
+        select(Activities.shape_id, Activities.id)
+        .where(Activities.entity_id == active_entity.id, Activities.shape_id.isnot(None))
+    ).all()
+    shape_map = {str(shape_id): activity_id for shape_id, activity_id in rows}
+    
+    # Copie : le manifeste est mémorisé par carto_tiles
+    levels = [
+        dict(level, tiles={
+            key: dict(tile, activities={
+                mid: shape_map[mid] for mid in tile["shapes"] if mid in shape_map
+            })
+            for key, tile in level["tiles"].items()
+        })
+        for level in manifest["levels"]
+    ]
+    
+    response = jsonify(dict(manifest, levels=levels))
+    response.cache_control.no_cache = True
+    return response
+
+
+@activities_map_bp.route("/svg/tiles/base")
+def serve_svg_tile_base():
+    """Socle commun à toutes les tuiles : <svg> racine, styles et <defs>."""
+    tiles = _active_tiles()
+    if not tiles:
+        return jsonify({"error": "Tuiles non disponibles"}), 404
+    _, entity_dir, version, _ = tiles
+    return send_svg(base_path(entity_dir), version)
+
+
+@activities_map_bp.route("/svg/tiles/<int:z>/backdrop", defaults={"x": BACKDROP, "y": BACKDROP})
+@activities_map_bp.route("/svg/tiles/<int:z>/<int:x>/<int:y>")
+def serve_svg_tile(z, x, y):
+    """Fragment SVG de la tuile (x, y) au niveau de détail z (ou de son arrière-plan)."""
+    tiles = _active_tiles()
+    if not tiles:
+        return jsonify({"error": "Tuiles non disponibles"}), 404
+    _, entity_dir, version, _ = tiles
+    path = tile_path(entity_dir, z, x, y)
+    if not os.path.exists(path):
+        return jsonify({"error": "Tuile non trouvée"}), 404
+    return send_svg(path, version)
 
 
 # ============================================================
@@ -144,7 +322,8 @@ def list_entities():
         return jsonify([])  # Pas connecté = pas d'entités
     
     # STRICT: Seulement les entités de l'utilisateur
-    entities = Entity.query.filter_by(owner_id=user_id).order_by(Entity.name).all()
+    # Compteurs lus dans entity_stats (même requête, pas de COUNT par entité)
+    rows = entities_with_stats(Entity.owner_id == user_id)
     
     return jsonify([
         {
@@ -153,9 +332,9 @@ def list_entities():
             "description": e.description,
             "svg_filename": e.svg_filename,
             "is_active": (e.id == active_entity_id),
-            "activities_count": Activities.query.filter_by(entity_id=e.id).count()
+            **stats_payload(stats)
         }
-        for e in entities
+        for e, stats in rows
     ])
 
 
@@ -246,6 +425,11 @@ def delete_entity(entity_id):
     entity_name = entity.name
     
     try:
+        ensure_carto_schema()
+        ensure_entity_stats_schema()
+        EntityCartoState.query.filter_by(entity_id=entity_id).delete()
+        EntityStats.query.filter_by(entity_id=entity_id).delete()
+        delete_history(entity_id)
         db.session.delete(entity)
         db.session.commit()
         
@@ -305,7 +489,18 @@ def update_entity(entity_id):
 # EXTRACTION DES ACTIVITÉS DEPUIS LE SVG
 # ============================================================
 
-def extract_activities_from_svg(svg_path):
+SVG_NS = "http://www.w3.org/2000/svg"
+VISIO_NS = "http://schemas.microsoft.com/visio/2003/SVGExtensions/"
+
+# Fréquence des appels au callback de progression (en formes / lignes)
+PROGRESS_EVERY = 200
+
+_SVG_TEXT_TAG = f"{{{SVG_NS}}}text"
+_VISIO_MID_ATTR = f"{{{VISIO_NS}}}mID"
+_VISIO_LAYER_ATTR = f"{{{VISIO_NS}}}layerMember"
+
+
+def extract_activities_from_svg(svg_path, progress=None):
     """
     Parse un fichier SVG Visio et extrait les activités valides.
     
@@ -321,76 +516,109 @@ def extract_activities_from_svg(svg_path):
     - Layer 8: Cercles de retour (références)
     - Layer 9: Documents/Résultats (données)
     - Layer 10: Déclencheurs (flags)
+    
+    PERFORMANCE:
+    Lecture en flux (iterparse) en une seule passe : filtre du layer,
+    recherche du premier texte significatif et dédoublonnage se font
+    au fil des événements, et chaque sous-arbre est libéré dès qu'il
+    est traité. La mémoire reste constante quelle que soit la taille
+    du fichier (cartographies de plusieurs dizaines de Mo).
+    
+    progress : callback optionnel appelé avec shapes_parsed=<nb de formes
+    layer 1 lues> pendant la lecture (suivi des jobs d'import).
     """
     activities = []
     seen_names = set()
     
     print(f"[EXTRACT] Parsing SVG: {svg_path}")
     
+    # Pile des éléments ouverts (pour détacher chaque sous-arbre de son parent)
+    open_elems = []
+    # Formes layer 1 ouvertes : [ordre, shape_id, élément, (ordre_texte, texte) | None]
+    open_shapes = []
+    # Formes terminées en attente de publication (tas trié par ordre du document)
+    pending = []
+    # Ordre d'ouverture des <text> encore ouverts
+    open_texts = []
+    seq = 0
+    shapes_parsed = 0
+    
+    def publish(shape_id, text_content):
+        # Si pas de texte, ignorer
+        if not text_content:
+            return
+        # Ignorer les textes trop longs (descriptions)
+        if len(text_content) > 80:
+            return
+        # Éviter les doublons par nom
+        if text_content.lower() not in seen_names:
+            seen_names.add(text_content.lower())
+            activities.append({
+                "shape_id": shape_id,
+                "name": text_content
+            })
+            print(f"[EXTRACT] ✓ Activité: shape_id={shape_id}, name={text_content}")
+    
     try:
-        tree = ET.parse(svg_path)
-        root = tree.getroot()
-        
-        # Namespaces
-        SVG_NS = "http://www.w3.org/2000/svg"
-        VISIO_NS = "http://schemas.microsoft.com/visio/2003/SVGExtensions/"
-        
-        # Chercher tous les éléments avec v:mID
-        for elem in root.iter():
-            mid = elem.get(f"{{{VISIO_NS}}}mID")
-            if not mid:
+        for event, elem in ET.iterparse(svg_path, events=("start", "end")):
+            if event == "start":
+                seq += 1
+                open_elems.append(elem)
+                if elem.tag == _SVG_TEXT_TAG:
+                    open_texts.append(seq)
+                mid = elem.get(_VISIO_MID_ATTR)
+                # FILTRE PRINCIPAL: Seulement le layer 1 (activités principales)
+                if mid and elem.get(_VISIO_LAYER_ATTR, "") == "1":
+                    open_shapes.append([seq, mid, elem, None])
+                    shapes_parsed += 1
+                    if progress and shapes_parsed % PROGRESS_EVERY == 0:
+                        progress(shapes_parsed=shapes_parsed)
                 continue
             
-            # FILTRE PRINCIPAL: Seulement le layer 1 (activités principales)
-            layer = elem.get(f"{{{VISIO_NS}}}layerMember", "")
-            if layer != "1":
-                continue
+            open_elems.pop()
             
-            # Chercher le TEXTE à l'intérieur de l'élément
-            text_content = None
-            for text_elem in elem.iter(f"{{{SVG_NS}}}text"):
-                t = "".join(text_elem.itertext()).strip()
+            if elem.tag == _SVG_TEXT_TAG:
+                text_seq = open_texts.pop()
+                t = "".join(elem.itertext()).strip()
                 if t and len(t) > 2:
-                    text_content = t
-                    break  # Prendre le premier texte significatif
+                    # Premier texte significatif (ordre du document) de chaque forme ouverte
+                    for shape in open_shapes:
+                        if shape[3] is None or text_seq < shape[3][0]:
+                            shape[3] = (text_seq, t)
             
-            # Si pas de texte, ignorer
-            if not text_content:
-                continue
+            if open_shapes and open_shapes[-1][2] is elem:
+                shape_seq, mid, _, found = open_shapes.pop()
+                heapq.heappush(pending, (shape_seq, mid, found[1] if found else None))
+                # Une forme imbriquée se termine avant la forme qui l'englobe :
+                # on publie dans l'ordre du document, comme root.iter().
+                first_open = open_shapes[0][0] if open_shapes else None
+                while pending and (first_open is None or pending[0][0] < first_open):
+                    _, pending_mid, pending_text = heapq.heappop(pending)
+                    publish(pending_mid, pending_text)
             
-            # Ignorer les textes trop longs (descriptions)
-            if len(text_content) > 80:
-                continue
-            
-            # Éviter les doublons par nom
-            if text_content.lower() not in seen_names:
-                seen_names.add(text_content.lower())
-                activities.append({
-                    "shape_id": mid,
-                    "name": text_content
-                })
-                print(f"[EXTRACT] ✓ Activité: shape_id={mid}, name={text_content}")
+            # Libérer le sous-arbre (sauf à l'intérieur d'un <text> encore ouvert,
+            # dont le contenu est relu à sa fermeture)
+            if not open_texts:
+                elem.clear()
+                if open_elems:
+                    del open_elems[-1][-1]
         
+        if progress:
+            progress(shapes_parsed=shapes_parsed)
         print(f"[EXTRACT] Total activités extraites: {len(activities)}")
         
     except Exception as e:
         print(f"[EXTRACT] Erreur: {e}")
         import traceback
         traceback.print_exc()
+        # Comme avec un parse complet : un fichier invalide ne donne aucune activité
+        activities = []
     
     return activities
 
 
-def sync_activities_with_svg(entity_id, svg_path):
-    """
-    Synchronise INTELLIGEMMENT les activités en base avec celles du SVG.
-    
-    Logique basée sur le shape_id (identifiant unique Visio) :
-    - shape_id dans SVG mais pas en base → CRÉER
-    - shape_id existe en base avec nom différent → RENOMMER (garder les données)
-    - shape_id en base mais pas dans SVG → SIGNALER comme supprimé
-    """
-    stats = {
+def _new_sync_stats():
+    return {
         "added": 0,
         "renamed": 0,
         "unchanged": 0,
@@ -401,76 +629,285 @@ def sync_activities_with_svg(entity_id, svg_path):
         "deleted_list": [],      # Liste des activités potentiellement supprimées
         "errors": []
     }
+
+
+def sync_activities_with_svg(entity_id, svg_path, force=False, progress=None):
+    """
+    Synchronise INTELLIGEMMENT les activités en base avec celles du SVG.
     
+    Logique basée sur le shape_id (identifiant unique Visio) :
+    - shape_id dans SVG mais pas en base → CRÉER
+    - shape_id existe en base avec nom différent → RENOMMER (garder les données)
+    - shape_id en base mais pas dans SVG → SIGNALER comme supprimé
+    
+    Empreintes (EntityCartoState) :
+    - même fichier SVG (hash identique) → résultat précédent renvoyé sans parsing
+    - SVG différent mais mêmes formes → résultat précédent renvoyé sans diff en base
+    force=True ignore les empreintes et refait la synchronisation complète.
+    Le résultat contient "cached": True lorsqu'il provient de l'empreinte.
+    
+    Synchronisation incrémentale (carto_shape_index) :
+    l'index des formes de la dernière synchro réussie est comparé à la
+    nouvelle extraction ; seules les formes ajoutées / renommées / supprimées
+    sont confrontées à la base (stats["mode"] = "delta"). Sans index, ou
+    avec force=True, la synchro est complète (stats["mode"] = "full").
+    Si les activités en base ont changé depuis la dernière synchro sans
+    passer par elle (renommage dans l'interface, import VSDX, plan appliqué),
+    l'index et les empreintes sont ignorés : synchro complète, qui
+    réaligne la base même pour un SVG identique.
+    Le delta est renvoyé dans stats["delta"] (nombres) et consultable via
+    /activities/api/carto/delta.
+    
+    Graphe de processus (carto_graph) : la même lecture du SVG donne aussi
+    les résultats (calque 6, activités is_result), les retours et connecteurs
+    (Data) et les liens entre formes, écrits en bloc après les activités
+    (stats["graph"]).
+    
+    progress : callback optionnel (shapes_parsed=..., rows_written=...).
+    """
     print(f"[SYNC] Démarrage pour entity_id={entity_id}")
     
-    svg_activities = extract_activities_from_svg(svg_path)
+    entity_dir = ensure_entity_dir(entity_id)
+    saved_index = load_shape_index(entity_dir)
+    if saved_index is not None and saved_index["db_state"] != _activities_db_state(entity_id):
+        print("[SYNC] Activités modifiées en base depuis la dernière synchro, synchronisation complète")
+        force = True
+    
+    state = get_carto_state(entity_id)
+    svg_hash = get_file_hash(svg_path)
+    cached = None if force else _cached_sync_result(state)
+    
+    if cached is not None and state.svg_hash == svg_hash:
+        print(f"[SYNC] SVG inchangé (sha256={svg_hash[:12]}…), résultat précédent renvoyé")
+        record_entity_sync(entity_id, cached)
+        return cached
+    
+    # Une seule lecture pour tous les calques : activités (1), résultats (6),
+    # retours (8) et connecteurs (9, 10)
+    graph = extract_process_graph(svg_path, progress=progress)
+    svg_activities = graph["activities"] + graph["results"]
+    shapes_hash = shapes_sha256(svg_activities + graph_signature(graph))
+    
+    if cached is not None and state.shapes_hash == shapes_hash:
+        print(f"[SYNC] Formes inchangées (sha256={shapes_hash[:12]}…), résultat précédent renvoyé")
+        _save_carto_state(entity_id, svg_hash, shapes_hash)
+        record_entity_sync(entity_id, cached)
+        return cached
+    
+    stats = _new_sync_stats()
     stats["total_in_svg"] = len(svg_activities)
     
-    if not svg_activities:
+    new_index = build_shape_index(svg_activities)
+    old_index = saved_index["shapes"] if saved_index is not None else None
+    delta = diff_shape_index(old_index or {}, new_index)
+    
+    if old_index is not None and not force:
+        # Seules les formes du delta sont comparées à la base
+        scope = delta_shape_ids(delta)
+        stats["mode"] = "delta"
+        print(f"[SYNC] Delta: +{len(delta['added'])} ✏️{len(delta['changed'])} -{len(delta['removed'])} "
+              f"({delta['unchanged_count']} formes inchangées ignorées)")
+        if scope:
+            subset = [act for act in svg_activities if str(act["shape_id"]) in scope]
+            reconcile_activities(entity_id, subset, stats, progress=progress, scope=scope)
+        stats["unchanged"] += delta["unchanged_count"]
+    elif not svg_activities:
+        stats["mode"] = "full"
         print("[SYNC] Aucune activité extraite!")
-        return stats
+    else:
+        stats["mode"] = "full"
+        reconcile_activities(entity_id, svg_activities, stats, progress=progress)
+    
+    # Données et liens (après les activités : les liens pointent vers leurs id)
+    reconcile_process_graph(entity_id, graph, stats)
+    
+    stats["delta"] = {
+        "added": len(delta["added"]),
+        "changed": len(delta["changed"]),
+        "removed": len(delta["removed"]),
+        "unchanged": delta["unchanged_count"],
+    }
+    
+    # Une synchro en erreur n'est pas mémorisée : la suivante sera complète
+    if stats["errors"]:
+        _save_carto_state(entity_id, svg_hash, None, None)
+        clear_shape_index(entity_dir)
+    else:
+        _save_carto_state(entity_id, svg_hash, shapes_hash, stats)
+        save_shape_index(entity_dir, new_index, _activities_db_state(entity_id), delta)
+    
+    stats["cached"] = False
+    # INSERT groupés hors ORM : compteurs de l'entité recalculés ici
+    record_entity_sync(entity_id, stats)
+    return stats
+
+
+def _activities_db_state(entity_id):
+    """Nombre et empreinte des activités (shape_id, nom, résultat) de l'entité en base."""
+    table = Activities.__table__
+    rows = db.session.execute(
+        select(table.c.shape_id, table.c.name, table.c.is_result)
+        .where(table.c.entity_id == entity_id, table.c.shape_id.isnot(None))
+    ).all()
+    return activities_db_state(rows)
+
+
+def _save_carto_state(entity_id, svg_hash, shapes_hash, stats=False):
+    """
+    Enregistre l'empreinte de l'entité. stats=False conserve le résultat
+    de synchronisation déjà stocké.
+    """
+    try:
+        state = get_carto_state(entity_id)
+        if state is None:
+            state = EntityCartoState(entity_id=entity_id)
+            db.session.add(state)
+        state.svg_hash = svg_hash
+        state.shapes_hash = shapes_hash
+        if stats is not False:
+            state.sync_result = json.dumps(stats, ensure_ascii=False) if stats is not None else None
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"[SYNC] ⚠️ Empreinte non enregistrée: {e}")
+
+
+def reconcile_activities(entity_id, svg_activities, stats=None, progress=None, scope=None):
+    """
+    Applique le diff SVG ↔ base pour une entité, en UNE seule transaction.
+    
+    Le diff (ajouts / renommages / suppressions) est calculé en mémoire,
+    puis appliqué par un INSERT groupé et un UPDATE groupé (executemany).
+    Si une instruction groupée échoue, la transaction est annulée et
+    rejouée ligne par ligne, chaque ligne dans son propre SAVEPOINT :
+    les lignes en erreur sont signalées dans stats["errors"] sans bloquer
+    les autres.
+    progress : callback optionnel appelé avec rows_written=<nb de lignes écrites>.
+    scope : ensemble de shape_id à confronter à la base (synchro incrémentale).
+    Par défaut toutes les activités de l'entité sont comparées.
+    """
+    if stats is None:
+        stats = _new_sync_stats()
+        stats["total_in_svg"] = len(svg_activities)
     
     # Créer un dictionnaire shape_id -> name depuis le SVG
     svg_shape_map = {str(act["shape_id"]): act["name"] for act in svg_activities}
+    svg_activity_results = {str(act["shape_id"]): act.get("is_result", False) for act in svg_activities}
     svg_shape_ids = set(svg_shape_map.keys())
     
-    # Récupérer les activités existantes pour cette entité
-    existing_activities = Activities.query.filter_by(entity_id=entity_id).all()
-    existing_shape_map = {str(a.shape_id): a for a in existing_activities if a.shape_id}
+    # Récupérer les activités existantes pour cette entité (une seule requête,
+    # ou une requête par lot de shape_id en mode incrémental)
+    table = Activities.__table__
+    base_query = (
+        select(table.c.id, table.c.shape_id, table.c.name)
+        .where(table.c.entity_id == entity_id)
+    )
+    if scope is None:
+        existing_rows = db.session.execute(base_query).all()
+    else:
+        scope_ids = sorted(scope)
+        existing_rows = []
+        for i in range(0, len(scope_ids), 500):
+            existing_rows.extend(db.session.execute(
+                base_query.where(table.c.shape_id.in_(scope_ids[i:i + 500]))
+            ).all())
+    existing_shape_map = {str(r.shape_id): r for r in existing_rows if r.shape_id}
     existing_shape_ids = set(existing_shape_map.keys())
     
     print(f"[SYNC] SVG: {len(svg_shape_ids)} activités | Base: {len(existing_shape_ids)} activités")
     
     # === 1. NOUVELLES ACTIVITÉS (dans SVG mais pas en base) ===
-    new_shape_ids = svg_shape_ids - existing_shape_ids
-    for shape_id in new_shape_ids:
-        name = svg_shape_map[shape_id]
-        try:
-            new_activity = Activities(
-                entity_id=entity_id,
-                shape_id=shape_id,
-                name=name,
-                description="",
-                is_result=False,
-                duration_minutes=0,
-                delay_minutes=0
-            )
-            db.session.add(new_activity)
-            db.session.commit()
-            stats["added"] += 1
-            print(f"[SYNC] ✓ AJOUTÉ: {name} (shape_id={shape_id})")
-        except Exception as e:
-            db.session.rollback()
-            stats["skipped"] += 1
-            stats["errors"].append(f"{name}: {str(e)[:100]}")
-            print(f"[SYNC] ❌ ERREUR ajout '{name}': {e}")
+    new_rows = [
+        {
+            "entity_id": entity_id,
+            "shape_id": shape_id,
+            "name": svg_shape_map[shape_id],
+            "description": "",
+            "is_result": svg_activity_results.get(shape_id, False),
+            "duration_minutes": 0,
+            "delay_minutes": 0,
+        }
+        for shape_id in sorted(svg_shape_ids - existing_shape_ids)
+    ]
     
     # === 2. ACTIVITÉS EXISTANTES - vérifier les renommages ===
-    common_shape_ids = svg_shape_ids & existing_shape_ids
-    for shape_id in common_shape_ids:
-        svg_name = svg_shape_map[shape_id]
-        db_activity = existing_shape_map[shape_id]
-        
-        if db_activity.name != svg_name:
-            # Renommage détecté !
-            old_name = db_activity.name
-            db_activity.name = svg_name
-            try:
-                db.session.commit()
-                stats["renamed"] += 1
-                stats["renamed_list"].append({
-                    "old": old_name,
-                    "new": svg_name,
-                    "shape_id": shape_id
-                })
-                print(f"[SYNC] ✏️ RENOMMÉ: '{old_name}' → '{svg_name}'")
-            except Exception as e:
-                db.session.rollback()
-                print(f"[SYNC] ❌ ERREUR renommage: {e}")
+    rename_rows = []
+    for shape_id in sorted(svg_shape_ids & existing_shape_ids):
+        row = existing_shape_map[shape_id]
+        if row.name != svg_shape_map[shape_id]:
+            rename_rows.append({
+                "b_id": row.id,
+                "b_name": svg_shape_map[shape_id],
+                "old_name": row.name,
+                "shape_id": shape_id,
+            })
         else:
             stats["unchanged"] += 1
     
+    insert_stmt = insert(table)
+    rename_stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(name=bindparam("b_name"))
+    )
+    
+    added, renamed = [], []
+    try:
+        if new_rows:
+            db.session.execute(insert_stmt, new_rows)
+            if progress:
+                progress(rows_written=len(new_rows))
+        if rename_rows:
+            db.session.execute(rename_stmt, [_bind_values(r) for r in rename_rows])
+            if progress:
+                progress(rows_written=len(new_rows) + len(rename_rows))
+        db.session.commit()
+        added, renamed = new_rows, rename_rows
+    except Exception as e:
+        db.session.rollback()
+        print(f"[SYNC] ⚠️ Échec de l'écriture groupée, reprise ligne par ligne: {e}")
+        
+        for row in new_rows:
+            error = _execute_in_savepoint(insert_stmt, row)
+            if error is None:
+                added.append(row)
+            else:
+                stats["skipped"] += 1
+                stats["errors"].append(f"{row['name']}: {str(error)[:100]}")
+                print(f"[SYNC] ❌ ERREUR ajout '{row['name']}': {error}")
+        
+        for row in rename_rows:
+            error = _execute_in_savepoint(rename_stmt, _bind_values(row))
+            if error is None:
+                renamed.append(row)
+            else:
+                stats["errors"].append(f"{row['b_name']}: {str(error)[:100]}")
+                print(f"[SYNC] ❌ ERREUR renommage: {error}")
+        
+        if progress:
+            progress(rows_written=len(added) + len(renamed))
+        
+        try:
+            db.session.commit()
+        except Exception as commit_error:
+            db.session.rollback()
+            added, renamed = [], []
+            stats["errors"].append(f"commit: {str(commit_error)[:100]}")
+            print(f"[SYNC] ❌ ERREUR commit: {commit_error}")
+    
+    stats["added"] += len(added)
+    for row in added:
+        print(f"[SYNC] ✓ AJOUTÉ: {row['name']} (shape_id={row['shape_id']})")
+    
+    stats["renamed"] += len(renamed)
+    for row in renamed:
+        stats["renamed_list"].append({
+            "old": row["old_name"],
+            "new": row["b_name"],
+            "shape_id": row["shape_id"]
+        })
+        print(f"[SYNC] ✏️ RENOMMÉ: '{row['old_name']}' → '{row['b_name']}'")
+    
     # === 3. ACTIVITÉS SUPPRIMÉES (en base mais plus dans SVG) ===
     deleted_shape_ids = existing_shape_ids - svg_shape_ids
     for shape_id in deleted_shape_ids:
@@ -487,6 +924,24 @@ def sync_activities_with_svg(entity_id, svg_path):
     return stats
 
 
+def _bind_values(row):
+    """Ne garde que les paramètres liés (b_*) d'une ligne de renommage."""
+    return {k: v for k, v in row.items() if k.startswith("b_")}
+
+
+def _execute_in_savepoint(statement, params):
+    """
+    Exécute une seule ligne dans un SAVEPOINT.
+    En cas d'erreur, seul le savepoint est annulé et l'exception est retournée.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(statement, [params])
+        return None
+    except Exception as e:
+        return e
+
+
 # ============================================================
 # UPLOAD CARTOGRAPHIE
 # ============================================================
@@ -515,6 +970,8 @@ def upload_carto():
     
     print(f"[UPLOAD] Entité: {active_entity.name} (id={active_entity.id})")
     
+    from flask import session
+    
     try:
         entity_dir = ensure_entity_dir(active_entity.id)
         svg_path = os.path.join(entity_dir, "carto.svg")
@@ -525,14 +982,27 @@ def upload_carto():
         active_entity.svg_filename = "carto.svg"
         db.session.commit()
         
-        # Synchroniser les activités
-        sync_stats = sync_activities_with_svg(active_entity.id, svg_path)
+        # Compression + synchronisation en arrière-plan : la requête rend la main
+        # tout de suite, le front suit le job via /activities/api/jobs/<id>
+        job_id = enqueue_job(
+            current_app._get_current_object(),
+            "carto_sync",
+            active_entity.id,
+            {
+                "svg_path": svg_path,
+                "force": _force_requested(),
+                "slim": True,
+                "precompress": True,
+                "history": {"author_id": session.get('user_id'), "filename": file.filename}
+            }
+        )
         
         return jsonify({
-            "status": "ok",
-            "message": f"Cartographie mise à jour",
-            "sync": sync_stats
-        })
+            "status": "queued",
+            "message": "Cartographie reçue, synchronisation en cours",
+            "job_id": job_id,
+            "job_url": url_for("activities_map_bp.job_status", job_id=job_id)
+        }), 202
         
     except Exception as e:
         print(f"[UPLOAD] Erreur: {e}")
@@ -541,6 +1011,13 @@ def upload_carto():
         return jsonify({"error": str(e)}), 500
 
 
+def _force_requested():
+    """Paramètre force (query string, formulaire ou JSON) : ignore les empreintes."""
+    data = request.get_json(silent=True) or {}
+    raw = request.values.get("force", data.get("force", ""))
+    return str(raw).strip().lower() in ("1", "true", "oui", "yes")
+
+
 # ============================================================
 # RE-SYNCHRONISATION MANUELLE
 # ============================================================
@@ -561,14 +1038,360 @@ def resync_activities():
         return jsonify({"error": "SVG non trouvé"}), 404
     
     try:
-        sync_stats = sync_activities_with_svg(active_entity.id, svg_path)
+        job_id = enqueue_job(
+            current_app._get_current_object(),
+            "carto_sync",
+            active_entity.id,
+            {"svg_path": svg_path, "force": _force_requested(), "precompress": False}
+        )
         
         return jsonify({
-            "status": "ok",
-            "message": f"Re-synchronisation terminée",
-            "sync": sync_stats
-        })
+            "status": "queued",
+            "message": "Re-synchronisation en cours",
+            "job_id": job_id,
+            "job_url": url_for("activities_map_bp.job_status", job_id=job_id)
+        }), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ============================================================
+# JOBS D'ARRIÈRE-PLAN (upload / re-synchronisation)
+# ============================================================
+@register_job_handler("carto_sync")
+def run_carto_sync_job(entity_id, payload, progress):
+    """Exécuté par un worker de carto_jobs : allègement, compression puis synchronisation."""
+    svg_path = payload["svg_path"]
+    
+    # Allègement avant tout le reste : empreintes, index des formes et
+    # variantes compressées portent sur le SVG réellement servi
+    slim_stats = None
+    if payload.get("slim"):
+        progress(force_write=True, phase="slim")
+        slim_stats = slim_svg(svg_path)
+    
+    if payload.get("precompress"):
+        progress(force_write=True, phase="compress")
+        precompress_svg(svg_path)
+    
+    # Tuiles (re)générées si absentes ou d'une autre version du SVG
+    entity_dir = ensure_entity_dir(entity_id)
+    svg_version = get_file_hash(svg_path)
+    if load_manifest(entity_dir, svg_version) is None:
+        progress(force_write=True, phase="tiles")
+        build_tiles(svg_path, entity_dir, svg_version)
+    
+    progress(force_write=True, phase="sync", shapes_parsed=0, rows_written=0)
+    result = sync_activities_with_svg(
+        entity_id,
+        svg_path,
+        force=payload.get("force", False),
+        progress=progress
+    )
+    if slim_stats:
+        result["slim"] = slim_stats
+    
+    # Historique : le SVG importé tel quel (l'original quand il a été allégé)
+    history = payload.get("history")
+    if history is not None:
+        progress(force_write=True, phase="history")
+        source_path = original_svg_path(svg_path) if slim_stats else svg_path
+        try:
+            version = record_version(
+                entity_id,
+                source_path,
+                author_id=history.get("author_id"),
+                filename=history.get("filename"),
+                stats=_history_stats(result, history.get("restored_from"))
+            )
+            result["version"] = version.version
+        except Exception as e:
+            db.session.rollback()
+            print(f"[HISTORY] ⚠️ Version non enregistrée (entity_id={entity_id}): {e}")
+    return result
+
+
+def _history_stats(result, restored_from=None):
+    """Résumé de synchronisation conservé avec la version."""
+    stats = {
+        "mode": "cached" if result.get("cached") else result.get("mode"),
+        "total_in_svg": result.get("total_in_svg"),
+        "added": result.get("added"),
+        "renamed": result.get("renamed"),
+        "delta": result.get("delta"),
+    }
+    if restored_from is not None:
+        stats["restored_from"] = restored_from
+    return stats
+
+
+def _job_for_current_user(job_id):
+    """Retourne le job s'il concerne une entité de l'utilisateur connecté."""
+    from flask import session
+    
+    user_id = session.get('user_id')
+    job = get_job(job_id)
+    if not user_id or not job:
+        return None
+    if not Entity.query.filter_by(id=job["entity_id"], owner_id=user_id).first():
+        return None
+    return job
+
+
+@activities_map_bp.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """État d'un job : status, progress (shapes_parsed, rows_written), result (stats de synchro)."""
+    job = _job_for_current_user(job_id)
+    if not job:
+        return jsonify({"error": "Job non trouvé"}), 404
+    return jsonify(job)
+
+
+@activities_map_bp.route("/api/jobs", methods=["GET"])
+def jobs_list():
+    """Derniers jobs de l'entité active."""
+    active_entity = Entity.get_active()
+    if not active_entity:
+        return jsonify([])
+    return jsonify(list_jobs(active_entity.id))
+
+
+# ============================================================
+# DELTA DE LA DERNIÈRE SYNCHRONISATION (surlignage côté front)
+# ============================================================
+@activities_map_bp.route("/api/carto/delta", methods=["GET"])
+def carto_delta():
+    """
+    Formes ajoutées / renommées / supprimées lors de la dernière synchronisation
+    de l'entité active : {added: [...], changed: [...], removed: [...], unchanged_count, computed_at}.
+    """
+    active_entity = Entity.get_active()
+    if not active_entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+    
+    delta = load_last_delta(os.path.join(ENTITIES_DIR, f"entity_{active_entity.id}"))
+    if delta is None:
+        return jsonify({"added": [], "changed": [], "removed": [], "unchanged_count": 0, "computed_at": None})
+    return jsonify(delta)
+
+
+# ============================================================
+# IMPORT À BLANC (plan de modifications)
+# ============================================================
+@activities_map_bp.route("/api/carto/plan", methods=["POST"])
+def plan_carto_import():
+    """
+    Calcule, sans rien écrire en base, les modifications qu'apporterait
+    l'import du fichier envoyé (champ "file", .svg ou .vsdx) ou, sans
+    fichier, la re-synchronisation du SVG courant de l'entité active.
+    Le plan (JSON) est conservé pour /api/carto/plan/<plan_id>/apply.
+    """
+    active_entity = Entity.get_active()
+    if not active_entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+    
+    entity_dir = ensure_entity_dir(active_entity.id)
+    plan_id = new_plan_id()
+    file = request.files.get("file")
+    
+    if file is not None and file.filename:
+        source = os.path.splitext(file.filename.lower())[1].lstrip(".")
+        if source not in ("svg", "vsdx"):
+            return jsonify({"error": "Format SVG ou VSDX requis"}), 400
+        path = plan_source_path(entity_dir, plan_id, source)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file.save(path)
+        filename = file.filename
+    else:
+        path = resolve_entity_svg_path(active_entity.id)
+        if not path:
+            return jsonify({"error": "SVG non trouvé"}), 404
+        source, filename = "svg", None
+    
+    try:
+        plan = build_plan(active_entity.id, source, path, filename=filename, plan_id=plan_id)
+        save_plan(entity_dir, plan)
+        if source == "vsdx":
+            # Le VSDX n'est pas affiché : inutile de le garder pour l'application
+            os.remove(path)
+        return jsonify(plan)
+    except Exception as e:
+        db.session.rollback()
+        discard_plan(entity_dir, plan_id)
+        print(f"[PLAN] Erreur calcul du plan: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@activities_map_bp.route("/api/carto/plan/<plan_id>/apply", methods=["POST"])
+def apply_carto_plan(plan_id):
+    """
+    Applique un plan calculé par /api/carto/plan, en une transaction.
+    409 si l'entité a changé depuis (recalculer le plan). Un plan SVG
+    installe aussi le fichier comme cartographie courante (job carto_sync :
+    allègement, tuiles, historique ; la base est déjà à jour).
+    """
+    from flask import session
+    
+    active_entity = Entity.get_active()
+    if not active_entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+    
+    entity_dir = ensure_entity_dir(active_entity.id)
+    plan = load_plan(entity_dir, plan_id)
+    if plan is None or plan["entity_id"] != active_entity.id:
+        return jsonify({"error": "Plan non trouvé"}), 404
+    
+    try:
+        result = apply_plan(active_entity.id, plan)
+    except Exception as e:
+        print(f"[PLAN] Erreur application du plan {plan_id[:8]}: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+    if result["status"] == "stale":
+        return jsonify({
+            "error": "L'entité a changé depuis le calcul du plan, recalculez-le",
+            "status": "stale"
+        }), 409
+    
+    source_path = plan_source_path(entity_dir, plan_id, plan["source"])
+    if plan["source"] == "svg" and os.path.exists(source_path):
+        try:
+            svg_path = os.path.join(entity_dir, "carto.svg")
+            os.replace(source_path, svg_path)
+            active_entity.svg_filename = "carto.svg"
+            db.session.commit()
+            job_id = enqueue_job(
+                current_app._get_current_object(),
+                "carto_sync",
+                active_entity.id,
+                {
+                    "svg_path": svg_path,
+                    "force": False,
+                    "slim": True,
+                    "precompress": True,
+                    "history": {"author_id": session.get('user_id'), "filename": plan["filename"]}
+                }
+            )
+            result["job_id"] = job_id
+            result["job_url"] = url_for("activities_map_bp.job_status", job_id=job_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"[PLAN] Erreur installation du SVG du plan {plan_id[:8]}: {e}")
+            return jsonify({"error": str(e), "status": result["status"]}), 500
+    
+    discard_plan(entity_dir, plan_id)
+    return jsonify(result)
+
+
+# ============================================================
+# HISTORIQUE DES VERSIONS
+# ============================================================
+@activities_map_bp.route("/api/carto/versions", methods=["GET"])
+def carto_versions():
+    """Versions de la cartographie de l'entité active (la plus récente d'abord) et place occupée."""
+    active_entity = Entity.get_active()
+    if not active_entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+    return jsonify({
+        "versions": list_versions(active_entity.id),
+        "usage": history_usage(active_entity.id)
+    })
+
+
+@activities_map_bp.route("/api/carto/versions/<int:version>/restore", methods=["POST"])
+def restore_carto_version(version):
+    """
+    Remet une version comme cartographie courante puis la re-synchronise
+    (job carto_sync). La restauration devient la version suivante de
+    l'historique, sans nouvel objet sur disque (contenu dédupliqué).
+    """
+    from flask import session
+    
+    active_entity = Entity.get_active()
+    if not active_entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+    
+    row = get_version(active_entity.id, version)
+    if not row:
+        return jsonify({"error": "Version non trouvée"}), 404
+    
+    try:
+        content = load_content(active_entity.id, row.content_hash)
+        entity_dir = ensure_entity_dir(active_entity.id)
+        svg_path = os.path.join(entity_dir, "carto.svg")
+        with open(svg_path + ".restore.tmp", "wb") as f:
+            f.write(content)
+        os.replace(svg_path + ".restore.tmp", svg_path)
+        
+        active_entity.svg_filename = "carto.svg"
+        db.session.commit()
+        
+        job_id = enqueue_job(
+            current_app._get_current_object(),
+            "carto_sync",
+            active_entity.id,
+            {
+                "svg_path": svg_path,
+                "force": _force_requested(),
+                "slim": True,
+                "precompress": True,
+                "history": {
+                    "author_id": session.get('user_id'),
+                    "filename": row.filename,
+                    "restored_from": row.version
+                }
+            }
+        )
+        
+        return jsonify({
+            "status": "queued",
+            "message": f"Version {row.version} restaurée, synchronisation en cours",
+            "job_id": job_id,
+            "job_url": url_for("activities_map_bp.job_status", job_id=job_id)
+        }), 202
+    except Exception as e:
+        db.session.rollback()
+        print(f"[HISTORY] Erreur restauration v{version}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@activities_map_bp.route("/api/carto/versions/diff", methods=["GET"])
+def diff_carto_versions():
+    """
+    Différence au niveau des formes entre deux versions (?from=<v>&to=<v>,
+    to = dernière version par défaut) : {added, changed, removed, unchanged_count}.
+    """
+    active_entity = Entity.get_active()
+    if not active_entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+    
+    from_version = request.args.get("from", type=int)
+    to_version = request.args.get("to", type=int)
+    if from_version is None:
+        return jsonify({"error": "Paramètre 'from' requis"}), 400
+    if to_version is None:
+        versions = list_versions(active_entity.id)
+        to_version = versions[0]["version"] if versions else None
+    
+    rows = [get_version(active_entity.id, v) for v in (from_version, to_version)]
+    if not all(rows):
+        return jsonify({"error": "Version non trouvée"}), 404
+    
+    try:
+        indexes = []
+        for row in rows:
+            fd, tmp_path = tempfile.mkstemp(suffix=".svg")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(load_content(active_entity.id, row.content_hash))
+                indexes.append(build_shape_index(extract_activities_from_svg(tmp_path)))
+            finally:
+                os.remove(tmp_path)
+        
+        delta = diff_shape_index(indexes[0], indexes[1])
+        return jsonify(dict(delta, **{"from": rows[0].version, "to": rows[1].version}))
     except Exception as e:
+        print(f"[HISTORY] Erreur diff v{from_version}→v{to_version}: {e}")
         return jsonify({"error": str(e)}), 500
 
 
@@ -634,14 +1457,12 @@ def diagnostic_db():
     
     # Vérifier les entités et leurs activités
     try:
-        entities = Entity.query.all()
-        for e in entities:
-            count = Activities.query.filter_by(entity_id=e.id).count()
+        for e, stats in entities_with_stats():
             result["entities"].append({
                 "id": e.id,
                 "name": e.name,
                 "is_active": e.is_active,
-                "activities_count": count
+                **stats_payload(stats)
             })
     except Exception as e:
         result["entity_error"] = str(e)[:200]
@@ -0,0 +1,140 @@
+# Code/routes/carto_assets.py
+"""
+Livraison des cartographies SVG :
+- variantes pré-compressées (carto.svg.gz / carto.svg.br) générées une fois,
+  à côté du SVG, puis servies selon Accept-Encoding ;
+- validation de cache (ETag fort par variante, Last-Modified → 304) ;
+- cache navigateur longue durée quand l'URL porte la version du contenu (?v=<hash>).
+"""
+import gzip
+import os
+import tempfile
+
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:  # brotli optionnel : seules les variantes gzip sont produites
+    brotli = None
+
+
+# (Content-Encoding, suffixe du fichier), par ordre de préférence
+SVG_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Qualité 9 : ~90 % du gain de la qualité 11 pour une fraction du temps sur 50 Mo
+BROTLI_QUALITY = 9
+GZIP_LEVEL = 9
+
+# Durée de cache quand l'URL est versionnée (le contenu ne change jamais pour un ?v= donné)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _compress_file(src_path, dst_path, encoding):
+    """
+    Compresse src_path vers dst_path par blocs, via un fichier temporaire
+    propre à l'appelant (plusieurs workers peuvent compresser le même SVG
+    en même temps) puis os.replace : dst_path est toujours complet.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst_path), suffix=".tmp")
+    try:
+        with open(src_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            if encoding == "gzip":
+                # mtime=0 : sortie déterministe pour un même SVG
+                with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as gz:
+                    for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+                        gz.write(chunk)
+            else:
+                compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+                for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+                    dst.write(compressor.process(chunk))
+                dst.write(compressor.finish())
+        # Même date que la source : permet de détecter une variante périmée
+        st = os.stat(src_path)
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # mkstemp crée en 0600 : mêmes droits que les autres fichiers statiques
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _available_encodings():
+    return [(enc, suffix) for enc, suffix in SVG_ENCODINGS if enc != "br" or brotli is not None]
+
+
+def precompress_svg(svg_path):
+    """
+    Génère les variantes compressées d'un SVG.
+    Retourne {encoding: taille_en_octets} pour les variantes produites.
+    """
+    sizes = {}
+    for encoding, suffix in _available_encodings():
+        _compress_file(svg_path, svg_path + suffix, encoding)
+        sizes[encoding] = os.path.getsize(svg_path + suffix)
+    print(f"[CARTO] Variantes compressées: {svg_path} ({os.path.getsize(svg_path)} o) → {sizes}")
+    return sizes
+
+
+def ensure_precompressed(svg_path):
+    """
+    (Re)génère les variantes absentes ou périmées (SVG déposés avant cette
+    fonctionnalité, ancien chemin OLD_SVG_PATH...). Silencieux en cas d'échec
+    (dossier en lecture seule) : le SVG brut reste servi.
+    """
+    src_mtime = os.stat(svg_path).st_mtime_ns
+    for encoding, suffix in _available_encodings():
+        variant = svg_path + suffix
+        try:
+            if not os.path.exists(variant) or os.stat(variant).st_mtime_ns != src_mtime:
+                _compress_file(svg_path, variant, encoding)
+        except OSError as e:
+            print(f"[CARTO] Variante {encoding} indisponible pour {svg_path}: {e}")
+
+
+def _pick_variant(svg_path):
+    """Choisit la variante selon Accept-Encoding : (encoding | None, chemin)."""
+    src_mtime = os.stat(svg_path).st_mtime_ns
+    for encoding, suffix in _available_encodings():
+        if request.accept_encodings[encoding] <= 0:
+            continue
+        variant = svg_path + suffix
+        if os.path.exists(variant) and os.stat(variant).st_mtime_ns == src_mtime:
+            return encoding, variant
+    return None, svg_path
+
+
+def send_svg(svg_path, version):
+    """
+    Envoie un SVG de cartographie avec compression et validation de cache.
+    version : hash du contenu du SVG (ETag fort, et valeur attendue de ?v=).
+    """
+    ensure_precompressed(svg_path)
+    encoding, path = _pick_variant(svg_path)
+
+    # Chaque représentation a son propre ETag fort
+    etag = version if encoding is None else f"{version}-{encoding}"
+    response = send_file(
+        path,
+        mimetype="image/svg+xml",
+        etag=etag,
+        last_modified=os.path.getmtime(svg_path),
+        conditional=True,
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+
+    # Contenu dépendant de l'entité active (session) → cache privé uniquement
+    response.cache_control.private = True
+    response.cache_control.public = False
+    if request.args.get("v") == version:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = None
+    return response
@@ -0,0 +1,434 @@
+# Code/routes/carto_graph.py
+"""
+Import du graphe de processus complet depuis un SVG Visio, en une passe.
+
+Calques (mêmes conventions que Code/scripts/extract_visio.py) :
+- 1  : activités                    → Activities
+- 6  : résultats (drapeaux)         → Activities (is_result=True)
+- 8  : cercles de retour            → Data (type "Retour")
+- 9  : connecteurs nourrissants     → Data (type "nourrissante") + Link
+- 10 : connecteurs déclenchants     → Data (type "déclenchante") + Link
+
+Le SVG ne contient pas les collages (BeginX / EndX) du VSDX : les extrémités
+d'un connecteur sont résolues géométriquement, en cherchant la forme dont
+l'emprise contient (à SNAP_DISTANCE près) le premier et le dernier point de
+son tracé. Les emprises sont rangées dans une grille en mémoire : une
+recherche ne regarde que les formes des cases voisines.
+
+Un retour (calque 8) désigne l'activité du même nom quand elle existe,
+comme dans extract_visio.resolve_visio_id.
+"""
+import math
+import xml.etree.ElementTree as ET
+
+from sqlalchemy import delete, insert, select, update, bindparam
+
+from Code.extensions import db
+from Code.models.link_sync import delete_endpoint_links, delete_orphan_links, link_key, sync_entity_links
+from Code.models.models import Activities, Data
+from Code.routes.carto_tiles import IDENTITY, element_bbox, multiply, parse_transform, path_points
+
+
+SVG_NS = "http://www.w3.org/2000/svg"
+VISIO_NS = "http://schemas.microsoft.com/visio/2003/SVGExtensions/"
+
+ACTIVITY_LAYER = "1"
+RESULT_LAYER = "6"
+RETURN_LAYER = "8"
+# Calque → (nom du calque dans extract_visio, type de la Data)
+CONNECTOR_LAYERS = {
+    "9": ("N link", "nourrissante"),
+    "10": ("T link", "déclenchante"),
+}
+GRAPH_LAYERS = {ACTIVITY_LAYER, RESULT_LAYER, RETURN_LAYER, *CONNECTOR_LAYERS}
+
+RETURN_TYPE = "Retour"
+
+# Tolérance (unités du SVG) entre l'extrémité d'un connecteur et le bord d'une forme
+# (les cercles de retour sont collés à ~13 unités de leur tracé)
+SNAP_DISTANCE = 20.0
+# Taille des cases de la grille d'emprises
+GRID_CELL = 200.0
+
+# Nom d'activité au-delà duquel le texte est une description (cf. extract_activities_from_svg)
+MAX_NAME_LENGTH = 80
+PROGRESS_EVERY = 500
+
+_BATCH_SIZE = 500
+
+_TEXT_TAG = f"{{{SVG_NS}}}text"
+_PATH_TAG = f"{{{SVG_NS}}}path"
+_MID_ATTR = f"{{{VISIO_NS}}}mID"
+_LAYER_ATTR = f"{{{VISIO_NS}}}layerMember"
+
+
+# ============================================================
+# EXTRACTION (une passe iterparse)
+# ============================================================
+def _first_text(elem, min_length=3):
+    """Premier texte significatif du sous-arbre, dans l'ordre du document."""
+    for text_elem in elem.iter(_TEXT_TAG):
+        text = "".join(text_elem.itertext()).strip()
+        if len(text) >= min_length:
+            return text
+    return None
+
+
+def _connector_ends(elem, ctm):
+    """(début, fin) du premier tracé d'un connecteur, dans le repère de la carte."""
+    def walk(node, matrix):
+        matrix = multiply(matrix, parse_transform(node.get("transform")))
+        if node.tag == _PATH_TAG:
+            points = path_points(node.get("d"))
+            if len(points) >= 2:
+                a, b, c, d, e, f = matrix
+                return tuple(
+                    (a * x + c * y + e, b * x + d * y + f)
+                    for x, y in (points[0], points[-1])
+                )
+        for child in node:
+            found = walk(child, matrix)
+            if found:
+                return found
+        return None
+
+    return walk(elem, ctm)
+
+
+def extract_process_graph(svg_path, progress=None):
+    """
+    Lit le SVG une seule fois et classe les formes de tous les calques gérés.
+
+    Retourne un dict :
+      activities : [{shape_id, name}]               calque 1, comme extract_activities_from_svg
+      results    : [{shape_id, name, is_result}]    calque 6
+      returns    : [{shape_id, name}]               calque 8
+      connectors : [{shape_id, name, layer, type, start, end}]  calques 9 / 10
+      boxes      : {shape_id: (x0, y0, x1, y1)}     emprises des formes reliables
+      shapes_parsed : nombre de formes des calques gérés
+    Fichier illisible : toutes les listes sont vides.
+
+    Mémoire : chaque forme n'est gardée que le temps de sa lecture (son
+    sous-arbre sert au texte, à l'emprise et au tracé), le reste du document
+    est libéré au fil de l'eau.
+    """
+    graph = {"activities": [], "results": [], "returns": [], "connectors": [], "boxes": {}, "shapes_parsed": 0}
+    # (ordre du document, calque, shape_id, texte) : publication triée en fin de lecture
+    found = []
+
+    ctm_stack = [IDENTITY]
+    open_elems = []
+    # Formes ouvertes : (élément, ordre, calque, matrice du parent)
+    open_shapes = []
+    seq = 0
+
+    print(f"[GRAPH] Parsing SVG: {svg_path}")
+    try:
+        for event, elem in ET.iterparse(svg_path, events=("start", "end")):
+            if event == "start":
+                seq += 1
+                open_elems.append(elem)
+                ctm_stack.append(multiply(ctm_stack[-1], parse_transform(elem.get("transform"))))
+                if elem.get(_MID_ATTR):
+                    # Calque exact, comme le filtre v:layerMember="1" des activités
+                    layer = elem.get(_LAYER_ATTR, "")
+                    if layer in GRAPH_LAYERS:
+                        open_shapes.append((elem, seq, layer, ctm_stack[-2]))
+                        graph["shapes_parsed"] += 1
+                        if progress and graph["shapes_parsed"] % PROGRESS_EVERY == 0:
+                            progress(shapes_parsed=graph["shapes_parsed"])
+                continue
+
+            open_elems.pop()
+            ctm_stack.pop()
+
+            if open_shapes and open_shapes[-1][0] is elem:
+                _, shape_seq, layer, parent_ctm = open_shapes.pop()
+                shape_id = elem.get(_MID_ATTR)
+                if layer in CONNECTOR_LAYERS:
+                    ends = _connector_ends(elem, parent_ctm)
+                    found.append((shape_seq, layer, shape_id, _first_text(elem, 1), ends))
+                else:
+                    min_length = 3 if layer == ACTIVITY_LAYER else 1
+                    found.append((shape_seq, layer, shape_id, _first_text(elem, min_length), None))
+                    box = element_bbox(elem, parent_ctm)
+                    if box:
+                        graph["boxes"][shape_id] = tuple(box)
+
+            # Sous-arbre libéré hors des formes ouvertes (relues à leur fermeture)
+            if not open_shapes:
+                elem.clear()
+                if open_elems:
+                    del open_elems[-1][-1]
+    except Exception as e:
+        print(f"[GRAPH] Erreur: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"activities": [], "results": [], "returns": [], "connectors": [], "boxes": {}, "shapes_parsed": 0}
+
+    seen_names = {ACTIVITY_LAYER: set(), RESULT_LAYER: set()}
+    for _, layer, shape_id, text, ends in sorted(found, key=lambda item: item[0]):
+        if layer in seen_names:
+            # Mêmes règles que extract_activities_from_svg : sans texte, description
+            # trop longue ou nom déjà vu → ignoré
+            if not text or len(text) > MAX_NAME_LENGTH or text.lower() in seen_names[layer]:
+                continue
+            seen_names[layer].add(text.lower())
+            if layer == ACTIVITY_LAYER:
+                graph["activities"].append({"shape_id": shape_id, "name": text})
+            else:
+                graph["results"].append({"shape_id": shape_id, "name": text, "is_result": True})
+        elif layer == RETURN_LAYER:
+            graph["returns"].append({"shape_id": shape_id, "name": text or "Retour sans nom"})
+        else:
+            layer_name, data_type = CONNECTOR_LAYERS[layer]
+            graph["connectors"].append({
+                "shape_id": shape_id,
+                "name": text or "Donnée sans nom",
+                "layer": layer_name,
+                "type": data_type,
+                "start": ends[0] if ends else None,
+                "end": ends[1] if ends else None,
+            })
+
+    if progress:
+        progress(shapes_parsed=graph["shapes_parsed"])
+    print(f"[GRAPH] {len(graph['activities'])} activités, {len(graph['results'])} résultats, "
+          f"{len(graph['returns'])} retours, {len(graph['connectors'])} connecteurs")
+    return graph
+
+
+# ============================================================
+# RÉSOLUTION DES EXTRÉMITÉS
+# ============================================================
+class ShapeIndex:
+    """Grille d'emprises : forme la plus proche d'un point, sans parcourir toute la carte."""
+
+    def __init__(self, boxes, cell=GRID_CELL):
+        self.cell = cell
+        self.grid = {}
+        for shape_id, box in boxes.items():
+            x0, y0, x1, y1 = box
+            for cx in range(self._cell(x0 - SNAP_DISTANCE), self._cell(x1 + SNAP_DISTANCE) + 1):
+                for cy in range(self._cell(y0 - SNAP_DISTANCE), self._cell(y1 + SNAP_DISTANCE) + 1):
+                    self.grid.setdefault((cx, cy), []).append((shape_id, box))
+
+    def _cell(self, value):
+        return math.floor(value / self.cell)
+
+    def find(self, point):
+        """shape_id de la forme contenant point (la plus petite), ou la plus proche à SNAP_DISTANCE près."""
+        if point is None:
+            return None
+        x, y = point
+        best = None
+        for shape_id, (x0, y0, x1, y1) in self.grid.get((self._cell(x), self._cell(y)), ()):
+            distance = math.hypot(max(x0 - x, 0.0, x - x1), max(y0 - y, 0.0, y - y1))
+            if distance > SNAP_DISTANCE:
+                continue
+            rank = (distance, (x1 - x0) * (y1 - y0))
+            if best is None or rank < best[0]:
+                best = (rank, shape_id)
+        return best[1] if best else None
+
+
+def graph_signature(graph):
+    """
+    Entrées (shape_id, name) décrivant données et liens, ajoutées à celles des
+    activités pour l'empreinte des formes (shapes_sha256) : un connecteur
+    déplacé ou renommé invalide l'empreinte même si les activités sont identiques.
+    """
+    index = ShapeIndex(graph["boxes"])
+    entries = [{"shape_id": f"result:{r['shape_id']}", "name": r["name"]} for r in graph["results"]]
+    entries += [{"shape_id": f"return:{r['shape_id']}", "name": r["name"]} for r in graph["returns"]]
+    for c in graph["connectors"]:
+        entries.append({
+            "shape_id": f"link:{c['shape_id']}",
+            "name": f"{c['type']}\x1f{c['name']}\x1f{index.find(c['start'])}\x1f{index.find(c['end'])}",
+        })
+    return entries
+
+
+# ============================================================
+# ÉCRITURE EN BASE (groupée)
+# ============================================================
+def _new_graph_stats():
+    return {
+        "data_added": 0,
+        "data_updated": 0,
+        "data_removed": 0,
+        "links": 0,
+        "links_added": 0,
+        "links_removed": 0,
+        "links_unresolved": 0,
+    }
+
+
+def reconcile_data(entity_id, graph, stats):
+    """
+    Data des retours et connecteurs : INSERT / UPDATE groupés par shape_id,
+    suppression des Data issues d'un ancien SVG (shape_id absent).
+    Les Data saisies à la main (sans shape_id) ne sont pas touchées.
+    Retourne {shape_id: data_id}.
+    """
+    table = Data.__table__
+    wanted = {r["shape_id"]: (r["name"], RETURN_TYPE, None) for r in graph["returns"]}
+    for c in graph["connectors"]:
+        wanted[c["shape_id"]] = (c["name"], c["type"], c["layer"])
+
+    existing = {
+        row.shape_id: row
+        for row in db.session.execute(
+            select(table.c.id, table.c.shape_id, table.c.name, table.c.type, table.c.layer)
+            .where(table.c.entity_id == entity_id, table.c.shape_id.isnot(None))
+        )
+    }
+
+    new_rows = [
+        {"entity_id": entity_id, "shape_id": shape_id, "name": name, "type": data_type, "layer": layer}
+        for shape_id, (name, data_type, layer) in sorted(wanted.items()) if shape_id not in existing
+    ]
+    update_rows = [
+        {"b_id": existing[shape_id].id, "b_name": name, "b_type": data_type, "b_layer": layer}
+        for shape_id, (name, data_type, layer) in sorted(wanted.items())
+        if shape_id in existing and (existing[shape_id].name, existing[shape_id].type, existing[shape_id].layer) != (name, data_type, layer)
+    ]
+    removed_ids = [row.id for shape_id, row in existing.items() if shape_id not in wanted]
+
+    if new_rows:
+        db.session.execute(insert(table), new_rows)
+    if update_rows:
+        db.session.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(name=bindparam("b_name"), type=bindparam("b_type"), layer=bindparam("b_layer")),
+            update_rows
+        )
+    delete_endpoint_links(data_ids=removed_ids)
+    for i in range(0, len(removed_ids), _BATCH_SIZE):
+        batch = removed_ids[i:i + _BATCH_SIZE]
+        db.session.execute(delete(table).where(table.c.id.in_(batch)))
+
+    stats["data_added"] += len(new_rows)
+    stats["data_updated"] += len(update_rows)
+    stats["data_removed"] += len(removed_ids)
+
+    return {
+        row.shape_id: row.id
+        for row in db.session.execute(
+            select(table.c.id, table.c.shape_id)
+            .where(table.c.entity_id == entity_id, table.c.shape_id.in_(list(wanted)))
+        )
+    } if wanted else {}
+
+
+def graph_endpoint(graph, activity_ids, activity_by_name, data_ids):
+    """
+    Résolution d'une forme du graphe en extrémité de lien :
+    shape_id -> ("activity", activity_ids[...]) | ("data", data_ids[...]) | None.
+    Un retour désigne l'activité du même nom (activity_by_name) si elle existe.
+    """
+    return_names = {r["shape_id"]: r["name"] for r in graph["returns"]}
+
+    def endpoint(shape_id):
+        if shape_id is None:
+            return None
+        if shape_id in activity_ids:
+            return ("activity", activity_ids[shape_id])
+        if shape_id in return_names:
+            same_act = activity_by_name.get(return_names[shape_id])
+            if same_act is not None:
+                return ("activity", same_act)
+        if shape_id in data_ids:
+            return ("data", data_ids[shape_id])
+        return None
+
+    return endpoint
+
+
+def connector_links(graph, endpoint, stats=None):
+    """
+    Connecteurs du graphe reliés à leurs extrémités : [(connecteur, source, cible)].
+    endpoint(shape_id) -> extrémité (("activity" | "data", référence)) ou None.
+    Les connecteurs non reliés (ou bouclant sur une forme) sont ignorés et
+    comptés dans stats["links_unresolved"].
+    """
+    index = ShapeIndex(graph["boxes"])
+    found = []
+    for c in graph["connectors"]:
+        source = endpoint(index.find(c["start"]))
+        target = endpoint(index.find(c["end"]))
+        if not source or not target or source == target:
+            if stats is not None:
+                stats["links_unresolved"] += 1
+            print(f"[GRAPH] Connecteur non relié: '{c['name']}' (shape_id={c['shape_id']})")
+            continue
+        found.append((c, source, target))
+    return found
+
+
+def rebuild_links(entity_id, graph, data_ids, stats):
+    """
+    Aligne les liens de l'entité sur les connecteurs du SVG
+    (comme extract_visio.rebuild_links_from_connectors) : liens inchangés
+    gardés avec leur id, ajouts / suppressions groupés (link_sync).
+    """
+    acts = Activities.__table__
+    activity_rows = db.session.execute(
+        select(acts.c.id, acts.c.shape_id, acts.c.name).where(acts.c.entity_id == entity_id)
+    ).all()
+    activity_ids = {str(r.shape_id): r.id for r in activity_rows if r.shape_id}
+    activity_by_name = {}
+    for r in activity_rows:
+        activity_by_name.setdefault(r.name, r.id)
+    endpoint = graph_endpoint(graph, activity_ids, activity_by_name, data_ids)
+
+    rows = []
+    seen = set()
+    for c, source, target in connector_links(graph, endpoint, stats):
+        row = {
+            "type": c["type"],
+            "description": c["name"],
+            "source_activity_id": source[1] if source[0] == "activity" else None,
+            "source_data_id": source[1] if source[0] == "data" else None,
+            "target_activity_id": target[1] if target[0] == "activity" else None,
+            "target_data_id": target[1] if target[0] == "data" else None,
+        }
+        key = link_key(row)
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append(row)
+
+    counts = sync_entity_links(entity_id, rows)
+    stats["links"] += len(rows)
+    stats["links_added"] += counts["added"]
+    stats["links_removed"] += counts["removed"] + delete_orphan_links(entity_id)
+
+
+def reconcile_process_graph(entity_id, graph, sync_stats):
+    """
+    Data et liens de l'entité d'après le graphe extrait, en une transaction.
+    Un SVG sans retours ni connecteurs (cartographie « activités seules »)
+    laisse Data et liens existants en place.
+    Les statistiques sont ajoutées à sync_stats["graph"].
+    """
+    stats = _new_graph_stats()
+    sync_stats["graph"] = stats
+    if not graph["returns"] and not graph["connectors"]:
+        return stats
+
+    try:
+        data_ids = reconcile_data(entity_id, graph, stats)
+        rebuild_links(entity_id, graph, data_ids, stats)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        sync_stats["errors"].append(f"graphe: {str(e)[:100]}")
+        print(f"[GRAPH] ❌ ERREUR écriture données / liens: {e}")
+        return stats
+
+    print(f"[GRAPH] Data +{stats['data_added']} ✏️{stats['data_updated']} -{stats['data_removed']}, "
+          f"{stats['links']} liens (+{stats['links_added']} -{stats['links_removed']}, "
+          f"{stats['links_unresolved']} connecteurs non reliés)")
+    return stats
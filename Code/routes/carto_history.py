@@ -0,0 +1,360 @@
+# Code/routes/carto_history.py
+"""
+Historique des cartographies d'une entité (remplace les copies horodatées
+déposées à la main dans static/carto_history).
+
+- Un objet par contenu distinct (SHA-256) : ré-importer un SVG déjà connu
+  (ou restaurer une version) n'ajoute rien sur disque.
+- Chaque objet est stocké compressé (zstd si disponible, sinon xz), soit en
+  copie complète, soit en delta par rapport au contenu de la version
+  précédente. Le disque croît avec la taille des modifications, pas avec le
+  nombre d'imports.
+- Une copie complète est refaite toutes les MAX_CHAIN_DEPTH versions (ou
+  quand le delta n'apporte rien) pour borner le coût d'une restauration.
+- L'index (version, auteur, date, tailles, stats) est la table carto_versions.
+
+Objets : static/carto_history/entity_<id>/<sha256>.<zst|xz>
+
+Delta : le SVG est découpé après chaque '>' (une balise par morceau) ; une
+suite de K morceaux identiques dans la base sert d'ancre, puis la copie est
+prolongée tant que les morceaux suivent. Linéaire en taille de fichier.
+"""
+import hashlib
+import json
+import lzma
+import os
+import re
+import shutil
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from Code.extensions import db
+from Code.models.models import CartoVersion, User
+
+try:
+    import zstandard
+except ImportError:  # zstd optionnel : objets compressés en xz
+    zstandard = None
+
+
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "carto_history")
+
+# Nombre maximal de deltas à appliquer pour reconstruire une version
+MAX_CHAIN_DEPTH = 20
+# Au-delà de cette part de contenu nouveau, une copie complète est plus simple
+MAX_DELTA_LITERAL_RATIO = 0.5
+# Morceaux consécutifs formant une ancre de copie
+ANCHOR_CHUNKS = 4
+
+ZSTD_LEVEL = 19
+XZ_PRESET = 6
+
+CODEC_SUFFIXES = {"zstd": ".zst", "xz": ".xz"}
+
+_SPLIT_RE = re.compile(rb"(?<=>)")
+
+# Dernier contenu stocké ou reconstruit (entity_id, content_hash, octets) :
+# base du delta de l'import suivant. Une seule entrée, toutes entités
+# confondues, pour borner la mémoire de chaque worker (cartographies de
+# plusieurs dizaines de Mo).
+_last_content = None
+
+_schema_ready = False
+
+
+def ensure_history_schema():
+    """Crée la table carto_versions si elle n'existe pas (idempotent)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    CartoVersion.__table__.create(db.engine, checkfirst=True)
+    _schema_ready = True
+
+
+def entity_history_dir(entity_id):
+    return os.path.join(HISTORY_DIR, f"entity_{entity_id}")
+
+
+# ============================================================
+# COMPRESSION / DELTA
+# ============================================================
+def default_codec():
+    return "zstd" if zstandard is not None else "xz"
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return lzma.compress(data, preset=XZ_PRESET)
+
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Objet zstd mais le module zstandard n'est pas installé")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return lzma.decompress(data)
+
+
+def _chunks(data):
+    return [chunk for chunk in _SPLIT_RE.split(data) if chunk]
+
+
+def make_delta(base, data):
+    """
+    Instructions pour reconstruire data à partir de base :
+    [i, j] = morceaux i..j de base, "texte" = contenu nouveau (latin-1).
+    Retourne (instructions, octets de contenu nouveau).
+    """
+    a = _chunks(base)
+    b = _chunks(data)
+    anchors = {}
+    for i in range(len(a) - ANCHOR_CHUNKS + 1):
+        anchors.setdefault(tuple(a[i:i + ANCHOR_CHUNKS]), i)
+
+    ops = []
+    literal = []
+    literal_bytes = 0
+    cursor = None  # position suivante dans a pendant une copie
+    j = 0
+    while j < len(b):
+        if cursor is not None and cursor < len(a) and a[cursor] == b[j]:
+            ops[-1][1] += 1
+            cursor += 1
+            j += 1
+            continue
+        i = anchors.get(tuple(b[j:j + ANCHOR_CHUNKS]))
+        if i is not None:
+            if literal:
+                ops.append(b"".join(literal).decode("latin-1"))
+                literal = []
+            ops.append([i, i + ANCHOR_CHUNKS])
+            cursor = i + ANCHOR_CHUNKS
+            j += ANCHOR_CHUNKS
+            continue
+        cursor = None
+        literal.append(b[j])
+        literal_bytes += len(b[j])
+        j += 1
+    if literal:
+        ops.append(b"".join(literal).decode("latin-1"))
+    return ops, literal_bytes
+
+
+def apply_delta(base, ops):
+    a = _chunks(base)
+    return b"".join(
+        b"".join(a[op[0]:op[1]]) if isinstance(op, list) else op.encode("latin-1")
+        for op in ops
+    )
+
+
+def _encode_delta(ops):
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_delta(payload):
+    return json.loads(payload.decode("utf-8"))
+
+
+# ============================================================
+# OBJETS
+# ============================================================
+def _object_path(entity_id, content_hash, codec):
+    return os.path.join(entity_history_dir(entity_id), content_hash + CODEC_SUFFIXES[codec])
+
+
+def _write_object(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _objects(entity_id):
+    """content_hash -> première version qui l'a stocké (porte base_hash / codec)."""
+    rows = db.session.scalars(
+        select(CartoVersion)
+        .where(CartoVersion.entity_id == entity_id)
+        .order_by(CartoVersion.version)
+    )
+    objects = {}
+    for row in rows:
+        objects.setdefault(row.content_hash, row)
+    return objects
+
+
+def _chain(objects, content_hash):
+    """[objet demandé, sa base, ..., copie complète]."""
+    chain = []
+    current = objects.get(content_hash)
+    while current is not None:
+        chain.append(current)
+        if current.base_hash is None:
+            return chain
+        if len(chain) > 2 * MAX_CHAIN_DEPTH:
+            break
+        current = objects.get(current.base_hash)
+    raise ValueError(f"Historique incomplet pour le contenu {content_hash[:12]}…")
+
+
+def load_content(entity_id, content_hash, objects=None):
+    """Contenu (octets) d'une version, reconstruit depuis sa dernière copie complète."""
+    global _last_content
+    cached = _last_content
+    if cached and cached[0] == entity_id and cached[1] == content_hash:
+        return cached[2]
+
+    chain = _chain(objects or _objects(entity_id), content_hash)
+    data = None
+    for row in reversed(chain):
+        with open(_object_path(entity_id, row.content_hash, row.codec), "rb") as f:
+            payload = _decompress(f.read(), row.codec)
+        data = payload if row.base_hash is None else apply_delta(data, _decode_delta(payload))
+
+    if hashlib.sha256(data).hexdigest() != content_hash:
+        raise ValueError(f"Contenu reconstruit invalide ({content_hash[:12]}…)")
+    _last_content = (entity_id, content_hash, data)
+    return data
+
+
+# ============================================================
+# VERSIONS
+# ============================================================
+def record_version(entity_id, source_path, author_id=None, filename=None, stats=None):
+    """
+    Ajoute une version de la cartographie source_path à l'historique de l'entité.
+    Retourne la ligne CartoVersion créée.
+    """
+    global _last_content
+    ensure_history_schema()
+    with open(source_path, "rb") as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    objects = _objects(entity_id)
+
+    stored_bytes = 0
+    known = objects.get(content_hash)
+    if known is not None and os.path.exists(_object_path(entity_id, content_hash, known.codec)):
+        # Contenu déjà stocké : la version pointe vers le même objet
+        base_hash, codec = known.base_hash, known.codec
+    else:
+        base_hash, codec, payload = _store_payload(entity_id, data, objects)
+        path = _object_path(entity_id, content_hash, codec)
+        _write_object(path, payload)
+        stored_bytes = len(payload)
+
+    for _attempt in range(3):
+        next_version = (db.session.scalar(
+            select(func.max(CartoVersion.version)).where(CartoVersion.entity_id == entity_id)
+        ) or 0) + 1
+        row = CartoVersion(
+            entity_id=entity_id,
+            version=next_version,
+            content_hash=content_hash,
+            base_hash=base_hash,
+            codec=codec,
+            filename=filename or os.path.basename(source_path),
+            author_id=author_id,
+            created_at=datetime.utcnow(),
+            size_bytes=len(data),
+            stored_bytes=stored_bytes,
+            stats=json.dumps(stats, ensure_ascii=False) if stats is not None else None,
+        )
+        db.session.add(row)
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Même numéro pris par un import concurrent de la même entité
+            db.session.rollback()
+    else:
+        raise RuntimeError(f"Impossible d'attribuer un numéro de version (entity_id={entity_id})")
+
+    _last_content = (entity_id, content_hash, data)
+    print(f"[HISTORY] entity_id={entity_id} v{row.version} sha256={content_hash[:12]}… "
+          f"{'delta' if base_hash else 'complet' if stored_bytes else 'dédupliqué'} "
+          f"({len(data)} o → {stored_bytes} o)")
+    return row
+
+
+def _store_payload(entity_id, data, objects):
+    """(base_hash, codec, octets à écrire) : delta contre la dernière version si rentable."""
+    codec = default_codec()
+    latest = db.session.scalar(
+        select(CartoVersion)
+        .where(CartoVersion.entity_id == entity_id)
+        .order_by(CartoVersion.version.desc())
+        .limit(1)
+    )
+    if latest is not None:
+        try:
+            chain = _chain(objects, latest.content_hash)
+            if len(chain) <= MAX_CHAIN_DEPTH:
+                base = load_content(entity_id, latest.content_hash, objects)
+                ops, literal_bytes = make_delta(base, data)
+                if literal_bytes <= MAX_DELTA_LITERAL_RATIO * len(data):
+                    return latest.content_hash, codec, _compress(_encode_delta(ops), codec)
+        except (OSError, ValueError, RuntimeError, lzma.LZMAError) as e:
+            print(f"[HISTORY] Base de delta illisible, copie complète: {e}")
+    return None, codec, _compress(data, codec)
+
+
+def version_payload(row, author=None):
+    return {
+        "version": row.version,
+        "content_hash": row.content_hash,
+        "filename": row.filename,
+        "author_id": row.author_id,
+        "author": f"{author.first_name} {author.last_name}".strip() if author else None,
+        "created_at": row.created_at.isoformat(timespec="seconds") if row.created_at else None,
+        "size_bytes": row.size_bytes,
+        "stored_bytes": row.stored_bytes,
+        "storage": "dedup" if not row.stored_bytes else "delta" if row.base_hash else "full",
+        "stats": json.loads(row.stats) if row.stats else None,
+    }
+
+
+def list_versions(entity_id):
+    """Versions de l'entité, la plus récente d'abord (auteur joint en une requête)."""
+    ensure_history_schema()
+    rows = db.session.execute(
+        select(CartoVersion, User)
+        .outerjoin(User, User.id == CartoVersion.author_id)
+        .where(CartoVersion.entity_id == entity_id)
+        .order_by(CartoVersion.version.desc())
+    ).all()
+    return [version_payload(row, author) for row, author in rows]
+
+
+def get_version(entity_id, version):
+    ensure_history_schema()
+    return CartoVersion.query.filter_by(entity_id=entity_id, version=version).first()
+
+
+def history_usage(entity_id):
+    """Octets stockés sur disque pour l'entité et somme des tailles des versions."""
+    ensure_history_schema()
+    stored, original, count = db.session.execute(
+        select(
+            func.coalesce(func.sum(CartoVersion.stored_bytes), 0),
+            func.coalesce(func.sum(CartoVersion.size_bytes), 0),
+            func.count(),
+        ).where(CartoVersion.entity_id == entity_id)
+    ).one()
+    return {"versions": count, "stored_bytes": stored, "original_bytes": original}
+
+
+def delete_history(entity_id):
+    """Supprime l'index et les objets de l'entité (suppression d'entité)."""
+    global _last_content
+    ensure_history_schema()
+    CartoVersion.query.filter_by(entity_id=entity_id).delete()
+    if _last_content and _last_content[0] == entity_id:
+        _last_content = None
+    history_dir = entity_history_dir(entity_id)
+    if os.path.exists(history_dir):
+        shutil.rmtree(history_dir)
@@ -0,0 +1,309 @@
+# Code/routes/carto_jobs.py
+"""
+Jobs d'arrière-plan pour l'import / la re-synchronisation des cartographies.
+
+- File d'attente locale SQLite (instance/carto_jobs.db), sans broker externe :
+  partagée par les workers gunicorn d'une même machine.
+- Chaque process démarre (à la demande) un petit pool de threads qui
+  réclament les jobs de façon atomique (UPDATE ... WHERE status='queued').
+- Un seul job à la fois par entité : un job en attente n'est pas réclamé
+  tant qu'un autre job de la même entité tourne (carto.svg, fichiers
+  précompressés, tuiles et base de l'entité ne sont écrits que par lui).
+- Signe de vie (heartbeat_at) rafraîchi par un thread dédié pendant toute
+  l'exécution, y compris les phases sans progression (allègement,
+  compression, tuiles).
+- La progression (formes lues, lignes écrites) et le résultat final sont
+  stockés dans la file et lus par /activities/api/jobs/<id>.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+from Code.extensions import db
+
+
+JOBS_DB_PATH = os.getenv(
+    "CARTO_JOBS_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "carto_jobs.db")
+)
+JOB_WORKERS = int(os.getenv("CARTO_JOB_WORKERS", "1"))
+
+# Un job "running" sans signe de vie depuis ce délai est considéré comme orphelin
+# (process gunicorn tué en cours de job) et peut être repris par un autre worker.
+STALE_AFTER_SECONDS = 600
+# Rafraîchissement du signe de vie d'un job en cours (bien en deçà de STALE_AFTER_SECONDS)
+HEARTBEAT_INTERVAL_SECONDS = 30
+POLL_INTERVAL_SECONDS = 2.0
+# Écritures de progression limitées (la file est partagée entre process)
+PROGRESS_MIN_INTERVAL = 0.5
+# Jobs terminés conservés pour consultation
+KEEP_FINISHED_SECONDS = 7 * 24 * 3600
+
+# kind -> fonction(entity_id, payload, progress) retournant le résultat (dict JSON)
+_handlers = {}
+
+_runner_lock = threading.Lock()
+_runner_threads = []
+_wakeup = threading.Event()
+
+
+# ============================================================
+# FILE SQLITE
+# ============================================================
+def _connect():
+    os.makedirs(os.path.dirname(JOBS_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            entity_id INTEGER,
+            payload TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL,
+            worker TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs(status, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_entity ON jobs(entity_id, status)")
+    return conn
+
+
+def _iso(ts):
+    return datetime.utcfromtimestamp(ts).isoformat(timespec="seconds") + "Z" if ts else None
+
+
+def _row_to_dict(row):
+    started, finished = row["started_at"], row["finished_at"]
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "entity_id": row["entity_id"],
+        "status": row["status"],
+        "progress": json.loads(row["progress"]) if row["progress"] else {},
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+        "created_at": _iso(row["created_at"]),
+        "started_at": _iso(started),
+        "finished_at": _iso(finished),
+        "duration_seconds": round((finished or time.time()) - started, 2) if started else None,
+    }
+
+
+def get_job(job_id):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def list_jobs(entity_id, limit=20):
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE entity_id = ? ORDER BY created_at DESC LIMIT ?",
+            (entity_id, limit)
+        ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+    finally:
+        conn.close()
+
+
+# ============================================================
+# API PUBLIQUE
+# ============================================================
+def register_job_handler(kind):
+    """Décorateur : associe une fonction d'exécution à un type de job."""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def enqueue_job(app, kind, entity_id, payload):
+    """Ajoute un job dans la file et réveille les workers. Retourne l'id du job."""
+    job_id = uuid.uuid4().hex
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, entity_id, payload, status, progress, created_at) "
+            "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, entity_id, json.dumps(payload), json.dumps({"phase": "queued"}), time.time())
+        )
+    finally:
+        conn.close()
+    print(f"[JOBS] Job {kind} en file: {job_id} (entity_id={entity_id})")
+    start_job_workers(app)
+    _wakeup.set()
+    return job_id
+
+
+def start_job_workers(app):
+    """Démarre (une fois par process) les threads qui consomment la file."""
+    with _runner_lock:
+        alive = [t for t in _runner_threads if t.is_alive()]
+        _runner_threads[:] = alive
+        for i in range(len(alive), JOB_WORKERS):
+            t = threading.Thread(
+                target=_worker_loop,
+                args=(app,),
+                name=f"carto-job-{os.getpid()}-{i}",
+                daemon=True
+            )
+            t.start()
+            _runner_threads.append(t)
+
+
+# ============================================================
+# WORKERS
+# ============================================================
+# Job réclamable : en attente (ou orphelin), sans autre job vivant sur la même entité
+_CLAIMABLE = (
+    "(status = 'queued' OR (status = 'running' AND heartbeat_at < :stale)) "
+    "AND (entity_id IS NULL OR NOT EXISTS ("
+    "    SELECT 1 FROM jobs AS other WHERE other.entity_id = jobs.entity_id AND other.id != jobs.id "
+    "    AND other.status = 'running' AND other.heartbeat_at >= :stale))"
+)
+
+
+def _claim_next(conn, worker_name):
+    """Réclame atomiquement le plus ancien job en attente (ou orphelin) d'une entité libre."""
+    now = time.time()
+    stale = now - STALE_AFTER_SECONDS
+    candidates = conn.execute(
+        f"SELECT id FROM jobs WHERE {_CLAIMABLE} ORDER BY created_at LIMIT 5",
+        {"stale": stale}
+    ).fetchall()
+    for row in candidates:
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = :now, heartbeat_at = :now, worker = :worker "
+            f"WHERE id = :id AND {_CLAIMABLE}",
+            {"now": now, "worker": worker_name, "id": row["id"], "stale": stale}
+        )
+        if cur.rowcount == 1:
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+    return None
+
+
+class JobProgress:
+    """
+    Callback de progression passé aux handlers : progress(shapes_parsed=..., ...).
+    Les champs sont fusionnés et écrits dans la file au plus toutes les 0,5 s.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.fields = {}
+        self._last_write = 0.0
+
+    def __call__(self, force_write=False, **fields):
+        self.fields.update(fields)
+        now = time.time()
+        if not force_write and now - self._last_write < PROGRESS_MIN_INTERVAL:
+            return
+        self._last_write = now
+        conn = _connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?",
+                (json.dumps(self.fields), now, self.job_id)
+            )
+        finally:
+            conn.close()
+
+
+def _finish(job_id, status, progress_fields, result=None, error=None):
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, finished_at = ?, heartbeat_at = ? "
+            "WHERE id = ?",
+            (status, json.dumps(progress_fields), json.dumps(result, ensure_ascii=False) if result is not None else None,
+             error, time.time(), time.time(), job_id)
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?",
+            (time.time() - KEEP_FINISHED_SECONDS,)
+        )
+    finally:
+        conn.close()
+
+
+def _keep_alive(job_id, stop):
+    """Rafraîchit heartbeat_at du job toutes les HEARTBEAT_INTERVAL_SECONDS jusqu'à stop."""
+    while not stop.wait(HEARTBEAT_INTERVAL_SECONDS):
+        try:
+            conn = _connect()
+            try:
+                conn.execute(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id)
+                )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[JOBS] Signe de vie non écrit ({job_id}): {e}")
+
+
+def _run_job(app, job):
+    job_id, kind = job["id"], job["kind"]
+    handler = _handlers.get(kind)
+    progress = JobProgress(job_id)
+    progress(force_write=True, phase="running")
+
+    if handler is None:
+        _finish(job_id, "error", {"phase": "error"}, error=f"Type de job inconnu: {kind}")
+        return
+
+    print(f"[JOBS] Démarrage job {kind} {job_id}")
+    stop = threading.Event()
+    threading.Thread(target=_keep_alive, args=(job_id, stop), name=f"carto-job-heartbeat-{job_id[:8]}",
+                     daemon=True).start()
+    with app.app_context():
+        try:
+            payload = json.loads(job["payload"]) if job["payload"] else {}
+            result = handler(job["entity_id"], payload, progress)
+            _finish(job_id, "done", dict(progress.fields, phase="done"), result=result)
+            print(f"[JOBS] Job {job_id} terminé")
+        except Exception as e:
+            db.session.rollback()
+            traceback.print_exc()
+            _finish(job_id, "error", dict(progress.fields, phase="error"), error=str(e)[:500])
+        finally:
+            stop.set()
+            db.session.remove()
+
+
+def _worker_loop(app):
+    worker_name = threading.current_thread().name
+    while True:
+        job = None
+        try:
+            conn = _connect()
+            try:
+                job = _claim_next(conn, worker_name)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"[JOBS] Erreur lecture de la file: {e}")
+
+        if job is not None:
+            _run_job(app, job)
+            continue
+
+        _wakeup.wait(POLL_INTERVAL_SECONDS)
+        _wakeup.clear()
@@ -0,0 +1,475 @@
+# Code/routes/carto_plan.py
+"""
+Import « à blanc » d'une cartographie : plan de modifications relisible.
+
+Le plan est calculé à partir de la même extraction que l'import réel
+(SVG : carto_graph.extract_process_graph, règles de sync_activities_with_svg ;
+VSDX : extract_visio.plan_shapes, règles de import_shapes) confrontée à un
+instantané en mémoire de l'entité (activités, données, liens : 3 SELECT).
+Rien n'est écrit en base.
+
+Contenu (JSON) :
+- activities : create / update (renommage, is_result) / delete,
+  deleted_warning (SVG : formes disparues, signalées mais conservées)
+- data       : create / update / delete, merges (fusion des retours VSDX)
+- links      : create (extrémités par id, ou par shape_id pour une forme
+  créée par le plan) / delete / unchanged (nombre de liens gardés, id compris)
+- summary, empty (rien à écrire)
+
+Le plan est conservé (static/entities/entity_<id>/plans/<plan_id>.json)
+puis appliqué en une transaction par apply_plan, à condition que l'entité
+n'ait pas changé depuis (empreinte snapshot_hash de l'instantané).
+Un plan vide n'est pas appliqué : l'import lent est évité.
+"""
+import hashlib
+import json
+import os
+import re
+import uuid
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import selectinload
+
+from Code.extensions import db
+from Code.models.entity_stats import rebuild_entity_stats
+from Code.models.link_sync import delete_endpoint_links, delete_links, link_key
+from Code.models.models import Activities, Data, Link, Performance, activity_roles
+from Code.routes.carto_graph import RETURN_TYPE, connector_links, extract_process_graph, graph_endpoint
+
+
+PLANS_DIRNAME = "plans"
+PLAN_VERSION = 1
+# Plans conservés par entité (les plus anciens sont supprimés)
+MAX_STORED_PLANS = 5
+
+SOURCE_EXTENSIONS = {"svg": ".svg", "vsdx": ".vsdx"}
+
+_BATCH_SIZE = 500
+# Relations delete-orphan des activités, chargées en une requête par relation avant suppression
+_ACTIVITY_CHILDREN = ("tasks", "competencies", "softskills", "constraints", "savoirs", "savoir_faires", "aptitudes")
+_PLAN_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+# ============================================================
+# INSTANTANÉ DE L'ENTITÉ
+# ============================================================
+def load_snapshot(entity_id):
+    """Activités, données et liens de l'entité (une requête chacun)."""
+    acts = Activities.__table__
+    data = Data.__table__
+    links = Link.__table__
+    performances = Performance.__table__
+    return {
+        "activities": db.session.execute(
+            select(acts.c.id, acts.c.shape_id, acts.c.name, acts.c.is_result)
+            .where(acts.c.entity_id == entity_id).order_by(acts.c.id)
+        ).all(),
+        "data": db.session.execute(
+            select(data.c.id, data.c.shape_id, data.c.name, data.c.type, data.c.layer)
+            .where(data.c.entity_id == entity_id).order_by(data.c.id)
+        ).all(),
+        "links": db.session.execute(
+            select(links.c.id, links.c.type, links.c.source_activity_id, links.c.source_data_id,
+                   links.c.target_activity_id, links.c.target_data_id, links.c.description,
+                   performances.c.id.label("performance_id"))
+            .outerjoin(performances, performances.c.link_id == links.c.id)
+            .where(links.c.entity_id == entity_id).order_by(links.c.id)
+        ).all(),
+    }
+
+
+def snapshot_hash(snapshot):
+    """Empreinte de l'instantané (les performances n'en font pas partie)."""
+    h = hashlib.sha256()
+    for section in ("activities", "data", "links"):
+        for row in snapshot[section]:
+            values = tuple(row)[:7] if section == "links" else tuple(row)
+            h.update(json.dumps([section, *values], ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+# ============================================================
+# CALCUL DU PLAN
+# ============================================================
+def _ref_key(ref):
+    return (ref["kind"], ref.get("id"), ref.get("shape_id"))
+
+
+def plan_links(snapshot, wanted):
+    """
+    Différence entre les liens voulus (extrémités par référence) et ceux de
+    l'instantané, avec les règles de link_sync.sync_entity_links.
+    wanted None : liens laissés tels quels.
+    """
+    existing = sorted(snapshot["links"], key=lambda row: (row.performance_id is None, row.id))
+    if wanted is None:
+        return {"create": [], "delete": [], "unchanged": len(existing)}
+
+    wanted_keys = {}
+    create = []
+    seen = set()
+    for link in wanted:
+        signature = (link["type"], link["description"], _ref_key(link["source"]), _ref_key(link["target"]))
+        if signature in seen:
+            continue
+        seen.add(signature)
+        source, target = link["source"], link["target"]
+        if "id" in source and "id" in target:
+            row = {
+                "type": link["type"],
+                "description": link["description"],
+                "source_activity_id": source["id"] if source["kind"] == "activity" else None,
+                "source_data_id": source["id"] if source["kind"] == "data" else None,
+                "target_activity_id": target["id"] if target["kind"] == "activity" else None,
+                "target_data_id": target["id"] if target["kind"] == "data" else None,
+            }
+            wanted_keys.setdefault(link_key(row), link)
+        else:
+            create.append(link)
+
+    kept = set()
+    removed = []
+    for row in existing:
+        key = link_key(row)
+        if key in wanted_keys and key not in kept:
+            kept.add(key)
+        else:
+            removed.append({
+                "id": row.id,
+                "type": row.type,
+                "description": row.description,
+                "performance": row.performance_id is not None,
+            })
+
+    create = [link for key, link in wanted_keys.items() if key not in kept] + create
+    return {"create": create, "delete": removed, "unchanged": len(kept)}
+
+
+def plan_svg(entity_id, svg_path, snapshot, progress=None):
+    """Modifications qu'apporterait la synchronisation du SVG (sync_activities_with_svg)."""
+    graph = extract_process_graph(svg_path, progress=progress)
+    svg_activities = graph["activities"] + graph["results"]
+    svg_map = {str(act["shape_id"]): act for act in svg_activities}
+    existing = {str(row.shape_id): row for row in snapshot["activities"] if row.shape_id}
+
+    activities = {
+        "create": [
+            {"shape_id": shape_id, "name": svg_map[shape_id]["name"], "is_result": bool(svg_map[shape_id].get("is_result", False))}
+            for shape_id in sorted(set(svg_map) - set(existing))
+        ],
+        # Comme reconcile_activities : seul le nom d'une activité existante change
+        "update": [
+            {"id": row.id, "shape_id": shape_id, "old_name": row.name, "name": svg_map[shape_id]["name"], "is_result": bool(row.is_result)}
+            for shape_id, row in sorted(existing.items())
+            if shape_id in svg_map and row.name != svg_map[shape_id]["name"]
+        ],
+        "delete": [],
+        "deleted_warning": [
+            {"id": row.id, "shape_id": shape_id, "name": row.name}
+            for shape_id, row in sorted(existing.items()) if shape_id not in svg_map
+        ],
+    }
+    data = {"create": [], "update": [], "delete": []}
+    changes = {"activities": activities, "data": data, "merges": [], "links": None}
+
+    # SVG sans retours ni connecteurs : données et liens laissés en place (reconcile_process_graph)
+    if not graph["returns"] and not graph["connectors"]:
+        return changes
+
+    wanted = {r["shape_id"]: (r["name"], RETURN_TYPE, None) for r in graph["returns"]}
+    for c in graph["connectors"]:
+        wanted[c["shape_id"]] = (c["name"], c["type"], c["layer"])
+    existing_data = {row.shape_id: row for row in snapshot["data"] if row.shape_id is not None}
+    for shape_id, (name, data_type, layer) in sorted(wanted.items()):
+        row = existing_data.get(shape_id)
+        if row is None:
+            data["create"].append({"shape_id": shape_id, "name": name, "type": data_type, "layer": layer})
+        elif (row.name, row.type, row.layer) != (name, data_type, layer):
+            data["update"].append({"id": row.id, "shape_id": shape_id, "old_name": row.name, "name": name, "type": data_type, "layer": layer})
+    data["delete"] = [
+        {"id": row.id, "shape_id": shape_id, "name": row.name, "type": row.type}
+        for shape_id, row in sorted(existing_data.items()) if shape_id not in wanted
+    ]
+
+    # Extrémités : activités de l'entité après la synchro (renommages compris), puis créées
+    renamed = {item["id"]: item["name"] for item in activities["update"]}
+    activity_ids = {}
+    activity_by_name = {}
+    for row in snapshot["activities"]:
+        ref = {"kind": "activity", "id": row.id}
+        if row.shape_id:
+            activity_ids[str(row.shape_id)] = ref
+        activity_by_name.setdefault(renamed.get(row.id, row.name), ref)
+    for item in activities["create"]:
+        ref = {"kind": "activity", "shape_id": item["shape_id"]}
+        activity_ids[item["shape_id"]] = ref
+        activity_by_name.setdefault(item["name"], ref)
+    data_ids = {
+        shape_id: {"kind": "data", "id": existing_data[shape_id].id} if shape_id in existing_data
+        else {"kind": "data", "shape_id": shape_id}
+        for shape_id in wanted
+    }
+
+    endpoint = graph_endpoint(graph, activity_ids, activity_by_name, data_ids)
+    changes["links"] = [
+        {"type": c["type"], "description": c["name"], "source": source[1], "target": target[1]}
+        for c, source, target in connector_links(graph, endpoint)
+    ]
+    return changes
+
+
+def plan_vsdx(entity_id, vsdx_path):
+    """Modifications qu'apporterait extract_visio.import_vsdx."""
+    from Code.scripts.extract_visio import plan_shapes
+    from Code.scripts.vsdx_pages import parse_vsdx
+
+    changes = plan_shapes(parse_vsdx(vsdx_path), entity_id=entity_id)
+    changes["activities"]["deleted_warning"] = []
+    return changes
+
+
+def new_plan_id():
+    return uuid.uuid4().hex
+
+
+def build_plan(entity_id, source, path, filename=None, plan_id=None, progress=None):
+    """
+    Plan d'import du fichier path (source "svg" ou "vsdx") pour l'entité.
+    Aucune écriture en base.
+    """
+    snapshot = load_snapshot(entity_id)
+    if source == "vsdx":
+        changes = plan_vsdx(entity_id, path)
+    else:
+        changes = plan_svg(entity_id, path, snapshot, progress=progress)
+    db.session.rollback()  # fin de la transaction de lecture
+
+    activities, data = changes["activities"], changes["data"]
+    links = plan_links(snapshot, changes["links"])
+    summary = {
+        "activities_created": len(activities["create"]),
+        "activities_updated": len(activities["update"]),
+        "activities_deleted": len(activities["delete"]),
+        "activities_deleted_warning": len(activities["deleted_warning"]),
+        "data_created": len(data["create"]),
+        "data_updated": len(data["update"]),
+        "data_deleted": len(data["delete"]),
+        "data_merged": sum(len(m["merged_shape_ids"]) for m in changes["merges"]),
+        "links_created": len(links["create"]),
+        "links_deleted": len(links["delete"]),
+        "links_unchanged": links["unchanged"],
+        "performances_detached": sum(1 for link in links["delete"] if link["performance"]),
+    }
+    written = [k for k in summary if k.endswith(("_created", "_updated", "_deleted")) and k != "activities_deleted_warning"]
+    plan = {
+        "plan_id": plan_id or new_plan_id(),
+        "version": PLAN_VERSION,
+        "entity_id": entity_id,
+        "source": source,
+        "filename": filename or os.path.basename(path),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "snapshot_hash": snapshot_hash(snapshot),
+        "activities": activities,
+        "data": data,
+        "merges": changes["merges"],
+        "links": links,
+        "summary": summary,
+        "empty": not any(summary[k] for k in written),
+    }
+    print(f"[PLAN] entity_id={entity_id} {source} {plan['filename']}: "
+          + ", ".join(f"{k}={v}" for k, v in summary.items() if v))
+    return plan
+
+
+# ============================================================
+# STOCKAGE
+# ============================================================
+def plans_dir(entity_dir):
+    return os.path.join(entity_dir, PLANS_DIRNAME)
+
+
+def plan_source_path(entity_dir, plan_id, source):
+    """Fichier importé conservé avec le plan (installé à l'application d'un plan SVG)."""
+    return os.path.join(plans_dir(entity_dir), plan_id + SOURCE_EXTENSIONS[source])
+
+
+def save_plan(entity_dir, plan):
+    directory = plans_dir(entity_dir)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, plan["plan_id"] + ".json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+    _prune_plans(directory)
+
+
+def load_plan(entity_dir, plan_id):
+    """Plan conservé, ou None (identifiant inconnu ou invalide)."""
+    if not _PLAN_ID_RE.match(plan_id or ""):
+        return None
+    path = os.path.join(plans_dir(entity_dir), plan_id + ".json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        plan = json.load(f)
+    return plan if plan.get("version") == PLAN_VERSION else None
+
+
+def discard_plan(entity_dir, plan_id):
+    """Supprime un plan et son fichier source."""
+    if not _PLAN_ID_RE.match(plan_id or ""):
+        return
+    directory = plans_dir(entity_dir)
+    for suffix in (".json", *SOURCE_EXTENSIONS.values()):
+        path = os.path.join(directory, plan_id + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _prune_plans(directory):
+    plans = sorted(
+        (name for name in os.listdir(directory) if name.endswith(".json")),
+        key=lambda name: os.path.getmtime(os.path.join(directory, name)),
+        reverse=True,
+    )
+    for name in plans[MAX_STORED_PLANS:]:
+        discard_plan(os.path.dirname(directory), name[:-len(".json")])
+
+
+# ============================================================
+# APPLICATION
+# ============================================================
+def apply_plan(entity_id, plan):
+    """
+    Applique un plan en une transaction.
+    Retourne {"status": "applied" | "unchanged" | "stale", ...} ;
+    "stale" : l'entité a changé depuis le calcul du plan (rien n'est écrit).
+    """
+    if plan["empty"]:
+        print(f"[PLAN] Plan {plan['plan_id'][:8]} vide : rien à appliquer")
+        return {"status": "unchanged", "summary": plan["summary"]}
+
+    try:
+        if snapshot_hash(load_snapshot(entity_id)) != plan["snapshot_hash"]:
+            db.session.rollback()
+            print(f"[PLAN] Plan {plan['plan_id'][:8]} obsolète (entity_id={entity_id})")
+            return {"status": "stale"}
+        _apply_changes(entity_id, plan)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Écritures groupées hors ORM : compteurs de l'entité recalculés
+    rebuild_entity_stats([entity_id])
+    print(f"[PLAN] Plan {plan['plan_id'][:8]} appliqué (entity_id={entity_id})")
+    return {"status": "applied", "summary": plan["summary"]}
+
+
+def _delete_rows(table, ids):
+    for i in range(0, len(ids), _BATCH_SIZE):
+        db.session.execute(delete(table).where(table.c.id.in_(ids[i:i + _BATCH_SIZE])))
+
+
+def _delete_activities(ids):
+    """
+    Supprime des activités comme l'import VSDX : par l'ORM, pour que les
+    cascades delete-orphan (tâches, compétences, savoirs...) s'appliquent.
+    Les rattachements aux rôles (activity_roles, sans relation ORM) partent
+    d'abord en DELETE groupé.
+    """
+    for i in range(0, len(ids), _BATCH_SIZE):
+        batch = ids[i:i + _BATCH_SIZE]
+        db.session.execute(delete(activity_roles).where(activity_roles.c.activity_id.in_(batch)))
+        for act in Activities.query.filter(Activities.id.in_(batch)).options(
+            *(selectinload(getattr(Activities, name)) for name in _ACTIVITY_CHILDREN)
+        ):
+            db.session.delete(act)
+    db.session.flush()
+
+
+def _apply_changes(entity_id, plan):
+    acts = Activities.__table__
+    data = Data.__table__
+    links = Link.__table__
+
+    # 1. Suppressions (liens d'abord : clés étrangères)
+    delete_links([link["id"] for link in plan["links"]["delete"]])
+    activity_ids = [item["id"] for item in plan["activities"]["delete"]]
+    data_ids = [item["id"] for item in plan["data"]["delete"]]
+    delete_endpoint_links(activity_ids=activity_ids, data_ids=data_ids)
+    _delete_rows(data, data_ids)
+    _delete_activities(activity_ids)
+
+    # 2. Mises à jour groupées (executemany)
+    if plan["activities"]["update"]:
+        db.session.execute(
+            update(acts).where(acts.c.id == bindparam("b_id"))
+            .values(name=bindparam("b_name"), is_result=bindparam("b_is_result")),
+            [{"b_id": item["id"], "b_name": item["name"], "b_is_result": item["is_result"]}
+             for item in plan["activities"]["update"]]
+        )
+    if plan["data"]["update"]:
+        db.session.execute(
+            update(data).where(data.c.id == bindparam("b_id"))
+            .values(name=bindparam("b_name"), type=bindparam("b_type"), layer=bindparam("b_layer")),
+            [{"b_id": item["id"], "b_name": item["name"], "b_type": item["type"], "b_layer": item["layer"]}
+             for item in plan["data"]["update"]]
+        )
+
+    # 3. Créations groupées
+    if plan["activities"]["create"]:
+        db.session.execute(insert(acts), [
+            {
+                "entity_id": entity_id,
+                "shape_id": item["shape_id"],
+                "name": item["name"],
+                "description": "",
+                "is_result": item["is_result"],
+                "duration_minutes": 0,
+                "delay_minutes": 0,
+            }
+            for item in plan["activities"]["create"]
+        ])
+    if plan["data"]["create"]:
+        db.session.execute(insert(data), [
+            {"entity_id": entity_id, "shape_id": item["shape_id"], "name": item["name"],
+             "type": item["type"], "layer": item["layer"]}
+            for item in plan["data"]["create"]
+        ])
+
+    # 4. Liens : formes créées par le plan résolues par shape_id
+    created = plan["links"]["create"]
+    if not created:
+        return
+    shape_ids = {"activity": {}, "data": {}}
+    if any("id" not in link[end] for link in created for end in ("source", "target")):
+        for kind, table in (("activity", acts), ("data", data)):
+            for row in db.session.execute(
+                select(table.c.id, table.c.shape_id)
+                .where(table.c.entity_id == entity_id, table.c.shape_id.isnot(None))
+            ):
+                shape_ids[kind].setdefault(str(row.shape_id), row.id)
+
+    def resolve(ref):
+        if "id" in ref:
+            return ref["id"]
+        row_id = shape_ids[ref["kind"]].get(str(ref["shape_id"]))
+        if row_id is None:
+            raise ValueError(f"Forme du plan introuvable : {ref['kind']} shape_id={ref['shape_id']}")
+        return row_id
+
+    rows = []
+    for link in created:
+        source, target = link["source"], link["target"]
+        rows.append({
+            "entity_id": entity_id,
+            "type": link["type"],
+            "description": link["description"],
+            "source_activity_id": resolve(source) if source["kind"] == "activity" else None,
+            "source_data_id": resolve(source) if source["kind"] == "data" else None,
+            "target_activity_id": resolve(target) if target["kind"] == "activity" else None,
+            "target_data_id": resolve(target) if target["kind"] == "data" else None,
+        })
+    db.session.execute(insert(links), rows)
@@ -0,0 +1,159 @@
+# Code/routes/carto_shape_index.py
+"""
+Index compact des formes de la dernière cartographie synchronisée d'une entité.
+
+    shape_id -> [hash_du_nom, calque, texte]
+
+(calque 1 : activité, calque 6 : résultat, cf. carto_graph)
+
+Stocké à côté du SVG (static/entities/entity_<id>/shape_index.json.gz).
+À l'upload suivant, la comparaison avec la nouvelle extraction donne le
+delta (formes ajoutées / renommées / supprimées) : seul ce delta est
+envoyé à la synchronisation en base, et il est conservé pour le front
+(last_delta.json) afin de surligner les changements.
+
+L'index enregistre aussi l'état des activités en base à la fin de la
+synchro (nombre + empreinte, cf. activities_db_state). D'autres écritures
+(renommage dans l'interface, import VSDX, application d'un plan) modifient
+ces lignes sans passer par l'index : si l'état en base ne correspond plus,
+l'index n'est plus fiable et la synchro suivante doit être complète.
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from Code.routes.carto_graph import ACTIVITY_LAYER, RESULT_LAYER
+
+
+INDEX_FILENAME = "shape_index.json.gz"
+DELTA_FILENAME = "last_delta.json"
+INDEX_VERSION = 2
+
+
+def _name_hash(name):
+    # 8 octets suffisent pour détecter un renommage
+    return hashlib.blake2b(name.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def build_shape_index(svg_activities):
+    """Construit l'index à partir de la liste [{shape_id, name, is_result}] extraite du SVG."""
+    return {
+        str(act["shape_id"]): [
+            _name_hash(act["name"]),
+            RESULT_LAYER if act.get("is_result") else ACTIVITY_LAYER,
+            act["name"],
+        ]
+        for act in svg_activities
+    }
+
+
+def activities_db_state(rows):
+    """
+    État des activités d'une entité en base : {"count", "checksum"}.
+    rows : lignes (shape_id, name, is_result).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    count = 0
+    for shape_id, name, is_result in sorted((str(r[0]), r[1] or "", bool(r[2])) for r in rows):
+        digest.update(f"{shape_id}\x1f{name}\x1f{int(is_result)}\x1e".encode("utf-8"))
+        count += 1
+    return {"count": count, "checksum": digest.hexdigest()}
+
+
+def diff_shape_index(old_index, new_index):
+    """
+    Compare deux index. Retourne un dict :
+      added   : [{shape_id, name}]
+      removed : [{shape_id, name}]
+      changed : [{shape_id, old, new}]
+      unchanged_count : int
+    """
+    old_ids = set(old_index)
+    new_ids = set(new_index)
+
+    added = [
+        {"shape_id": sid, "name": new_index[sid][2]}
+        for sid in sorted(new_ids - old_ids)
+    ]
+    removed = [
+        {"shape_id": sid, "name": old_index[sid][2]}
+        for sid in sorted(old_ids - new_ids)
+    ]
+    changed = []
+    unchanged_count = 0
+    for sid in sorted(old_ids & new_ids):
+        if old_index[sid][0] != new_index[sid][0] or old_index[sid][1] != new_index[sid][1]:
+            changed.append({"shape_id": sid, "old": old_index[sid][2], "new": new_index[sid][2]})
+        else:
+            unchanged_count += 1
+
+    return {
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "unchanged_count": unchanged_count,
+    }
+
+
+def delta_shape_ids(delta):
+    """Ensemble des shape_id touchés par un delta."""
+    return (
+        {d["shape_id"] for d in delta["added"]}
+        | {d["shape_id"] for d in delta["removed"]}
+        | {d["shape_id"] for d in delta["changed"]}
+    )
+
+
+def load_shape_index(entity_dir):
+    """
+    Index enregistré : {"shapes": {...}, "db_state": {...}}
+    (ou None si absent / illisible / d'une autre version).
+    """
+    path = os.path.join(entity_dir, INDEX_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[INDEX] Index illisible {path}: {e}")
+        return None
+    if data.get("version") != INDEX_VERSION:
+        return None
+    return {"shapes": data.get("shapes") or {}, "db_state": data.get("db_state")}
+
+
+def save_shape_index(entity_dir, index, db_state, delta=None):
+    """Enregistre l'index, l'état des activités en base (et le dernier delta) de façon atomique."""
+    os.makedirs(entity_dir, exist_ok=True)
+    path = os.path.join(entity_dir, INDEX_FILENAME)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "shapes": index, "db_state": db_state}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+    if delta is not None:
+        delta_path = os.path.join(entity_dir, DELTA_FILENAME)
+        with open(delta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(dict(delta, computed_at=datetime.utcnow().isoformat(timespec="seconds")), f, ensure_ascii=False)
+        os.replace(delta_path + ".tmp", delta_path)
+
+
+def load_last_delta(entity_dir):
+    path = os.path.join(entity_dir, DELTA_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def clear_shape_index(entity_dir):
+    """Supprime l'index : la prochaine synchronisation sera complète."""
+    path = os.path.join(entity_dir, INDEX_FILENAME)
+    if os.path.exists(path):
+        os.remove(path)
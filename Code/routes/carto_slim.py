@@ -0,0 +1,330 @@
+# Code/routes/carto_slim.py
+"""
+Allègement des SVG Visio à l'upload (avant compression et synchronisation).
+
+Les exports Visio embarquent beaucoup de données que le front ne lit pas :
+blocs v:userDefs / v:custProps / v:textBlock..., attributs v:*, <title>
+et <desc> de chaque forme, coordonnées à 4-6 décimales. On réécrit le SVG :
+- suppression des éléments Visio (v:*) et des <title>/<desc>/<metadata> ;
+- suppression des attributs v:* SAUF v:mID et v:layerMember
+  (utilisés par extract_activities_from_svg et shape_activity_map) ;
+- styles inline regroupés en classes CSS (feuille ajoutée en fin de SVG) ;
+- coordonnées arrondies à COORD_DECIMALS décimales (transform : translation
+  seulement, facteurs d'échelle et de rotation conservés) ;
+- suppression des groupes <g> devenus vides et des blancs hors <text>.
+
+Le texte des <text> est conservé à l'identique (extraction des activités
+inchangée). L'original est gardé à côté : carto.svg → carto.original.svg.
+Réécriture en flux (iterparse) : mémoire constante comme pour l'extraction.
+"""
+import os
+import re
+import xml.etree.ElementTree as ET
+
+
+SVG_NS = "http://www.w3.org/2000/svg"
+VISIO_NS = "http://schemas.microsoft.com/visio/2003/SVGExtensions/"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+
+ORIGINAL_SUFFIX = ".original.svg"
+
+# 0,01 pt : invisible à l'écran, quel que soit le zoom utilisé par le front
+COORD_DECIMALS = 2
+
+# Attributs Visio encore lus par l'application
+KEPT_VISIO_ATTRS = {f"{{{VISIO_NS}}}mID", f"{{{VISIO_NS}}}layerMember"}
+
+# Éléments SVG sans rendu (les noms Visio "Feuille.12" en <title>, le texte dupliqué en <desc>)
+DROPPED_SVG_TAGS = {f"{{{SVG_NS}}}{tag}" for tag in ("title", "desc", "metadata")}
+
+COORD_ATTRS = {
+    "x", "y", "dx", "dy", "width", "height", "x1", "y1", "x2", "y2",
+    "cx", "cy", "r", "rx", "ry", "d", "points",
+}
+
+# Préfixe des classes générées (Visio utilise st<n>)
+STYLE_CLASS_PREFIX = "cs"
+
+_GROUP_TAG = f"{{{SVG_NS}}}g"
+_TEXT_TAG = f"{{{SVG_NS}}}text"
+_STYLE_TAG = f"{{{SVG_NS}}}style"
+
+# Découpe d'un nombre SVG ("0.5.25" = 0.5 puis .25 dans un chemin compact)
+_NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+# Une fonction d'un attribut transform : nom(arguments)
+_TRANSFORM_RE = re.compile(r"(\w+)\s*\(([^)]*)\)")
+
+
+def original_svg_path(svg_path):
+    """Chemin de l'original conservé à côté du SVG allégé."""
+    return os.path.splitext(svg_path)[0] + ORIGINAL_SUFFIX
+
+
+def _round_number(match):
+    token = match.group()
+    if "e" in token or "E" in token:
+        return token
+    dot = token.find(".")
+    if dot < 0 or len(token) - dot - 1 <= COORD_DECIMALS:
+        return token
+    text = f"{float(token):.{COORD_DECIMALS}f}".rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+
+def round_coords(value):
+    return _NUMBER_RE.sub(_round_number, value)
+
+
+def _round_transform_function(match):
+    name, args = match.group(1), match.group(2)
+    if name == "translate":
+        return f"{name}({round_coords(args)})"
+    if name == "matrix":
+        # Seule la translation (e, f) est une coordonnée ; a..d restent exacts
+        numbers = _NUMBER_RE.findall(args)
+        if len(numbers) == 6:
+            return f"{name}({','.join(numbers[:4] + [round_coords(n) for n in numbers[4:]])})"
+    # scale, rotate, skewX / skewY : facteurs et angles conservés tels quels
+    return match.group()
+
+
+def round_transform(value):
+    """
+    Arrondit les seules composantes de translation d'un attribut transform :
+    un facteur d'échelle ou de rotation arrondi à 0,01 déformerait la forme
+    (scale(0.0254) → scale(0.03), +18 %).
+    """
+    return _TRANSFORM_RE.sub(_round_transform_function, value)
+
+
+def _escape_text(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_attr(value):
+    return (
+        _escape_text(value)
+        .replace('"', "&quot;")
+        .replace("\n", "&#10;")
+        .replace("\r", "&#13;")
+        .replace("\t", "&#09;")
+    )
+
+
+class _Frame:
+    """Élément ouvert : la balise n'est écrite qu'au premier contenu conservé."""
+
+    __slots__ = ("elem", "start_tag", "end_tag", "in_text", "is_group", "is_style", "written", "text_done")
+
+    def __init__(self, elem, start_tag, end_tag, in_text):
+        self.elem = elem
+        self.start_tag = start_tag
+        self.end_tag = end_tag
+        self.in_text = in_text
+        self.is_group = elem.tag == _GROUP_TAG
+        self.is_style = elem.tag == _STYLE_TAG
+        self.written = False
+        self.text_done = False
+
+
+class _SvgSlimmer:
+
+    def __init__(self, out):
+        self.out = out
+        self.prefixes = {XML_NS: "xml"}
+        self.pending_ns = []
+        self.stack = []
+        self.skip = 0
+        # (élément fermé, sa queue est-elle dans un <text>) : la queue n'est
+        # complète qu'à l'événement suivant
+        self.last = None
+        self.styles = {}
+        self.stats = {"elements_dropped": 0, "groups_dropped": 0, "styles_collapsed": 0}
+
+    # --------------------------------------------------------
+    # Écriture
+    # --------------------------------------------------------
+    def _qname(self, name):
+        if name[0] != "{":
+            return name
+        uri, local = name[1:].split("}", 1)
+        prefix = self.prefixes.get(uri)
+        if prefix is None:
+            return None
+        return f"{prefix}:{local}" if prefix else local
+
+    def _open_ancestors(self, include_current=True):
+        for frame in (self.stack if include_current else self.stack[:-1]):
+            if not frame.written:
+                self.out.write(frame.start_tag)
+                frame.written = True
+
+    def _write_content(self, text, frame):
+        self._open_ancestors()
+        if frame.is_style and "]]>" not in text:
+            self.out.write(f"<![CDATA[{text}]]>")
+        else:
+            self.out.write(_escape_text(text))
+
+    def _settle_text(self, frame):
+        """Texte de l'élément (complet dès le premier enfant ou à la fermeture)."""
+        if frame.text_done:
+            return
+        frame.text_done = True
+        text = frame.elem.text
+        if text and (frame.in_text or text.strip()):
+            self._write_content(text, frame)
+
+    def _settle_tail(self):
+        if self.last is None:
+            return
+        elem, in_text = self.last
+        self.last = None
+        tail = elem.tail
+        if tail and (in_text or tail.strip()):
+            self._write_content(tail, self.stack[-1])
+        elem.clear()
+        # Les enfants se ferment dans l'ordre : le plus ancien encore attaché est elem
+        parent = self.stack[-1].elem if self.stack else None
+        if parent is not None and len(parent) and parent[0] is elem:
+            del parent[0]
+
+    def _attributes(self, elem, is_root):
+        attrs = []
+        classes = elem.get("class")
+        for name, value in elem.attrib.items():
+            if name.startswith(f"{{{VISIO_NS}}}") and name not in KEPT_VISIO_ATTRS:
+                continue
+            if name == "class":
+                continue
+            if name == "style" and value.strip():
+                style = value.strip().rstrip(";")
+                cls = self.styles.get(style)
+                if cls is None:
+                    cls = f"{STYLE_CLASS_PREFIX}{len(self.styles)}"
+                    self.styles[style] = cls
+                self.stats["styles_collapsed"] += 1
+                classes = f"{classes} {cls}" if classes else cls
+                continue
+            if not is_root and name in COORD_ATTRS:
+                value = round_coords(value)
+            elif not is_root and name == "transform":
+                value = round_transform(value)
+            qname = self._qname(name)
+            if qname is None:
+                continue
+            attrs.append(f' {qname}="{_escape_attr(value)}"')
+        if classes is not None:
+            attrs.append(f' class="{_escape_attr(classes)}"')
+        return "".join(attrs)
+
+    # --------------------------------------------------------
+    # Événements
+    # --------------------------------------------------------
+    def start_ns(self, prefix, uri):
+        self.prefixes.setdefault(uri, prefix)
+        self.pending_ns.append((prefix, uri))
+
+    def start(self, elem):
+        self._settle_tail()
+        if self.skip:
+            self.skip += 1
+            return
+        parent = self.stack[-1] if self.stack else None
+        if parent is not None:
+            self._settle_text(parent)
+
+        if elem.tag.startswith(f"{{{VISIO_NS}}}") or elem.tag in DROPPED_SVG_TAGS:
+            self.skip = 1
+            self.pending_ns = []
+            self.stats["elements_dropped"] += 1
+            return
+
+        qname = self._qname(elem.tag)
+        ns_decls = "".join(
+            f' xmlns:{prefix}="{_escape_attr(uri)}"' if prefix else f' xmlns="{_escape_attr(uri)}"'
+            for prefix, uri in self.pending_ns
+        )
+        self.pending_ns = []
+        start_tag = f"<{qname}{ns_decls}{self._attributes(elem, parent is None)}>"
+        in_text = elem.tag == _TEXT_TAG or (parent is not None and parent.in_text)
+        self.stack.append(_Frame(elem, start_tag, f"</{qname}>", in_text))
+
+    def end(self, elem):
+        if self.skip:
+            self.skip -= 1
+            if not self.skip:
+                # Élément supprimé : sa queue (texte qui suit) reste à traiter
+                self.last = (elem, bool(self.stack) and self.stack[-1].in_text)
+            return
+
+        self._settle_tail()
+        frame = self.stack[-1]
+        self._settle_text(frame)
+        is_root = len(self.stack) == 1
+
+        if is_root and self.styles:
+            self._open_ancestors()
+            rules = "\n".join(f".{cls} {{{style}}}" for style, cls in self.styles.items())
+            self.out.write(f"<style type=\"text/css\"><![CDATA[\n{rules}\n]]></style>")
+
+        if frame.written:
+            self.out.write(frame.end_tag)
+        elif frame.is_group and not is_root:
+            self.stats["groups_dropped"] += 1
+        else:
+            self._open_ancestors(include_current=False)
+            self.out.write(frame.start_tag[:-1] + "/>")
+
+        self.stack.pop()
+        if self.stack:
+            self.last = (elem, self.stack[-1].in_text)
+        else:
+            elem.clear()
+
+
+def slim_svg(svg_path):
+    """
+    Allège svg_path sur place et conserve l'original (original_svg_path).
+    Retourne les statistiques (tailles avant / après, éléments supprimés...)
+    ou None si le SVG n'a pas pu être réécrit (il reste alors servi tel quel).
+    """
+    original_path = original_svg_path(svg_path)
+    tmp_path = svg_path + ".slim.tmp"
+    original_bytes = os.path.getsize(svg_path)
+
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+            out.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+            slimmer = _SvgSlimmer(out)
+            for event, item in ET.iterparse(svg_path, events=("start-ns", "start", "end")):
+                if event == "start-ns":
+                    slimmer.start_ns(*item)
+                elif event == "start":
+                    slimmer.start(item)
+                else:
+                    slimmer.end(item)
+            out.write("\n")
+    except Exception as e:
+        print(f"[SLIM] SVG non allégé ({svg_path}): {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        # Un original d'un upload précédent ne correspond plus au SVG servi
+        if os.path.exists(original_path):
+            os.remove(original_path)
+        return None
+
+    os.replace(svg_path, original_path)
+    os.replace(tmp_path, svg_path)
+
+    slimmed_bytes = os.path.getsize(svg_path)
+    stats = dict(
+        slimmer.stats,
+        original_bytes=original_bytes,
+        slimmed_bytes=slimmed_bytes,
+        saved_bytes=original_bytes - slimmed_bytes,
+        saved_percent=round(100.0 * (original_bytes - slimmed_bytes) / original_bytes, 1) if original_bytes else 0.0,
+        original_filename=os.path.basename(original_path),
+    )
+    print(f"[SLIM] {svg_path}: {original_bytes} o → {slimmed_bytes} o (-{stats['saved_percent']} %)")
+    return stats
@@ -0,0 +1,621 @@
+# Code/routes/carto_tiles.py
+"""
+Découpage des cartographies en tuiles, par zone et par niveau de détail.
+
+Pour les très grandes cartographies, le front ne charge plus tout le SVG :
+il charge un socle (base.svg : balise <svg>, styles, <defs>) puis seulement
+les tuiles visibles au niveau de zoom courant.
+
+Arborescence (static/entities/entity_<id>/tiles/) :
+    manifest.json        niveaux, tuiles, emprise et mID présents par tuile
+    base.svg             <svg> racine + <style>/<defs>, sans formes
+    z<z>/<x>_<y>.svg     fragment <g> : formes de la tuile (x, y) du niveau z
+    z<z>/backdrop.svg    formes plus grandes qu'une tuile du niveau z
+
+- Niveau z : grille de 2^z × 2^z tuiles sur la viewBox.
+- Chaque forme Visio "feuille" (<g> sans sous-groupe, ou élément isolé)
+  est placée dans UNE tuile par niveau, celle qui contient son centre :
+  pas de doublon à l'affichage ; l'emprise réelle de la tuile ("bounds")
+  est enregistrée pour que le client sache quand la charger.
+- Niveaux < MAX_LEVEL : formes trop petites pour être visibles omises,
+  et textes omis sous TEXT_MIN_LEVEL (vue d'ensemble).
+- Formes plus grandes qu'une tuile (couloirs...) : tuile "backdrop" du
+  niveau, toujours chargée et dessinée sous les autres.
+- Les groupes englobants (couloirs, conteneurs) sont réouverts dans
+  chaque tuile avec leurs attributs (transform, v:mID).
+
+Lecture en flux (iterparse) : les tuiles sont écrites au fil du parsing.
+"""
+import json
+import math
+import os
+import re
+import shutil
+import xml.etree.ElementTree as ET
+
+
+SVG_NS = "http://www.w3.org/2000/svg"
+VISIO_NS = "http://schemas.microsoft.com/visio/2003/SVGExtensions/"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+
+TILES_DIRNAME = "tiles"
+MANIFEST_FILENAME = "manifest.json"
+BASE_FILENAME = "base.svg"
+MANIFEST_FORMAT = 1
+
+# Niveaux 0..MAX_LEVEL (1, 4, 16 tuiles)
+MAX_LEVEL = 2
+TEXT_MIN_LEVEL = 1
+# Au niveau 0, une forme plus petite que 1/400e de la carte n'est pas dessinée
+# (seuil divisé par 2 à chaque niveau, aucun filtre au niveau MAX_LEVEL)
+LOD_MIN_FRACTION = 1.0 / 400
+# Coordonnées de la tuile d'arrière-plan d'un niveau (formes plus grandes qu'une tuile,
+# chargée en premier et placée sous les autres pour garder l'ordre de dessin)
+BACKDROP = -1
+# En dessous, le SVG complet reste plus simple à charger que des tuiles
+TILED_MIN_UNITS = 1500
+
+# Estimation grossière de l'emprise d'un texte (unités utilisateur)
+TEXT_CHAR_WIDTH = 6.0
+TEXT_HEIGHT = 12.0
+
+_GROUP_TAG = f"{{{SVG_NS}}}g"
+_TEXT_TAG = f"{{{SVG_NS}}}text"
+_MID_ATTR = f"{{{VISIO_NS}}}mID"
+
+# Éléments sans géométrie propre, communs à toutes les tuiles (→ base.svg)
+_SHARED_TAGS = {
+    f"{{{SVG_NS}}}{tag}"
+    for tag in ("style", "defs", "symbol", "marker", "pattern", "clipPath",
+                "mask", "linearGradient", "radialGradient", "filter")
+}
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_NUMBER_RE = re.compile(_NUMBER)
+_PATH_TOKEN_RE = re.compile(rf"[MmZzLlHhVvCcSsQqTtAa]|{_NUMBER}")
+_TRANSFORM_RE = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+_PATH_ARGS = {"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "T": 2, "A": 7, "Z": 0}
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# chemin du manifeste -> ((mtime_ns, taille), manifeste)
+_manifest_cache = {}
+
+
+def tiles_dir(entity_dir):
+    return os.path.join(entity_dir, TILES_DIRNAME)
+
+
+# ============================================================
+# GÉOMÉTRIE
+# ============================================================
+def multiply(m, n):
+    """Produit de matrices affines (a, b, c, d, e, f) : m appliquée après n."""
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + c * b2,
+        b * a2 + d * b2,
+        a * c2 + c * d2,
+        b * c2 + d * d2,
+        a * e2 + c * f2 + e,
+        b * e2 + d * f2 + f,
+    )
+
+
+def parse_transform(value):
+    """Attribut transform SVG → matrice (a, b, c, d, e, f)."""
+    matrix = IDENTITY
+    if not value:
+        return matrix
+    for name, args in _TRANSFORM_RE.findall(value):
+        v = [float(x) for x in _NUMBER_RE.findall(args)]
+        if name == "matrix" and len(v) == 6:
+            step = tuple(v)
+        elif name == "translate" and v:
+            step = (1.0, 0.0, 0.0, 1.0, v[0], v[1] if len(v) > 1 else 0.0)
+        elif name == "scale" and v:
+            step = (v[0], 0.0, 0.0, v[1] if len(v) > 1 else v[0], 0.0, 0.0)
+        elif name == "rotate" and v:
+            rad = math.radians(v[0])
+            cos, sin = math.cos(rad), math.sin(rad)
+            step = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(v) == 3:
+                cx, cy = v[1], v[2]
+                step = multiply(multiply((1.0, 0.0, 0.0, 1.0, cx, cy), step), (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+        elif name == "skewX" and v:
+            step = (1.0, 0.0, math.tan(math.radians(v[0])), 1.0, 0.0, 0.0)
+        elif name == "skewY" and v:
+            step = (1.0, math.tan(math.radians(v[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            continue
+        matrix = multiply(matrix, step)
+    return matrix
+
+
+def path_points(d):
+    """Points d'ancrage et de contrôle d'un chemin (suffisant pour une emprise)."""
+    tokens = _PATH_TOKEN_RE.findall(d or "")
+    points = []
+    x = y = start_x = start_y = 0.0
+    cmd = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.isalpha():
+            cmd = token
+            i += 1
+            if cmd in "Zz":
+                x, y = start_x, start_y
+            continue
+        if cmd is None:
+            break
+        upper = cmd.upper()
+        count = _PATH_ARGS.get(upper, 0)
+        if count == 0 or i + count > len(tokens):
+            break
+        try:
+            args = [float(t) for t in tokens[i:i + count]]
+        except ValueError:
+            break
+        i += count
+        rel = cmd.islower()
+        if upper == "H":
+            x = x + args[0] if rel else args[0]
+        elif upper == "V":
+            y = y + args[0] if rel else args[0]
+        elif upper == "A":
+            x, y = (x + args[5], y + args[6]) if rel else (args[5], args[6])
+        else:
+            for k in range(0, count - 2, 2):
+                points.append((x + args[k], y + args[k + 1]) if rel else (args[k], args[k + 1]))
+            x, y = (x + args[-2], y + args[-1]) if rel else (args[-2], args[-1])
+        points.append((x, y))
+        if upper == "M":
+            start_x, start_y = x, y
+            # Coordonnées suivantes d'un M implicite = L
+            cmd = "l" if rel else "L"
+    return points
+
+
+def _num(elem, name, default=0.0):
+    values = _NUMBER_RE.findall(elem.get(name) or "")
+    return float(values[0]) if values else default
+
+
+def _local_points(elem):
+    """Points de l'élément dans son propre repère (sans son transform)."""
+    tag = elem.tag.rsplit("}", 1)[-1]
+    if tag in ("rect", "image", "use", "foreignObject"):
+        x, y = _num(elem, "x"), _num(elem, "y")
+        return [(x, y), (x + _num(elem, "width"), y + _num(elem, "height"))]
+    if tag in ("circle", "ellipse"):
+        cx, cy = _num(elem, "cx"), _num(elem, "cy")
+        rx = _num(elem, "rx", _num(elem, "r"))
+        ry = _num(elem, "ry", _num(elem, "r"))
+        return [(cx - rx, cy - ry), (cx + rx, cy + ry)]
+    if tag == "line":
+        return [(_num(elem, "x1"), _num(elem, "y1")), (_num(elem, "x2"), _num(elem, "y2"))]
+    if tag in ("polyline", "polygon"):
+        values = [float(v) for v in _NUMBER_RE.findall(elem.get("points") or "")]
+        return list(zip(values[0::2], values[1::2]))
+    if tag == "path":
+        return path_points(elem.get("d"))
+    if tag in ("text", "tspan"):
+        x, y = _num(elem, "x"), _num(elem, "y")
+        width = len("".join(elem.itertext()).strip()) * TEXT_CHAR_WIDTH
+        return [(x, y - TEXT_HEIGHT), (x + width, y + TEXT_HEIGHT / 3)]
+    return []
+
+
+def element_bbox(elem, ctm):
+    """Emprise (x0, y0, x1, y1) d'un sous-arbre dans le repère de la carte, ou None."""
+    box = None
+    matrix = multiply(ctm, parse_transform(elem.get("transform")))
+    a, b, c, d, e, f = matrix
+    for px, py in _local_points(elem):
+        tx, ty = a * px + c * py + e, b * px + d * py + f
+        if box is None:
+            box = [tx, ty, tx, ty]
+        else:
+            box = [min(box[0], tx), min(box[1], ty), max(box[2], tx), max(box[3], ty)]
+    if elem.tag == _TEXT_TAG:
+        # Les <tspan> sont déjà comptés dans l'estimation du texte
+        return box
+    for child in elem:
+        child_box = element_bbox(child, matrix)
+        box = child_box if box is None else _union(box, child_box)
+    return box
+
+
+def _union(box, other):
+    if other is None:
+        return box
+    if box is None:
+        return list(other)
+    return [min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])]
+
+
+# ============================================================
+# SÉRIALISATION
+# ============================================================
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _quote_attr(value):
+    if "&" in value or "<" in value or ">" in value:
+        value = _escape(value)
+    if '"' in value:
+        value = value.replace('"', "&quot;")
+    if "\n" in value or "\t" in value or "\r" in value:
+        value = value.replace("\n", "&#10;").replace("\t", "&#09;").replace("\r", "&#13;")
+    return f'"{value}"'
+
+
+class _Writer:
+
+    def __init__(self):
+        self.prefixes = {XML_NS: "xml"}
+
+    def qname(self, name):
+        if name[0] != "{":
+            return name
+        uri, local = name[1:].split("}", 1)
+        prefix = self.prefixes.get(uri)
+        if prefix is None:
+            return None
+        return f"{prefix}:{local}" if prefix else local
+
+    def attributes(self, elem):
+        parts = []
+        for name, value in elem.attrib.items():
+            qname = self.qname(name)
+            if qname:
+                parts.append(f" {qname}={_quote_attr(value)}")
+        return "".join(parts)
+
+    def start_tag(self, elem):
+        return f"<{self.qname(elem.tag)}{self.attributes(elem)}>"
+
+    def serialize(self, elem, skip_text=False):
+        """Sous-arbre → chaîne XML ('' si tout est omis)."""
+        if skip_text and elem.tag == _TEXT_TAG:
+            return ""
+        qname = self.qname(elem.tag)
+        inner = _escape(elem.text) if elem.text else ""
+        for child in elem:
+            inner += self.serialize(child, skip_text)
+            if child.tail:
+                inner += _escape(child.tail)
+        if not inner:
+            if skip_text and elem.tag == _GROUP_TAG:
+                return ""
+            return f"<{qname}{self.attributes(elem)}/>"
+        return f"<{qname}{self.attributes(elem)}>{inner}</{qname}>"
+
+
+def _mids(elem):
+    return [e.get(_MID_ATTR) for e in elem.iter() if e.get(_MID_ATTR)]
+
+
+# ============================================================
+# TUILES
+# ============================================================
+class _Tile:
+    """Fragment en cours d'écriture (ouvert au premier contenu)."""
+
+    def __init__(self, path, ns_decls):
+        self.path = path
+        self.ns_decls = ns_decls
+        self.file = None
+        self.open_depth = 1  # la racine <svg> n'est jamais réécrite dans une tuile
+        self.bounds = None
+        self.shapes = []
+        self.units = 0
+
+    def write(self, text):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, "w", encoding="utf-8")
+            self.file.write(f'<g class="carto-tile"{self.ns_decls}>')
+        self.file.write(text)
+
+    def close(self):
+        if self.file is None:
+            return None
+        self.file.write("</g>")
+        self.file.close()
+        return os.path.getsize(self.path)
+
+
+class _Frame:
+    __slots__ = ("elem", "ctm", "composite", "pending")
+
+    def __init__(self, elem, ctm):
+        self.elem = elem
+        self.ctm = ctm
+        self.composite = False
+        # Enfants non groupes en attente : (élément, ctm) ; publiés un à un si le
+        # groupe contient aussi des sous-groupes, sinon avec le groupe entier
+        self.pending = []
+
+
+class _Tiler:
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.writer = _Writer()
+        self.ns_decls = []
+        self.stack = []
+        self.leaf_depth = 0
+        self.shared = []
+        self.tiles = {}
+        self.view_box = None
+        self.root_start = None
+        self.units = 0
+
+    # --------------------------------------------------------
+    def _level_of(self, z):
+        n = 2 ** z
+        _, _, width, height = self.view_box
+        min_size = 0.0 if z == MAX_LEVEL else max(width, height) * LOD_MIN_FRACTION / n
+        return n, width / n, height / n, min_size
+
+    def _tile(self, z, tx, ty):
+        key = (z, tx, ty)
+        tile = self.tiles.get(key)
+        if tile is None:
+            path = os.path.join(self.out_dir, f"z{z}", tile_filename(tx, ty))
+            tile = _Tile(path, "".join(self.ns_decls))
+            self.tiles[key] = tile
+        return tile
+
+    def _open_ancestors(self, tile):
+        for frame in self.stack[tile.open_depth:]:
+            tile.write(self.writer.start_tag(frame.elem))
+            mid = frame.elem.get(_MID_ATTR)
+            if mid:
+                tile.shapes.append(mid)
+        tile.open_depth = len(self.stack)
+
+    def _publish(self, elem, ctm):
+        """Place une unité (forme feuille) dans une tuile de chaque niveau."""
+        box = element_bbox(elem, ctm)
+        if box is None:
+            _, _, _, _, e, f = ctm
+            box = [e, f, e, f]
+        size = max(box[2] - box[0], box[3] - box[1])
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        vx, vy, _, _ = self.view_box
+        full = self.writer.serialize(elem)
+        light = None
+        self.units += 1
+        mids = _mids(elem)
+
+        for z in range(MAX_LEVEL + 1):
+            n, tile_w, tile_h, min_size = self._level_of(z)
+            if size < min_size:
+                continue
+            if z < TEXT_MIN_LEVEL:
+                if light is None:
+                    light = self.writer.serialize(elem, skip_text=True)
+                xml = light
+            else:
+                xml = full
+            if not xml:
+                continue
+            if n > 1 and (box[2] - box[0] > tile_w or box[3] - box[1] > tile_h):
+                # Plus grande qu'une tuile (couloir, conteneur) : arrière-plan du niveau
+                tx = ty = BACKDROP
+            else:
+                tx = min(n - 1, max(0, int((cx - vx) // tile_w)))
+                ty = min(n - 1, max(0, int((cy - vy) // tile_h)))
+            tile = self._tile(z, tx, ty)
+            self._open_ancestors(tile)
+            tile.write(xml)
+            tile.bounds = _union(tile.bounds, box)
+            tile.shapes.extend(mids)
+            tile.units += 1
+
+    def _flush_pending(self, frame):
+        for elem, ctm in frame.pending:
+            self._publish(elem, ctm)
+            elem.clear()
+        frame.pending = []
+
+    # --------------------------------------------------------
+    def start_ns(self, prefix, uri):
+        self.writer.prefixes.setdefault(uri, prefix)
+        if prefix:
+            self.ns_decls.append(f" xmlns:{prefix}={_quote_attr(uri)}")
+        else:
+            self.ns_decls.append(f" xmlns={_quote_attr(uri)}")
+
+    def start(self, elem):
+        if self.leaf_depth:
+            self.leaf_depth += 1
+            return
+        if not self.stack:
+            values = [float(v) for v in _NUMBER_RE.findall(elem.get("viewBox") or "")]
+            if len(values) != 4:
+                values = [0.0, 0.0, _num(elem, "width", 1000.0), _num(elem, "height", 800.0)]
+            self.view_box = values
+            root_attrs = "".join(self.ns_decls) + self.writer.attributes(elem)
+            self.root_start = f"<{self.writer.qname(elem.tag)}{root_attrs}>"
+            self.stack.append(_Frame(elem, parse_transform(elem.get("transform"))))
+            return
+        parent = self.stack[-1]
+        if elem.tag == _GROUP_TAG:
+            # Le parent contient un sous-groupe : ses autres enfants sont des unités à part
+            parent.composite = True
+            self._flush_pending(parent)
+            self.stack.append(_Frame(elem, multiply(parent.ctm, parse_transform(elem.get("transform")))))
+            return
+        self.leaf_depth = 1
+
+    def end(self, elem):
+        if self.leaf_depth:
+            self.leaf_depth -= 1
+            if self.leaf_depth:
+                return
+            parent = self.stack[-1]
+            if elem.tag in _SHARED_TAGS:
+                self.shared.append(self.writer.serialize(elem))
+                elem.clear()
+            elif len(self.stack) == 1 or parent.composite:
+                self._publish(elem, parent.ctm)
+                elem.clear()
+            else:
+                parent.pending.append((elem, parent.ctm))
+            return
+
+        frame = self.stack[-1]
+        if len(self.stack) == 1:
+            self._flush_pending(frame)
+            self.stack.pop()
+            return
+        if frame.composite:
+            self._flush_pending(frame)
+            self.stack.pop()
+        else:
+            # Groupe feuille : publié en entier avec ses enfants
+            self.stack.pop()
+            frame.pending = []
+            self._publish(elem, self.stack[-1].ctm)
+        depth = len(self.stack)
+        for tile in self.tiles.values():
+            if tile.open_depth > depth:
+                tile.write("</g>")
+                tile.open_depth = depth
+        elem.clear()
+        parent = self.stack[-1].elem
+        if len(parent) and parent[-1] is elem:
+            del parent[-1]
+
+    # --------------------------------------------------------
+    def finish(self):
+        with open(os.path.join(self.out_dir, BASE_FILENAME), "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+            f.write(self.root_start + "".join(self.shared) + "</svg>\n")
+
+        levels = []
+        for z in range(MAX_LEVEL + 1):
+            n, tile_w, tile_h, min_size = self._level_of(z)
+            tiles = {}
+            for (tz, tx, ty), tile in sorted(self.tiles.items()):
+                if tz != z:
+                    continue
+                size = tile.close()
+                if size is None:
+                    continue
+                tiles[tile_key(tx, ty)] = {
+                    "x": tx,
+                    "y": ty,
+                    "backdrop": tx == BACKDROP,
+                    "bounds": [round(v, 2) for v in tile.bounds],
+                    "shapes": sorted(set(tile.shapes)),
+                    "units": tile.units,
+                    "bytes": size,
+                }
+            levels.append({
+                "z": z,
+                "cols": n,
+                "rows": n,
+                "tile_width": round(tile_w, 2),
+                "tile_height": round(tile_h, 2),
+                "min_size": round(min_size, 2),
+                "text": z >= TEXT_MIN_LEVEL,
+                "tiles": tiles,
+            })
+        return levels
+
+
+def build_tiles(svg_path, entity_dir, version):
+    """
+    (Re)génère les tuiles de svg_path dans entity_dir/tiles.
+    version : hash du SVG source (le client vérifie la concordance).
+    Retourne le manifeste, ou None en cas d'échec (le SVG complet reste servi).
+    """
+    out_dir = tiles_dir(entity_dir)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        tiler = _Tiler(tmp_dir)
+        for event, item in ET.iterparse(svg_path, events=("start-ns", "start", "end")):
+            if event == "start-ns":
+                tiler.start_ns(*item)
+            elif event == "start":
+                tiler.start(item)
+            else:
+                tiler.end(item)
+        levels = tiler.finish()
+    except Exception as e:
+        print(f"[TILES] Découpage impossible ({svg_path}): {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        return None
+
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "version": version,
+        "view_box": [round(v, 2) for v in tiler.view_box],
+        "units": tiler.units,
+        "tiled": tiler.units >= TILED_MIN_UNITS,
+        "max_level": MAX_LEVEL,
+        "levels": levels,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    nb_tiles = sum(len(level["tiles"]) for level in levels)
+    print(f"[TILES] {svg_path}: {tiler.units} formes → {nb_tiles} tuiles sur {MAX_LEVEL + 1} niveaux")
+    return manifest
+
+
+def load_manifest(entity_dir, version=None):
+    """
+    Manifeste des tuiles (None si absent, illisible ou d'une autre version du SVG).
+    Mémorisé tant que le fichier ne change pas : ne pas le modifier.
+    """
+    path = os.path.join(tiles_dir(entity_dir), MANIFEST_FILENAME)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _manifest_cache.get(path)
+    if cached and cached[0] == key:
+        manifest = cached[1]
+    else:
+        try:
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _manifest_cache[path] = (key, manifest)
+    if manifest.get("format") != MANIFEST_FORMAT:
+        return None
+    if version is not None and manifest.get("version") != version:
+        return None
+    return manifest
+
+
+def tile_key(x, y):
+    return "backdrop" if x == BACKDROP else f"{x}_{y}"
+
+
+def tile_filename(x, y):
+    return f"{tile_key(x, y)}.svg"
+
+
+def tile_path(entity_dir, z, x, y):
+    return os.path.join(tiles_dir(entity_dir), f"z{int(z)}", tile_filename(int(x), int(y)))
+
+
+def base_path(entity_dir):
+    return os.path.join(tiles_dir(entity_dir), BASE_FILENAME)
@@ -0,0 +1,115 @@
+# Code/routes/projection_batch.py
+# -*- coding: utf-8 -*-
+"""
+Projection métier de tous les collaborateurs d'une entité en un seul passage.
+
+Au lieu d'un analyze_user par personne (chacun refaisant les mêmes
+recherches et téléchargeant les mêmes fiches) :
+1. profils de compétences de tous les utilisateurs ; ceux dont le résultat
+   enregistré est encore valide (cf. projection_results) sont ignorés ;
+2. union des mots-clés de recherche → une recherche ROME par mot distinct ;
+3. union des pools de métiers → une fiche téléchargée (et analysée) par code,
+   formes normalisées de ses compétences calculées une fois pour tout le lot ;
+4. chaque utilisateur est classé sur son propre pool (mêmes résultats
+   qu'analyze_user) et son résultat est enregistré.
+
+Le trafic ROME dépend du nombre de mots-clés et de métiers distincts de
+l'entité, pas du nombre de collaborateurs.
+
+Lancé en job d'arrière-plan (POST /projection_metier/api/batch) ou en ligne
+de commande (Code/scripts/project_entity.py).
+"""
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+
+from Code.extensions import db
+from Code.models.models import User
+from Code.models.user_profiles import profile_hash, user_competency_profile
+from Code.routes.projection_metier import (
+    _parse_jobs, _pool_codes, _projection_mode, _projection_source_version, _rank_jobs, _search_words,
+    rome_get_jobs_details_many, rome_search_jobs_many,
+)
+from Code.routes.projection_results import load_result, store_result
+
+
+logger = logging.getLogger("projection_metier.batch")
+
+
+def entity_user_ids(entity_id: int) -> List[int]:
+    """Identifiants des collaborateurs d'une entité."""
+    return list(db.session.scalars(select(User.id).where(User.entity_id == entity_id).order_by(User.id)))
+
+
+def project_users(
+    user_ids: List[int],
+    mode: str = "heuristic",
+    refresh: bool = False,
+    progress: Optional[Callable[..., None]] = None,
+) -> Dict[str, Any]:
+    """
+    Projette et enregistre les résultats d'un ensemble d'utilisateurs sur un pool de métiers partagé.
+
+    Args:
+        user_ids: utilisateurs à projeter
+        mode: "heuristic" ou "vector" (heuristique si numpy / scipy absents)
+        refresh: recalculer aussi les résultats enregistrés encore valides
+        progress: callback optionnel (phase=..., users_done=..., users_total=...)
+
+    Returns:
+        Statistiques : utilisateurs projetés / réutilisés / sans compétences,
+        recherches et fiches ROME demandées, durée
+    """
+    t0 = time.perf_counter()
+    progress = progress or (lambda **fields: None)
+    mode = _projection_mode(mode)
+    source_version = _projection_source_version(mode)
+    stats = {
+        "mode": mode,
+        "users": len(user_ids),
+        "computed": 0,
+        "reused": 0,
+        "empty": 0,
+        "searches": 0,
+        "fiches": 0,
+    }
+
+    progress(force_write=True, phase="profiles", users_total=len(user_ids), users_done=0)
+    pending = []
+    for uid in user_ids:
+        profile = user_competency_profile(uid)
+        if not profile:
+            stats["empty"] += 1
+            continue
+        key = (uid, mode, profile_hash(profile), source_version)
+        if not refresh and load_result(*key) is not None:
+            stats["reused"] += 1
+            continue
+        pending.append((key, profile, _search_words(profile)))
+
+    # Recherches et fiches : une seule fois pour toute l'entité
+    words = list(dict.fromkeys(word for _, _, user_words in pending for word in user_words))
+    progress(force_write=True, phase="search", searches=len(words))
+    search_results = rome_search_jobs_many(words)
+    pools = {key: _pool_codes(user_words, search_results) for key, _, user_words in pending}
+    codes = list(dict.fromkeys(code for pool in pools.values() for code in pool))
+    progress(force_write=True, phase="fiches", fiches=len(codes))
+    jobs = _parse_jobs(rome_get_jobs_details_many(codes))
+    stats["searches"], stats["fiches"] = len(words), len(codes)
+    logger.info("📦 Lot de %d utilisateurs : %d recherches, %d fiches", len(pending), len(words), len(codes))
+
+    # Formes normalisées / tokens des compétences ROME : calculées une fois pour le lot
+    rome_forms = {}
+    progress(force_write=True, phase="scoring", users_done=stats["reused"] + stats["empty"])
+    for key, profile, _ in pending:
+        fully_matching, partially_matching = _rank_jobs(profile, mode, pools[key], jobs, rome_forms)
+        store_result(*key, {"full": fully_matching, "partial": partially_matching})
+        stats["computed"] += 1
+        progress(users_done=stats["computed"] + stats["reused"] + stats["empty"])
+
+    stats["elapsed_seconds"] = round(time.perf_counter() - t0, 2)
+    progress(force_write=True, phase="done", users_done=len(user_ids))
+    logger.info("✅ Projection par lot : %s", stats)
+    return stats
@@ -2,24 +2,30 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import json
 import logging
 import os
 import re
+import sqlite3
+import threading
 import time
 import unicodedata
 import difflib
-from typing import List, Dict, Any, Optional
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional
 
 import requests
-from flask import Blueprint, render_template, jsonify, request
-
-from Code.models.models import (
-    User,
-    Role, UserRole,
-    Activities, activity_roles,
-    Competency,
-    Savoir, SavoirFaire, Softskill, Aptitude,
-    Entity,
+from requests.adapters import HTTPAdapter
+from flask import Blueprint, Response, current_app, render_template, jsonify, request, stream_with_context, url_for
+
+from Code.models.models import User, Entity
+from Code.models.user_profiles import profile_hash, user_competency_profile
+from Code.routes.carto_jobs import enqueue_job, get_job, register_job_handler
+from Code.routes import rome_token_store
+from Code.routes.projection_results import load_result, store_result
+from Code.routes.rome_cache import (
+    MAX_BACKGROUND_REFRESH, cache_stats, cached_fetch, cached_fetch_iter, cached_fetch_many,
 )
 
 projection_metier_bp = Blueprint(
@@ -51,6 +57,17 @@ ROME_CLIENT_ID = _env("ROME_CLIENT_ID", "")
 ROME_CLIENT_SECRET = _env("ROME_CLIENT_SECRET", "")
 ROME_SCOPE = _env("ROME_SCOPE", "api_rome-fiches-metiersv1")  # âš ï¸ CRITIQUE : scope obligatoire
 ROME_TIMEOUT = float(_env("ROME_TIMEOUT", "10"))
+# Appels ROME simultanés d'une analyse, et quota de l'API (appels/s, rafale)
+ROME_MAX_WORKERS = max(1, int(_env("ROME_MAX_WORKERS", "8")))
+# Le quota vaut pour la machine entière : seau partagé entre workers (rome_token_store)
+ROME_RATE_LIMIT = float(_env("ROME_RATE_LIMIT", "10"))
+ROME_RATE_BURST = max(1, int(_env("ROME_RATE_BURST", "10")))
+# Nombre de workers gunicorn : quota divisé d'autant si le seau partagé est inaccessible
+ROME_WORKER_PROCESSES = max(1, int(_env("ROME_WORKER_PROCESSES", _env("WEB_CONCURRENCY", "3"))))
+# Source des métiers : "auto" (référentiel local s'il est chargé, sinon API), "local" ou "api"
+ROME_SOURCE = _env("ROME_SOURCE", "auto").lower()
+# Pause maximale sur un HTTP 429 (Retry-After) avant l'unique nouvel essai
+ROME_RETRY_AFTER_MAX = 5.0
 
 # Configuration du logger
 logger = logging.getLogger("projection_metier")
@@ -82,6 +99,8 @@ logger.info("Scope: %s", ROME_SCOPE)
 logger.info("Base URL: %s", ROME_BASE_URL)
 logger.info("Token URL: %s", ROME_TOKEN_URL)
 logger.info("Timeout: %s secondes", ROME_TIMEOUT)
+logger.info("Source: %s", ROME_SOURCE)
+logger.info("Workers: %d, quota: %s appels/s (rafale %d, partagé entre workers)", ROME_MAX_WORKERS, ROME_RATE_LIMIT, ROME_RATE_BURST)
 logger.info("=" * 60)
 
 
@@ -91,175 +110,231 @@ logger.info("=" * 60)
 
 _token_cache: Dict[str, Any] = {
     "access_token": None,
-    "expires_at": 0
+    "issued_at": 0,
+    "expires_at": 0,
+    "auth_mode": None,
 }
 
+# Modes d'authentification essayés (celui qui a fonctionné en dernier d'abord)
+TOKEN_AUTH_MODES = ("basic_with_scope", "body_with_scope")
+# Renouvellement en tâche de fond quand il reste moins que ce délai (au plus la moitié de la durée de vie)
+ROME_TOKEN_REFRESH_AHEAD = float(_env("ROME_TOKEN_REFRESH_AHEAD", "300"))
+_TOKEN_MIN_VALIDITY = 30
+
+# Un seul renouvellement à la fois dans le process : les autres threads attendent son résultat
+_token_lock = threading.Lock()
+_background_token_refresh = {"running": False}
+_background_token_lock = threading.Lock()
+
+
+def _token_refresh_at(state: Dict[str, Any]) -> float:
+    lifetime = state["expires_at"] - state["issued_at"]
+    return state["expires_at"] - min(ROME_TOKEN_REFRESH_AHEAD, lifetime / 2)
+
+
+def _token_valid(now: float) -> bool:
+    return bool(_token_cache["access_token"]) and _token_cache["expires_at"] > now + _TOKEN_MIN_VALIDITY
+
 
 def get_access_token() -> Optional[str]:
     """
-    Obtient un token d'accÃ¨s OAuth2 pour l'API ROME.
+    Obtient un token d'accès OAuth2 pour l'API ROME.
+    
+    Le token est gardé en mémoire et partagé entre les workers (cf.
+    rome_token_store) : un seul appelant le renouvelle, les autres
+    attendent. Il est renouvelé en tâche de fond avant son expiration.
     
     Returns:
-        str: Le token d'accÃ¨s ou None en cas d'Ã©chec
+        str: Le token d'accès ou None en cas d'échec
     """
     now = time.time()
-    
-    # VÃ©rifier le cache
-    if (_token_cache["access_token"] and 
-        _token_cache["expires_at"] > now + 30):
+    if _token_valid(now):
+        if now >= _token_refresh_at(_token_cache):
+            _refresh_token_in_background()
         logger.debug("Token en cache valide")
         return _token_cache["access_token"]
 
-    # VÃ©rifier les credentials
+    # Vérifier les credentials
     if not ROME_CLIENT_ID or not ROME_CLIENT_SECRET:
-        logger.error("âŒ ROME_CLIENT_ID ou ROME_CLIENT_SECRET manquant dans le .env")
-        logger.error("   VÃ©rifiez que votre fichier .env contient ces variables")
+        logger.error("❌ ROME_CLIENT_ID ou ROME_CLIENT_SECRET manquant dans le .env")
+        logger.error("   Vérifiez que votre fichier .env contient ces variables")
         return None
 
     if not ROME_SCOPE:
-        logger.error("âŒ ROME_SCOPE manquant dans le .env")
+        logger.error("❌ ROME_SCOPE manquant dans le .env")
         logger.error("   Ajoutez : ROME_SCOPE=api_rome-fiches-metiersv1")
         return None
 
-    logger.info("ðŸ”„ Demande d'un nouveau token OAuth2...")
+    with _token_lock:
+        # Renouvelé par un autre thread pendant l'attente ?
+        if _token_valid(time.time()):
+            return _token_cache["access_token"]
+        return _refresh_shared_token(min_expires_at=time.time() + _TOKEN_MIN_VALIDITY)
 
-    # PrÃ©paration des headers de base
-    base_headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
 
-    # Liste des tentatives
-    attempts = []
+def _refresh_token_in_background() -> None:
+    """Renouvelle le token avant son expiration, dans un thread (un seul par process)."""
+    with _background_token_lock:
+        if _background_token_refresh["running"]:
+            return
+        _background_token_refresh["running"] = True
+
+    def refresh():
+        try:
+            with _token_lock:
+                if time.time() < _token_refresh_at(_token_cache):
+                    return  # déjà renouvelé entre-temps
+                # Adopte le token d'un autre worker s'il est plus récent, sinon le renouvelle
+                _refresh_shared_token(min_expires_at=_token_cache["expires_at"])
+        except Exception as e:
+            logger.warning("Renouvellement anticipé du token échoué (%s)", e)
+        finally:
+            _background_token_refresh["running"] = False
+
+    threading.Thread(target=refresh, name="rome-token-refresh", daemon=True).start()
+
+
+def _keep_token(token: str, issued_at: float, expires_at: float, auth_mode: Optional[str]) -> str:
+    _token_cache.update(access_token=token, issued_at=issued_at, expires_at=expires_at, auth_mode=auth_mode)
+    return token
 
-    # Tentative 1 : Authentification BASIC avec scope dans le body
+
+def _refresh_shared_token(min_expires_at: float) -> Optional[str]:
+    """
+    Token expirant après min_expires_at : celui du fichier partagé s'il
+    convient, sinon demandé à ROME_TOKEN_URL par un seul appelant (bail dans
+    rome_token_store) pendant que les autres attendent.
+    """
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    lease_seconds = len(TOKEN_AUTH_MODES) * ROME_TIMEOUT + 5
+    started = time.time()
     try:
-        logger.info("ðŸ“¡ Tentative 1 : Mode BASIC + scope dans body")
-        
-        # Encodage Basic Auth
+        while True:
+            state = rome_token_store.read_token()
+            if state["access_token"] and (state["expires_at"] or 0) > min_expires_at:
+                logger.debug("Token partagé repris (renouvelé par un autre worker)")
+                return _keep_token(state["access_token"], state["issued_at"], state["expires_at"], state["auth_mode"])
+            if state["failed_at"] and state["failed_at"] >= started:
+                # Renouvellement concurrent en échec : pas de nouvel essai immédiat
+                return None
+            if rome_token_store.acquire_refresh(owner, lease_seconds):
+                break
+            time.sleep(0.1)
+    except sqlite3.Error as e:
+        logger.warning("⚠️  Token partagé indisponible (%s) : renouvellement local", e)
+        issued_at = time.time()
+        token, expires_in, auth_mode = _request_token(_token_cache["auth_mode"])
+        if token:
+            _keep_token(token, issued_at, issued_at + expires_in, auth_mode)
+        return token
+
+    issued_at = time.time()
+    token, expires_in, auth_mode = _request_token(state["auth_mode"])
+    try:
+        rome_token_store.finish_refresh(owner, token, issued_at, issued_at + expires_in, auth_mode)
+    except sqlite3.Error as e:
+        logger.warning("⚠️  Token non partagé (%s)", e)
+    if token:
+        _keep_token(token, issued_at, issued_at + expires_in, auth_mode)
+    return token
+
+
+def _token_request(mode: str) -> tuple[Dict[str, str], Dict[str, str]]:
+    """Headers et body de la demande de token pour un mode d'authentification."""
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/x-www-form-urlencoded",
+    }
+    data = {
+        "grant_type": "client_credentials",
+        "scope": ROME_SCOPE,  # ⚠️ CRITIQUE : inclure le scope !
+    }
+    if mode == "basic_with_scope":
+        # Authentification BASIC, scope dans le body
         credentials = f"{ROME_CLIENT_ID}:{ROME_CLIENT_SECRET}"
         encoded = base64.b64encode(credentials.encode("utf-8")).decode("ascii")
-        
-        headers = dict(base_headers)
         headers["Authorization"] = f"Basic {encoded}"
-        
-        data = {
-            "grant_type": "client_credentials",
-            "scope": ROME_SCOPE  # âš ï¸ CRITIQUE : inclure le scope !
-        }
-        
-        logger.debug("Headers: %s", {k: v if k != "Authorization" else "Basic ***" for k, v in headers.items()})
-        logger.debug("Data: %s", data)
-        
-        response = requests.post(
-            ROME_TOKEN_URL,
-            data=data,
-            headers=headers,
-            timeout=ROME_TIMEOUT,
-        )
-        
-        logger.info("ðŸ“¥ RÃ©ponse : HTTP %s", response.status_code)
-        
-        try:
-            json_response = response.json()
-            logger.debug("Body: %s", json_response)
-        except Exception:
-            json_response = {"_raw_text": response.text[:300]}
-            logger.debug("Body (non-JSON): %s", response.text[:300])
-        
-        attempts.append({
-            "mode": "basic_with_scope",
-            "status": response.status_code,
-            "body": json_response,
-        })
-        
-        # SuccÃ¨s ?
-        if (response.status_code == 200 and 
-            isinstance(json_response, dict) and 
-            json_response.get("access_token")):
-            
-            token = json_response["access_token"]
-            expires_in = float(json_response.get("expires_in", 3600))
-            
-            _token_cache["access_token"] = token
-            _token_cache["expires_at"] = now + expires_in
-            
-            logger.info("âœ… Token obtenu avec succÃ¨s (valide ~%d secondes)", int(expires_in))
-            logger.debug("Token: %s", _mask_secret(token))
-            
-            return token
-        
-        # Ã‰chec : analyser l'erreur
-        if response.status_code == 400:
-            error = json_response.get("error", "")
-            error_desc = json_response.get("error_description", "")
-            logger.warning("âš ï¸  Erreur 400 : %s - %s", error, error_desc)
-            
-            if "invalid_scope" in error:
-                logger.error("âŒ Le scope '%s' n'est pas autorisÃ© pour votre application", ROME_SCOPE)
-                logger.error("   VÃ©rifiez sur https://entreprise.francetravail.fr que votre app a accÃ¨s Ã  l'API ROME")
-        
-    except requests.exceptions.Timeout:
-        logger.error("â±ï¸  Timeout lors de la demande de token")
-        attempts.append({"mode": "basic_with_scope", "error": "timeout"})
-    except Exception as e:
-        logger.error("âŒ Exception lors de la demande de token : %s", e)
-        attempts.append({"mode": "basic_with_scope", "error": str(e)})
+    else:
+        # Credentials dans le body (fallback)
+        data["client_id"] = ROME_CLIENT_ID
+        data["client_secret"] = ROME_CLIENT_SECRET
+    return headers, data
 
-    # Tentative 2 : Credentials dans le body (fallback)
-    try:
-        logger.info("ðŸ“¡ Tentative 2 : Mode BODY (credentials en POST)")
-        
-        headers = dict(base_headers)
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": ROME_CLIENT_ID,
-            "client_secret": ROME_CLIENT_SECRET,
-            "scope": ROME_SCOPE
-        }
-        
-        response = requests.post(
-            ROME_TOKEN_URL,
-            data=data,
-            headers=headers,
-            timeout=ROME_TIMEOUT,
-        )
-        
-        logger.info("ðŸ“¥ RÃ©ponse : HTTP %s", response.status_code)
-        
-        try:
-            json_response = response.json()
-        except Exception:
-            json_response = {"_raw_text": response.text[:300]}
-        
-        attempts.append({
-            "mode": "body_with_scope",
-            "status": response.status_code,
-            "body": json_response,
-        })
-        
-        if (response.status_code == 200 and 
-            isinstance(json_response, dict) and 
-            json_response.get("access_token")):
-            
-            token = json_response["access_token"]
-            expires_in = float(json_response.get("expires_in", 3600))
-            
-            _token_cache["access_token"] = token
-            _token_cache["expires_at"] = now + expires_in
-            
-            logger.info("âœ… Token obtenu avec succÃ¨s (mode body, valide ~%d secondes)", int(expires_in))
-            return token
+
+def _request_token(preferred_mode: Optional[str] = None) -> tuple[Optional[str], float, Optional[str]]:
+    """
+    Demande un token à ROME_TOKEN_URL, en essayant d'abord le mode
+    d'authentification qui a fonctionné la dernière fois.
     
-    except Exception as e:
-        logger.error("âŒ Exception tentative 2 : %s", e)
-        attempts.append({"mode": "body_with_scope", "error": str(e)})
+    Returns:
+        (token ou None, durée de validité en secondes, mode qui a fonctionné)
+    """
+    logger.info("🔄 Demande d'un nouveau token OAuth2...")
+    modes = sorted(TOKEN_AUTH_MODES, key=lambda mode: mode != preferred_mode)
+    attempts = []
+
+    for i, mode in enumerate(modes, 1):
+        try:
+            logger.info("📡 Tentative %d : mode %s", i, mode)
+            headers, data = _token_request(mode)
+            logger.debug("Headers: %s", {k: v if k != "Authorization" else "Basic ***" for k, v in headers.items()})
+
+            response = requests.post(
+                ROME_TOKEN_URL,
+                data=data,
+                headers=headers,
+                timeout=ROME_TIMEOUT,
+            )
+
+            logger.info("📥 Réponse : HTTP %s", response.status_code)
+
+            try:
+                json_response = response.json()
+                logger.debug("Body: %s", json_response)
+            except Exception:
+                json_response = {"_raw_text": response.text[:300]}
+                logger.debug("Body (non-JSON): %s", response.text[:300])
+
+            attempts.append({
+                "mode": mode,
+                "status": response.status_code,
+                "body": json_response,
+            })
 
-    # Toutes les tentatives ont Ã©chouÃ©
+            # Succès ?
+            if (response.status_code == 200 and
+                isinstance(json_response, dict) and
+                json_response.get("access_token")):
+
+                token = json_response["access_token"]
+                expires_in = float(json_response.get("expires_in", 3600))
+
+                logger.info("✅ Token obtenu avec succès (mode %s, valide ~%d secondes)", mode, int(expires_in))
+                logger.debug("Token: %s", _mask_secret(token))
+                return token, expires_in, mode
+
+            # Échec : analyser l'erreur
+            if response.status_code == 400 and isinstance(json_response, dict):
+                error = json_response.get("error", "")
+                error_desc = json_response.get("error_description", "")
+                logger.warning("⚠️  Erreur 400 : %s - %s", error, error_desc)
+
+                if "invalid_scope" in error:
+                    logger.error("❌ Le scope '%s' n'est pas autorisé pour votre application", ROME_SCOPE)
+                    logger.error("   Vérifiez sur https://entreprise.francetravail.fr que votre app a accès à l'API ROME")
+
+        except requests.exceptions.Timeout:
+            logger.error("⏱️  Timeout lors de la demande de token")
+            attempts.append({"mode": mode, "error": "timeout"})
+        except Exception as e:
+            logger.error("❌ Exception lors de la demande de token : %s", e)
+            attempts.append({"mode": mode, "error": str(e)})
+
+    # Toutes les tentatives ont échoué
     logger.error("=" * 60)
-    logger.error("âŒ Ã‰CHEC : Impossible d'obtenir un token ROME")
+    logger.error("❌ ÉCHEC : Impossible d'obtenir un token ROME")
     logger.error("=" * 60)
-    logger.error("DÃ©tail des tentatives :")
+    logger.error("Détail des tentatives :")
     for i, attempt in enumerate(attempts, 1):
         logger.error("  Tentative %d (%s) :", i, attempt.get("mode", "unknown"))
         if "error" in attempt:
@@ -269,15 +344,15 @@ def get_access_token() -> Optional[str]:
             if "body" in attempt:
                 logger.error("    Body : %s", attempt["body"])
     logger.error("=" * 60)
-    logger.error("ACTIONS Ã€ VÃ‰RIFIER :")
+    logger.error("ACTIONS À VÉRIFIER :")
     logger.error("1. Votre fichier .env contient-il ROME_CLIENT_ID et ROME_CLIENT_SECRET ?")
     logger.error("2. Votre fichier .env contient-il ROME_SCOPE=api_rome-fiches-metiersv1 ?")
-    logger.error("3. ROME_BASE_URL se termine-t-il par un point '.' ? (Ã  retirer)")
-    logger.error("4. Votre app France Travail a-t-elle bien le scope activÃ© ?")
-    logger.error("   â†’ VÃ©rifiez sur https://entreprise.francetravail.fr")
+    logger.error("3. ROME_BASE_URL se termine-t-il par un point '.' ? (à retirer)")
+    logger.error("4. Votre app France Travail a-t-elle bien le scope activé ?")
+    logger.error("   → Vérifiez sur https://entreprise.francetravail.fr")
     logger.error("=" * 60)
-    
-    return None
+
+    return None, 0.0, None
 
 
 def _get_auth_headers() -> Optional[Dict[str, str]]:
@@ -366,214 +441,349 @@ RATIO_THRESHOLD = 0.82
 JACCARD_THRESHOLD = 0.60
 
 
+class CompetencyMatcher:
+    """
+    Compétences ROME couvertes par celles d'un utilisateur.
+
+    Même décision que _text_similarity comparé à toutes les compétences
+    utilisateur partageant un token (ratio >= RATIO_THRESHOLD ou
+    Jaccard >= JACCARD_THRESHOLD), sans son coût :
+    - formes normalisées / tokens calculés une fois par compétence ;
+    - index inversé token → compétences utilisateur (seuls les candidats
+      partageant un token sont comparés) ;
+    - Jaccard d'abord, SequenceMatcher seulement s'il faut, écarté quand
+      sa borne quick_ratio() est sous le seuil ;
+    - décision mémorisée par libellé ROME (les mêmes reviennent d'une fiche à l'autre) ;
+    - formes des libellés ROME partageables entre matchers (projection par lot).
+    """
+
+    def __init__(self, user_items: List[Dict[str, Any]], rome_forms: Optional[Dict[str, tuple]] = None):
+        """
+        Args:
+            user_items: [{"raw", "normalized", "tokens"}] (tokens non vides)
+            rome_forms: cache {libellé ROME: (tokens, forme normalisée)}, partagé s'il est fourni
+        """
+        self.items = user_items
+        self.index: Dict[str, List[int]] = defaultdict(list)
+        for i, item in enumerate(user_items):
+            for token in item["tokens"]:
+                self.index[token].append(i)
+        # SequenceMatcher par compétence utilisateur (seq2 pré-indexée), créé à la demande
+        self._matchers: List[Optional[difflib.SequenceMatcher]] = [None] * len(user_items)
+        self._memo: Dict[str, bool] = {}
+        self._rome_forms = rome_forms if rome_forms is not None else {}
+
+    def covers(self, rome_comp: str) -> bool:
+        """Vrai si la compétence ROME est couverte par une compétence utilisateur."""
+        known = self._memo.get(rome_comp)
+        if known is None:
+            known = self._memo[rome_comp] = self._covers(rome_comp)
+        return known
+
+    def _rome_form(self, rome_comp: str) -> tuple:
+        form = self._rome_forms.get(rome_comp)
+        if form is None:
+            form = self._rome_forms[rome_comp] = (frozenset(_tokenize(rome_comp)), _normalize(rome_comp))
+        return form
+
+    def _covers(self, rome_comp: str) -> bool:
+        rome_tokens, rome_normalized = self._rome_form(rome_comp)
+        candidates = set()
+        for token in rome_tokens:
+            candidates.update(self.index.get(token, ()))
+        if not candidates:
+            return False
+
+        for i in candidates:
+            if _jaccard_similarity(rome_tokens, self.items[i]["tokens"]) >= JACCARD_THRESHOLD:
+                return True
+
+        for i in sorted(candidates):
+            matcher = self._matchers[i]
+            if matcher is None:
+                matcher = self._matchers[i] = difflib.SequenceMatcher(None, "", self.items[i]["normalized"])
+            matcher.set_seq1(rome_normalized)
+            if (matcher.real_quick_ratio() >= RATIO_THRESHOLD
+                    and matcher.quick_ratio() >= RATIO_THRESHOLD
+                    and matcher.ratio() >= RATIO_THRESHOLD):
+                return True
+        return False
+
+    def split(self, job_competencies: List[str]) -> tuple[List[str], List[str]]:
+        """Compétences d'une fiche réparties en (maîtrisées, manquantes), dans l'ordre."""
+        owned, missing = [], []
+        for rome_comp in job_competencies:
+            (owned if self.covers(rome_comp) else missing).append(rome_comp)
+        return owned, missing
+
+
 # ============================================================
 #  EXTRACTION DES COMPÃ‰TENCES UTILISATEUR (OPTION A)
 # ============================================================
 
 def _extract_user_competencies(user_id: int) -> List[str]:
     """
-    Extrait toutes les compÃ©tences d'un utilisateur depuis la base AFDEC.
+    Libellés de compétences d'un utilisateur, depuis son profil précalculé
+    (cf. Code/models/user_profiles.py).
     
     Inclut :
-    - Les rÃ´les de l'utilisateur
-    - Les activitÃ©s liÃ©es aux rÃ´les
-    - Les compÃ©tences des activitÃ©s (Competency, Savoir, SavoirFaire, Softskill, Aptitude)
+    - Les rôles de l'utilisateur
+    - Les activités liées aux rôles
+    - Les compétences des activités (Competency, Savoir, SavoirFaire, Softskill, Aptitude)
     
     Args:
         user_id: ID de l'utilisateur
         
     Returns:
-        Liste de labels de compÃ©tences (nettoyÃ©s)
+        Liste de labels de compétences (nettoyés, sans doublons)
     """
-    labels = []
-    
-    # RÃ©cupÃ©rer l'utilisateur
-    user = User.query.get(user_id)
-    if not user:
-        logger.warning("âš ï¸  Utilisateur %d introuvable", user_id)
-        return []
-    
-    logger.info("ðŸ“‹ Extraction des compÃ©tences pour %s %s (ID: %d)", 
-                user.first_name, user.last_name, user_id)
-    
-    # 1. RÃ©cupÃ©rer les rÃ´les de l'utilisateur
-    roles = (
-        Role.query
-        .join(UserRole, UserRole.role_id == Role.id)
-        .filter(UserRole.user_id == user_id)
-        .all()
-    )
-    
-    role_ids = [role.id for role in roles]
-    logger.info("   â†’ %d rÃ´les trouvÃ©s", len(roles))
-    
-    # Ajouter les noms des rÃ´les
-    for role in roles:
-        if role.name:
-            labels.append(role.name)
-    
-    # 2. RÃ©cupÃ©rer les activitÃ©s liÃ©es aux rÃ´les
-    if not role_ids:
-        logger.info("   â†’ Aucun rÃ´le, pas d'activitÃ©s Ã  extraire")
-        return labels
-    
-    activities = (
-        Activities.query
-        .join(activity_roles, Activities.id == activity_roles.c.activity_id)
-        .filter(activity_roles.c.role_id.in_(role_ids))
-        .all()
-    )
-    
-    logger.info("   â†’ %d activitÃ©s trouvÃ©es", len(activities))
-    
-    # 3. Extraire les compÃ©tences des activitÃ©s
-    comp_count = 0
-    for activity in activities:
-        if activity.name:
-            labels.append(activity.name)
-        
-        # Competency
-        for comp in activity.competencies:
-            if comp.description:
-                labels.append(comp.description)
-                comp_count += 1
-        
-        # Savoir
-        for savoir in activity.savoirs:
-            if savoir.description:
-                labels.append(savoir.description)
-                comp_count += 1
-        
-        # SavoirFaire
-        for savoir_faire in activity.savoir_faires:
-            if savoir_faire.description:
-                labels.append(savoir_faire.description)
-                comp_count += 1
-        
-        # Softskill
-        for softskill in activity.softskills:
-            if softskill.habilete:
-                labels.append(softskill.habilete)
-                comp_count += 1
-        
-        # Aptitude
-        for aptitude in activity.aptitudes:
-            if aptitude.description:
-                labels.append(aptitude.description)
-                comp_count += 1
-    
-    logger.info("   â†’ %d compÃ©tences extraites", comp_count)
-    
-    # Nettoyage final
-    labels = [label.strip() for label in labels if label and label.strip()]
-    logger.info("   â†’ Total : %d labels uniques", len(set(labels)))
-    
-    return labels
+    return [label for label, _, _ in user_competency_profile(user_id)]
 
 
 # ============================================================
 #  APPELS API ROME 4.0
 # ============================================================
 
+class _RateLimiter:
+    """
+    Seau à jetons : `rate` appels/s, rafales de `burst`.
+
+    Le seau est partagé par tous les threads et tous les workers de la
+    machine (rome_token_store.take_rate_token) : le quota de l'API vaut
+    pour l'ensemble. Si le fichier partagé est inaccessible, repli sur un
+    seau propre au process, avec rate / ROME_WORKER_PROCESSES.
+    """
+
+    def __init__(self, rate: float, burst: int, shared: bool = True):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.shared = shared
+        self.local_rate = rate / ROME_WORKER_PROCESSES
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Bloque jusqu'à disposer d'un jeton (rate <= 0 : pas de limite)."""
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _take(self) -> float:
+        if self.shared:
+            try:
+                return rome_token_store.take_rate_token(self.rate, self.capacity)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("Quota ROME partagé indisponible (%s), quota local au worker", e)
+                self.shared = False
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.local_rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.local_rate
+
+
+_rate_limiter = _RateLimiter(ROME_RATE_LIMIT, ROME_RATE_BURST)
+
+# Session HTTP partagée : connexions keep-alive réutilisées par les workers
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_maxsize=ROME_MAX_WORKERS + MAX_BACKGROUND_REFRESH))
+_http.mount("http://", HTTPAdapter(pool_maxsize=ROME_MAX_WORKERS + MAX_BACKGROUND_REFRESH))
+
+
+def _rome_get(path: str, params: Dict[str, str], label: str) -> Optional[Any]:
+    """
+    Appel GET à l'API ROME (réseau), dans la limite du quota.
+    Appelable depuis n'importe quel thread (aucun accès à la base).
+
+    Returns:
+        Réponse JSON, ou None en cas d'échec (pas de token, HTTP != 200, timeout)
+    """
+    headers = _get_auth_headers()
+    if not headers:
+        logger.warning("⚠️  %s : pas de token disponible", label)
+        return None
+
+    try:
+        for attempt in range(2):
+            _rate_limiter.acquire()
+            response = _http.get(
+                f"{ROME_BASE_URL}{path}",
+                params=params,
+                headers=headers,
+                timeout=ROME_TIMEOUT,
+            )
+            if response.status_code != 429 or attempt:
+                break
+            try:
+                retry_after = float(response.headers.get("Retry-After") or 1)
+            except ValueError:
+                retry_after = 1.0
+            logger.warning("⏳ %s → HTTP 429, nouvel essai dans %.1f s", label, retry_after)
+            time.sleep(min(retry_after, ROME_RETRY_AFTER_MAX))
+
+        if response.status_code != 200:
+            logger.warning("⚠️  %s → HTTP %s", label, response.status_code)
+            logger.debug("Body: %s", response.text[:200])
+            return None
+
+        return response.json()
+
+    except requests.exceptions.Timeout:
+        logger.error("⏱️  Timeout : %s", label)
+        return None
+    except Exception as e:
+        logger.error("❌ Exception %s : %s", label, e)
+        return None
+
+
+def _use_local_referential() -> bool:
+    """Vrai si les métiers viennent du référentiel local (cf. rome_referential)."""
+    if ROME_SOURCE == "api":
+        return False
+    if ROME_SOURCE == "local":
+        return True
+    from Code.routes.rome_referential import referential_ready
+    return referential_ready()
+
+
 def rome_search_jobs(query: str) -> List[Dict[str, Any]]:
     """
-    Recherche des mÃ©tiers ROME par libellÃ©.
+    Recherche des métiers ROME par libellé : index du référentiel local s'il
+    est chargé, sinon API (réponse mise en cache, cf. rome_cache).
     
     Args:
         query: Terme de recherche
         
     Returns:
-        Liste de mÃ©tiers trouvÃ©s
+        Liste de métiers trouvés
     """
     if not query or not query.strip():
         return []
     
-    headers = _get_auth_headers()
-    if not headers:
-        logger.warning("âš ï¸  rome_search_jobs() : pas de token disponible")
-        return []
+    if _use_local_referential():
+        from Code.routes.rome_referential import search_local_many
+        return search_local_many([query]).get(query, [])
     
-    url = f"{ROME_BASE_URL}/v1/fiches-rome/metier/recherche"
+    logger.debug("🔍 Recherche ROME : '%s'", query)
+    params = {"libelle": query}
+    data = cached_fetch(
+        "metier/recherche",
+        params,
+        lambda: _rome_get("/v1/fiches-rome/metier/recherche", params, f"rome_search_jobs('{query}')"),
+    )
     
-    try:
-        logger.debug("ðŸ” Recherche ROME : '%s'", query)
-        
-        response = requests.get(
-            url,
-            params={"libelle": query},
-            headers=headers,
-            timeout=ROME_TIMEOUT,
-        )
-        
-        if response.status_code != 200:
-            logger.warning("âš ï¸  rome_search_jobs('%s') â†’ HTTP %s", query, response.status_code)
-            logger.debug("Body: %s", response.text[:200])
-            return []
-        
-        data = response.json()
-        
-        if isinstance(data, list):
-            logger.debug("   â†’ %d rÃ©sultats", len(data))
-            return data
-        
-        if isinstance(data, dict):
-            jobs = data.get("metiers", [])
-            logger.debug("   â†’ %d rÃ©sultats", len(jobs))
-            return jobs
-        
-        return []
+    if isinstance(data, list):
+        logger.debug("   → %d résultats", len(data))
+        return data
     
-    except requests.exceptions.Timeout:
-        logger.error("â±ï¸  Timeout lors de la recherche ROME : '%s'", query)
-        return []
-    except Exception as e:
-        logger.error("âŒ Exception rome_search_jobs('%s') : %s", query, e)
-        return []
+    if isinstance(data, dict):
+        jobs = data.get("metiers", [])
+        logger.debug("   → %d résultats", len(jobs))
+        return jobs
+    
+    return []
 
 
 def rome_get_job_details(code: str) -> Dict[str, Any]:
     """
-    RÃ©cupÃ¨re les dÃ©tails d'un mÃ©tier ROME par son code.
+    Récupère les détails d'un métier ROME par son code (réponse mise en cache).
     
     Args:
         code: Code ROME (ex: "M1805")
         
     Returns:
-        DÃ©tails du mÃ©tier ou dict vide
+        Détails du métier ou dict vide
     """
     if not code or not code.strip():
         return {}
     
-    headers = _get_auth_headers()
-    if not headers:
-        logger.warning("âš ï¸  rome_get_job_details() : pas de token disponible")
-        return {}
-    
-    url = f"{ROME_BASE_URL}/v1/fiches-rome/fiche-metier"
+    if _use_local_referential():
+        from Code.routes.rome_referential import local_fiches
+        return local_fiches([code]).get(code, {})
     
-    try:
-        logger.debug("ðŸ“„ DÃ©tails mÃ©tier : %s", code)
-        
-        response = requests.get(
-            url,
-            params={"code": code},
-            headers=headers,
-            timeout=ROME_TIMEOUT,
-        )
-        
-        if response.status_code != 200:
-            logger.warning("âš ï¸  rome_get_job_details('%s') â†’ HTTP %s", code, response.status_code)
-            return {}
-        
-        data = response.json()
-        return data if isinstance(data, dict) else {}
-    
-    except requests.exceptions.Timeout:
-        logger.error("â±ï¸  Timeout lors de la rÃ©cupÃ©ration des dÃ©tails : '%s'", code)
-        return {}
-    except Exception as e:
-        logger.error("âŒ Exception rome_get_job_details('%s') : %s", code, e)
+    logger.debug("📄 Détails métier : %s", code)
+    params = {"code": code}
+    data = cached_fetch(
+        "fiche-metier",
+        params,
+        lambda: _rome_get("/v1/fiches-rome/fiche-metier", params, f"rome_get_job_details('{code}')"),
+    )
+    return data if isinstance(data, dict) else {}
+
+
+def _jobs_from_search(data: Any) -> List[Dict[str, Any]]:
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        return data.get("metiers", [])
+    return []
+
+
+def rome_search_jobs_many(queries: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    rome_search_jobs pour plusieurs termes : doublons fusionnés, appels manquants
+    en parallèle (ROME_MAX_WORKERS, quota ROME_RATE_LIMIT).
+
+    Returns:
+        {terme: liste de métiers}
+    """
+    queries = list(dict.fromkeys(q for q in queries if q and q.strip()))
+    if not queries:
         return {}
+    if _use_local_referential():
+        from Code.routes.rome_referential import search_local_many
+        return search_local_many(queries)
+    _get_auth_headers()  # token obtenu une fois, avant de lancer les workers
+    results = cached_fetch_many(
+        "metier/recherche",
+        [{"libelle": q} for q in queries],
+        lambda p: _rome_get("/v1/fiches-rome/metier/recherche", p, f"rome_search_jobs('{p['libelle']}')"),
+        max_workers=ROME_MAX_WORKERS,
+    )
+    return {q: _jobs_from_search(data) for q, data in zip(queries, results)}
+
+
+def rome_get_jobs_details_many(codes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    rome_get_job_details pour plusieurs codes, en parallèle.
+
+    Returns:
+        {code: détails du métier ou dict vide}
+    """
+    details = dict(rome_get_jobs_details_iter(codes))
+    return {c: details.get(c, {}) for c in dict.fromkeys(codes) if c and c.strip()}
+
+
+def rome_get_jobs_details_iter(codes: List[str]) -> Iterator[tuple[str, Dict[str, Any]]]:
+    """
+    rome_get_jobs_details_many au fil de l'eau : (code, détails ou dict vide)
+    dès qu'une fiche est disponible (cache d'abord, puis ordre d'arrivée des appels).
+    """
+    codes = list(dict.fromkeys(c for c in codes if c and c.strip()))
+    if not codes:
+        return
+    if _use_local_referential():
+        from Code.routes.rome_referential import local_fiches
+        fiches = local_fiches(codes)
+        for c in codes:
+            yield c, fiches.get(c, {})
+        return
+    _get_auth_headers()
+    for i, data in cached_fetch_iter(
+        "fiche-metier",
+        [{"code": c} for c in codes],
+        lambda p: _rome_get("/v1/fiches-rome/fiche-metier", p, f"rome_get_job_details('{p['code']}')"),
+        max_workers=ROME_MAX_WORKERS,
+    ):
+        yield codes[i], data if isinstance(data, dict) else {}
 
 
 def _extract_competencies_from_job(job_data: dict) -> List[str]:
@@ -612,6 +822,212 @@ def _extract_job_code(job_data: dict) -> str:
     return code
 
 
+# ============================================================
+#  PROJECTION
+# ============================================================
+
+def _projection_mode(requested: Optional[str]) -> str:
+    """
+    Mode de scoring effectif : "vector" s'il est demandé et que numpy / scipy
+    sont installés (cf. projection_vector), sinon "heuristic".
+    """
+    if requested != "vector":
+        return "heuristic"
+    from Code.routes.projection_vector import vector_mode_available
+    if vector_mode_available():
+        return "vector"
+    logger.warning("⚠️  numpy / scipy absents : mode heuristique")
+    return "heuristic"
+
+
+def _projection_source_version(mode: str) -> str:
+    """
+    Version des entrées de la projection hors profil : source ROME (version
+    du référentiel local, ou API) et seuils de matching. Un résultat
+    enregistré pour une autre version est recalculé.
+    """
+    if _use_local_referential():
+        from Code.routes.rome_referential import referential_version
+        source = "local:" + referential_version()
+    else:
+        source = "api"
+    thresholds = f"{RATIO_THRESHOLD}/{JACCARD_THRESHOLD}"
+    if mode == "vector":
+        from Code.routes.projection_vector import VECTOR_THRESHOLD
+        thresholds += f"/{VECTOR_THRESHOLD}"
+    return f"{source}|{thresholds}"
+
+
+def _search_words(profile: List[List[Any]]) -> List[str]:
+    """
+    Mots-clés de recherche ROME d'un profil (3 mots significatifs par libellé au plus).
+    
+    Args:
+        profile: profil utilisateur [[libellé, forme normalisée, tokens], ...]
+        
+    Returns:
+        Mots-clés, dans l'ordre du profil et sans doublons
+    """
+    # Mots-clés de recherche, sans doublons d'une compétence à l'autre
+    search_words = []
+    for comp, _, _ in profile:
+        normalized = _normalize(comp)
+        if not normalized:
+            continue
+        
+        # Extraire les mots significatifs (>3 caractères)
+        words = [w for w in normalized.split() if len(w) > 3]
+        if not words:
+            words = [normalized]
+        
+        search_words.extend(words[:3])  # Limiter à 3 mots pour éviter trop d'appels
+    
+    return list(dict.fromkeys(search_words))
+
+
+def _pool_codes(search_words: List[str], search_results: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+    """Codes ROME trouvés pour ces mots-clés, sans doublons, dans l'ordre des recherches."""
+    codes = []
+    for word in search_words:
+        for job in search_results.get(word, []):
+            codes.append(_extract_job_code(job))
+    return [code for code in dict.fromkeys(codes) if code]
+
+
+def _parse_jobs(jobs_details: Dict[str, Dict[str, Any]]) -> Dict[str, tuple[str, List[str]]]:
+    """{code: (libellé, compétences)} des fiches métier récupérées."""
+    return {
+        code: (_extract_job_label(details), _extract_competencies_from_job(details))
+        for code, details in jobs_details.items() if details
+    }
+
+
+def _user_items(profile: List[List[Any]]) -> List[Dict[str, Any]]:
+    """Compétences du profil prêtes pour le matching (cf. CompetencyMatcher)."""
+    return [
+        {"raw": label, "normalized": normalized, "tokens": set(tokens)}
+        for label, normalized, tokens in profile
+        if normalized and tokens
+    ]
+
+
+def _job_result(code: str, label: str, competencies: List[str], owned: List[str], missing: List[str]) -> Dict[str, Any]:
+    """Métier scoré : score = part des compétences de la fiche maîtrisées (en %)."""
+    if not competencies:
+        # Métier sans compétences définies
+        return {
+            "code": code,
+            "label": label,
+            "score": 0,
+            "owned": [],
+            "missing": [],
+            "owned_count": 0,
+            "missing_count": 0,
+            "total": 0,
+        }
+    total = len(competencies)
+    return {
+        "code": code,
+        "label": label,
+        "score": round((len(owned) / total) * 100, 1),
+        "owned": owned,
+        "missing": missing,
+        "owned_count": len(owned),
+        "missing_count": len(missing),
+        "total": total,
+    }
+
+
+def _is_fully_matching(job_result: Dict[str, Any]) -> bool:
+    """Métier maîtrisable : toutes les compétences de la fiche sont couvertes."""
+    return job_result["total"] > 0 and job_result["owned_count"] == job_result["total"]
+
+
+def _rank_jobs(
+    profile: List[List[Any]],
+    mode: str,
+    codes: List[str],
+    jobs: Dict[str, tuple[str, List[str]]],
+    rome_forms: Optional[Dict[str, tuple]] = None,
+) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Classe les métiers d'un pool pour un profil de compétences.
+    
+    Args:
+        profile: profil utilisateur [[libellé, forme normalisée, tokens], ...]
+        mode: "heuristic" (CompetencyMatcher) ou "vector" (TF-IDF)
+        codes: codes ROME du pool de l'utilisateur
+        jobs: fiches analysées {code: (libellé, compétences)} (cf. _parse_jobs)
+        rome_forms: formes des libellés ROME partagées entre profils (cf. CompetencyMatcher)
+        
+    Returns:
+        (métiers maîtrisables, métiers envisageables), triés par score décroissant
+    """
+    user_items = _user_items(profile)
+    logger.info("ðŸ“Š %d compÃ©tences Ã  analyser", len(user_items))
+    matcher = CompetencyMatcher(user_items, rome_forms)
+    
+    # Mode vectoriel (TF-IDF) : tout le pool évalué d'un coup (cf. projection_vector)
+    vector_results = None
+    if mode == "vector":
+        from Code.routes.projection_vector import projection_model, score_jobs
+        jobs_competencies = {code: jobs[code][1] for code in codes if code in jobs}
+        model = projection_model(jobs_competencies, _use_local_referential())
+        vector_results = score_jobs(model, [item["raw"] for item in user_items], jobs_competencies)
+    
+    # Analyser chaque mÃ©tier
+    fully_matching = []
+    partially_matching = []
+    
+    for code in codes:
+        if code not in jobs:
+            continue
+        
+        job_label, job_competencies = jobs[code]
+        
+        # Matching des compétences (cf. CompetencyMatcher)
+        if not job_competencies:
+            owned, missing = [], []
+        elif vector_results is not None:
+            owned, missing = vector_results[code]
+        else:
+            owned, missing = matcher.split(job_competencies)
+        
+        job_result = _job_result(code, job_label, job_competencies, owned, missing)
+        (fully_matching if _is_fully_matching(job_result) else partially_matching).append(job_result)
+    
+    # Trier par score dÃ©croissant
+    fully_matching.sort(key=lambda x: x["score"], reverse=True)
+    partially_matching.sort(key=lambda x: x["score"], reverse=True)
+    
+    logger.info("âœ… Analyse terminÃ©e : %d mÃ©tiers maÃ®trisables, %d envisageables",
+                len(fully_matching), len(partially_matching))
+    
+    return fully_matching, partially_matching
+
+
+def _run_projection(profile: List[List[Any]], mode: str) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Classement complet des métiers ROME pour un profil de compétences :
+    recherches ROME, fiches du pool, puis _rank_jobs.
+    
+    Args:
+        profile: profil utilisateur [[libellé, forme normalisée, tokens], ...]
+        mode: "heuristic" (CompetencyMatcher) ou "vector" (TF-IDF)
+        
+    Returns:
+        (métiers maîtrisables, métiers envisageables), triés par score décroissant
+    """
+    logger.info("ðŸ” Recherche de mÃ©tiers ROME...")
+    search_words = _search_words(profile)
+    codes = _pool_codes(search_words, rome_search_jobs_many(search_words))
+    logger.info("📦 %d métiers ROME trouvés (%d recherches)", len(codes), len(search_words))
+    
+    # Détails complets de tous les métiers, récupérés en parallèle
+    jobs = _parse_jobs(rome_get_jobs_details_many(codes))
+    return _rank_jobs(profile, mode, codes, jobs)
+
+
 # ============================================================
 #  ROUTES FLASK
 # ============================================================
@@ -649,7 +1065,9 @@ def analyze_user(uid: int):
     logger.info("ðŸ‘¤ Utilisateur : %s %s", user.first_name, user.last_name)
     
     # Extraire les compÃ©tences
-    user_competencies = _extract_user_competencies(uid)
+    profile = user_competency_profile(uid)
+    user_competencies = [label for label, _, _ in profile]
+    logger.info("📋 Profil de compétences : %d libellés", len(user_competencies))
     
     if not user_competencies:
         logger.warning("âš ï¸  Aucune compÃ©tence trouvÃ©e pour l'utilisateur %d", uid)
@@ -663,138 +1081,18 @@ def analyze_user(uid: int):
             "info": {"user": uid, "message": "Aucune compÃ©tence trouvÃ©e"}
         })
     
-    # PrÃ©parer les donnÃ©es pour le matching
-    user_items = []
-    all_user_tokens = set()
-    
-    for comp in user_competencies:
-        normalized = _normalize(comp)
-        tokens = set(_tokenize(comp))
-        if normalized and tokens:
-            user_items.append({
-                "raw": comp,
-                "normalized": normalized,
-                "tokens": tokens
-            })
-            all_user_tokens |= tokens
-    
-    logger.info("ðŸ“Š %d compÃ©tences Ã  analyser", len(user_items))
-    
-    # Rechercher les mÃ©tiers ROME
-    logger.info("ðŸ” Recherche de mÃ©tiers ROME...")
-    
-    rome_jobs_pool = {}
-    
-    for comp in user_competencies:
-        normalized = _normalize(comp)
-        if not normalized:
-            continue
-        
-        # Extraire les mots significatifs (>3 caractÃ¨res)
-        words = [w for w in normalized.split() if len(w) > 3]
-        if not words:
-            words = [normalized]
-        
-        # Rechercher avec chaque mot
-        for word in words[:3]:  # Limiter Ã  3 mots pour Ã©viter trop d'appels
-            results = rome_search_jobs(word)
-            for job in results:
-                code = _extract_job_code(job)
-                if code and code not in rome_jobs_pool:
-                    rome_jobs_pool[code] = job
-    
-    logger.info("ðŸ“¦ %d mÃ©tiers ROME trouvÃ©s", len(rome_jobs_pool))
-    
-    # Analyser chaque mÃ©tier
-    fully_matching = []
-    partially_matching = []
-    
-    for code, job_summary in rome_jobs_pool.items():
-        # RÃ©cupÃ©rer les dÃ©tails complets
-        job_details = rome_get_job_details(code)
-        if not job_details:
-            continue
-        
-        job_label = _extract_job_label(job_details)
-        job_competencies = _extract_competencies_from_job(job_details)
-        
-        if not job_competencies:
-            # MÃ©tier sans compÃ©tences dÃ©finies
-            partially_matching.append({
-                "code": code,
-                "label": job_label,
-                "score": 0,
-                "owned": [],
-                "missing": [],
-                "owned_count": 0,
-                "missing_count": 0,
-                "total": 0,
-            })
-            continue
-        
-        # Matching des compÃ©tences
-        owned = []
-        missing = []
-        
-        for rome_comp in job_competencies:
-            rome_tokens = set(_tokenize(rome_comp))
-            
-            # VÃ©rifier s'il y a un overlap avec les tokens utilisateur
-            if not (rome_tokens & all_user_tokens):
-                missing.append(rome_comp)
-                continue
-            
-            # Calculer les scores de similaritÃ©
-            best_ratio = 0.0
-            best_jaccard = 0.0
-            
-            for user_item in user_items:
-                # VÃ©rifier overlap des tokens
-                if not (rome_tokens & user_item["tokens"]):
-                    continue
-                
-                ratio, jaccard = _text_similarity(rome_comp, user_item["raw"])
-                if ratio > best_ratio:
-                    best_ratio = ratio
-                if jaccard > best_jaccard:
-                    best_jaccard = jaccard
-            
-            # DÃ©cider si la compÃ©tence est couverte
-            if best_ratio >= RATIO_THRESHOLD or best_jaccard >= JACCARD_THRESHOLD:
-                owned.append(rome_comp)
-            else:
-                missing.append(rome_comp)
-        
-        # Calculer le score
-        total = len(job_competencies)
-        owned_count = len(owned)
-        score = round((owned_count / total) * 100, 1) if total > 0 else 0.0
-        
-        job_result = {
-            "code": code,
-            "label": job_label,
-            "score": score,
-            "owned": owned,
-            "missing": missing,
-            "owned_count": owned_count,
-            "missing_count": len(missing),
-            "total": total,
-        }
-        
-        # Classer le mÃ©tier
-        if owned_count == total and total > 0:
-            fully_matching.append(job_result)
-        elif owned_count > 0:
-            partially_matching.append(job_result)
-        else:
-            partially_matching.append(job_result)
-    
-    # Trier par score dÃ©croissant
-    fully_matching.sort(key=lambda x: x["score"], reverse=True)
-    partially_matching.sort(key=lambda x: x["score"], reverse=True)
-    
-    logger.info("âœ… Analyse terminÃ©e : %d mÃ©tiers maÃ®trisables, %d envisageables",
-                len(fully_matching), len(partially_matching))
+    mode = _projection_mode(request.args.get("mode"))
+    key = (uid, mode, profile_hash(profile), _projection_source_version(mode))
+    refresh = request.args.get("refresh") in ("1", "true")
+    stored = None if refresh else load_result(*key)
+    if stored is not None:
+        (result, computed_at), cache_status = stored, "hit"
+        fully_matching, partially_matching = result["full"], result["partial"]
+        logger.info("💾 Résultat enregistré le %s réutilisé", computed_at.isoformat(timespec="seconds"))
+    else:
+        cache_status = "refresh" if refresh else "miss"
+        fully_matching, partially_matching = _run_projection(profile, mode)
+        computed_at = store_result(*key, {"full": fully_matching, "partial": partially_matching})
     
     # Pagination
     full_offset = int(request.args.get("full_offset", 0))
@@ -825,5 +1123,177 @@ def analyze_user(uid: int):
                 "has_more": partial_offset + partial_limit < partial_total,
             },
         },
-        "info": {"user": uid}
-    }), 200
\ No newline at end of file
+        "info": {
+            "user": uid,
+            "mode": mode,
+            "cache": cache_status,
+            "computed_at": computed_at.isoformat(timespec="seconds"),
+            "age_seconds": int((datetime.utcnow() - computed_at).total_seconds()),
+        }
+    }), 200
+
+
+@projection_metier_bp.route("/api/rome_cache", methods=["GET"])
+def rome_cache_status():
+    """Occupation du cache des réponses ROME (nombre, taille, TTL)."""
+    return jsonify(cache_stats())
+
+
+@projection_metier_bp.route("/api/rome_referential", methods=["GET"])
+def rome_referential_status():
+    """État du référentiel ROME local et source utilisée par l'analyse."""
+    from Code.routes.rome_referential import referential_stats
+    stats = referential_stats()
+    stats["source"] = "local" if _use_local_referential() else "api"
+    return jsonify(stats)
+
+
+# ============================================================
+#  ANALYSE PROGRESSIVE (Server-Sent Events)
+# ============================================================
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Message Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_projection(profile: List[List[Any]], mode: str):
+    """
+    _run_projection au fil de l'eau : émet un événement "job" par fiche dès
+    qu'elle est récupérée et scorée, puis retourne le classement complet
+    (identique à _rank_jobs).
+    """
+    search_words = _search_words(profile)
+    codes = _pool_codes(search_words, rome_search_jobs_many(search_words))
+    yield _sse("pool", {"searches": len(search_words), "fiches": len(codes)})
+    
+    if mode == "vector":
+        # Le modèle TF-IDF du pool demande toutes les fiches : pas de scoring fiche par fiche
+        fully_matching, partially_matching = _rank_jobs(
+            profile, mode, codes, _parse_jobs(rome_get_jobs_details_many(codes))
+        )
+        for kind, ranked in (("full", fully_matching), ("partial", partially_matching)):
+            for job in ranked:
+                yield _sse("job", {"kind": kind, "job": job})
+        return fully_matching, partially_matching
+    
+    matcher = CompetencyMatcher(_user_items(profile))
+    scored = {}
+    for code, details in rome_get_jobs_details_iter(codes):
+        if not details:
+            continue
+        job_competencies = _extract_competencies_from_job(details)
+        owned, missing = matcher.split(job_competencies) if job_competencies else ([], [])
+        job = scored[code] = _job_result(code, _extract_job_label(details), job_competencies, owned, missing)
+        yield _sse("job", {"kind": "full" if _is_fully_matching(job) else "partial", "job": job})
+    
+    # Classement final : ordre du pool puis score décroissant, comme _rank_jobs
+    ranked = [scored[code] for code in codes if code in scored]
+    fully_matching = sorted((j for j in ranked if _is_fully_matching(j)), key=lambda x: x["score"], reverse=True)
+    partially_matching = sorted((j for j in ranked if not _is_fully_matching(j)), key=lambda x: x["score"], reverse=True)
+    return fully_matching, partially_matching
+
+
+def _projection_events(uid: int, profile: List[List[Any]], mode: str, refresh: bool):
+    """Événements de analyze_user_stream : "pool", "job"..., puis "summary"."""
+    if not profile:
+        yield _sse("summary", {
+            "total": {"full": 0, "partial": 0},
+            "info": {"user": uid, "mode": mode, "message": "Aucune compétence trouvée"},
+        })
+        return
+    
+    key = (uid, mode, profile_hash(profile), _projection_source_version(mode))
+    stored = None if refresh else load_result(*key)
+    if stored is not None:
+        (result, computed_at), cache_status = stored, "hit"
+        fully_matching, partially_matching = result["full"], result["partial"]
+        for kind, ranked in (("full", fully_matching), ("partial", partially_matching)):
+            for job in ranked:
+                yield _sse("job", {"kind": kind, "job": job})
+    else:
+        cache_status = "refresh" if refresh else "miss"
+        fully_matching, partially_matching = yield from _stream_projection(profile, mode)
+        computed_at = store_result(*key, {"full": fully_matching, "partial": partially_matching})
+    
+    yield _sse("summary", {
+        "total": {"full": len(fully_matching), "partial": len(partially_matching)},
+        "info": {
+            "user": uid,
+            "mode": mode,
+            "cache": cache_status,
+            "computed_at": computed_at.isoformat(timespec="seconds"),
+            "age_seconds": int((datetime.utcnow() - computed_at).total_seconds()),
+        },
+    })
+
+
+@projection_metier_bp.route("/analyze_user/<int:uid>/stream", methods=["GET"])
+@projection_metier_bp.route("/analyze/<int:uid>/stream", methods=["GET"])
+def analyze_user_stream(uid: int):
+    """
+    Variante progressive d'analyze_user (text/event-stream) :
+    - "pool"    : {"searches", "fiches"} une fois les recherches ROME faites ;
+    - "job"     : {"kind": "full" | "partial", "job"} par métier, dès que sa fiche est scorée ;
+    - "summary" : {"total", "info"} en fin d'analyse.
+    Le classement complet est enregistré comme par analyze_user (pagination ensuite sans recalcul).
+    """
+    if uid <= 0:
+        return jsonify({"error": "INVALID_USER_ID"}), 400
+    User.query.get_or_404(uid)
+    profile = user_competency_profile(uid)
+    mode = _projection_mode(request.args.get("mode"))
+    refresh = request.args.get("refresh") in ("1", "true")
+    return Response(
+        stream_with_context(_projection_events(uid, profile, mode, refresh)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ============================================================
+#  PROJECTION PAR LOT (toute l'entité, cf. projection_batch)
+# ============================================================
+
+@register_job_handler("projection_batch")
+def run_projection_batch_job(entity_id: int, payload: Dict[str, Any], progress) -> Dict[str, Any]:
+    """Exécuté par un worker de carto_jobs : projection de tous les collaborateurs de l'entité."""
+    from Code.routes.projection_batch import entity_user_ids, project_users
+    return project_users(
+        entity_user_ids(entity_id),
+        mode=payload.get("mode", "heuristic"),
+        refresh=payload.get("refresh", False),
+        progress=progress,
+    )
+
+
+@projection_metier_bp.route("/api/batch", methods=["POST"])
+def start_projection_batch():
+    """Lance la projection de tous les collaborateurs de l'entité active (job d'arrière-plan)."""
+    active_entity_id = Entity.get_active_id()
+    if not active_entity_id:
+        return jsonify({"error": "Aucune entité active"}), 400
+    
+    data = request.get_json(silent=True) or {}
+    mode = request.values.get("mode", data.get("mode", "heuristic"))
+    refresh = str(request.values.get("refresh", data.get("refresh", ""))).strip().lower() in ("1", "true")
+    job_id = enqueue_job(
+        current_app._get_current_object(),
+        "projection_batch",
+        active_entity_id,
+        {"mode": mode, "refresh": refresh},
+    )
+    return jsonify({
+        "status": "queued",
+        "job_id": job_id,
+        "job_url": url_for("projection_metier.projection_batch_status", job_id=job_id),
+    }), 202
+
+
+@projection_metier_bp.route("/api/batch/<job_id>", methods=["GET"])
+def projection_batch_status(job_id: str):
+    """État d'une projection par lot : progress (phase, users_done / users_total), result (statistiques)."""
+    job = get_job(job_id)
+    if not job or job["kind"] != "projection_batch" or job["entity_id"] != Entity.get_active_id():
+        return jsonify({"error": "Job non trouvé"}), 404
+    return jsonify(job)
@@ -0,0 +1,104 @@
+# Code/routes/projection_results.py
+# -*- coding: utf-8 -*-
+"""
+Résultats de projection métier enregistrés (table projection_results).
+
+analyze_user calcule le classement complet d'un utilisateur une fois, puis
+la pagination (full_offset / partial_offset) et les réouvertures de la page
+relisent ce résultat. Il est recalculé quand :
+- le profil de compétences a changé (empreinte différente) ;
+- la source ROME a changé (nouvelle version du référentiel local, passage
+  API ↔ local) ou les seuils de matching ;
+- il a plus de PROJECTION_RESULT_TTL secondes (les réponses de l'API évoluent) ;
+- refresh=1 est demandé.
+PROJECTION_RESULT_TTL=0 désactive l'enregistrement.
+"""
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete, select
+
+from Code.extensions import db
+from Code.models.models import ProjectionResult
+
+
+logger = logging.getLogger("projection_metier.results")
+
+PROJECTION_RESULT_TTL = int(os.getenv("PROJECTION_RESULT_TTL", str(24 * 3600)))
+ZLIB_LEVEL = 6
+
+_schema_ready = False
+
+
+def ensure_projection_results_schema() -> None:
+    """Crée la table projection_results si elle n'existe pas (idempotent)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    ProjectionResult.__table__.create(db.engine, checkfirst=True)
+    _schema_ready = True
+
+
+def load_result(
+    user_id: int, mode: str, profile_hash: str, source_version: str
+) -> Optional[Tuple[Dict[str, Any], datetime]]:
+    """
+    Résultat enregistré encore valide : ({"full", "partial"}, date de calcul), sinon None.
+    """
+    if PROJECTION_RESULT_TTL <= 0:
+        return None
+    try:
+        ensure_projection_results_schema()
+        row = db.session.execute(
+            select(ProjectionResult.profile_hash, ProjectionResult.source_version,
+                   ProjectionResult.payload, ProjectionResult.computed_at)
+            .where(ProjectionResult.user_id == user_id, ProjectionResult.mode == mode)
+        ).first()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Résultats de projection illisibles (%s) : recalcul", e)
+        return None
+    if row is None or row.profile_hash != profile_hash or row.source_version != source_version:
+        return None
+    if (datetime.utcnow() - row.computed_at).total_seconds() >= PROJECTION_RESULT_TTL:
+        return None
+    return json.loads(zlib.decompress(row.payload).decode("utf-8")), row.computed_at
+
+
+def store_result(
+    user_id: int, mode: str, profile_hash: str, source_version: str, result: Dict[str, Any]
+) -> datetime:
+    """Enregistre (ou remplace) le résultat d'une analyse. Retourne sa date de calcul."""
+    computed_at = datetime.utcnow()
+    if PROJECTION_RESULT_TTL <= 0:
+        return computed_at
+    payload = zlib.compress(json.dumps(result, ensure_ascii=False).encode("utf-8"), ZLIB_LEVEL)
+    try:
+        ensure_projection_results_schema()
+        row = db.session.get(ProjectionResult, (user_id, mode))
+        if row is None:
+            row = ProjectionResult(user_id=user_id, mode=mode)
+            db.session.add(row)
+        row.profile_hash = profile_hash
+        row.source_version = source_version
+        row.payload = payload
+        row.computed_at = computed_at
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Résultat de projection non enregistré (%s)", e)
+    return computed_at
+
+
+def discard_results(user_id: Optional[int] = None) -> None:
+    """Supprime les résultats enregistrés (d'un utilisateur, ou tous)."""
+    ensure_projection_results_schema()
+    statement = delete(ProjectionResult)
+    if user_id is not None:
+        statement = statement.where(ProjectionResult.user_id == user_id)
+    db.session.execute(statement)
+    db.session.commit()
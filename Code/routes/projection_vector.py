@@ -0,0 +1,141 @@
+# Code/routes/projection_vector.py
+# -*- coding: utf-8 -*-
+"""
+Mode de projection vectoriel (analyze_user?mode=vector).
+
+Compétences utilisateur et compétences ROME sont représentées par des
+vecteurs TF-IDF creux (tokens de _tokenize, lignes normalisées L2). Tout le
+pool de métiers est évalué par un seul produit matriciel : similarités
+cosinus compétences ROME distinctes × compétences utilisateur, dont le
+maximum par ligne décide si la compétence ROME est couverte
+(>= PROJECTION_VECTOR_THRESHOLD).
+
+Le vocabulaire et les IDF sont calculés sur les compétences du référentiel
+local (mis en cache par version du référentiel), ou à défaut sur celles du
+pool de métiers analysé.
+
+numpy / scipy sont optionnels : sans eux, analyze_user garde le mode heuristique.
+"""
+import hashlib
+import logging
+import math
+import os
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from Code.routes.projection_metier import _tokenize
+from Code.routes.rome_referential import referential_competencies, referential_version
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # numpy / scipy optionnels : mode vectoriel indisponible
+    np = sparse = None
+
+
+logger = logging.getLogger("projection_metier.vector")
+
+VECTOR_THRESHOLD = float(os.getenv("PROJECTION_VECTOR_THRESHOLD", "0.6"))
+# Modèles TF-IDF gardés en mémoire (un par version de référentiel / pool)
+MAX_MODELS = 4
+
+_models: "OrderedDict[str, TfidfModel]" = OrderedDict()
+
+
+def vector_mode_available() -> bool:
+    return sparse is not None
+
+
+class TfidfModel:
+    """Vocabulaire et IDF (lissé : log((1 + N) / (1 + df)) + 1) d'un corpus de libellés."""
+
+    def __init__(self, documents: Iterable[str]):
+        df = Counter()
+        n_docs = 0
+        for text in documents:
+            df.update(set(_tokenize(text)))
+            n_docs += 1
+        self.vocabulary = {token: i for i, token in enumerate(sorted(df))}
+        self.idf = np.array(
+            [math.log((1 + n_docs) / (1 + df[token])) + 1 for token in sorted(df)],
+            dtype=np.float64,
+        )
+        self.n_docs = n_docs
+
+    def transform(self, texts: List[str]) -> "sparse.csr_matrix":
+        """Matrice creuse len(texts) × vocabulaire, lignes normalisées L2 (tokens inconnus ignorés)."""
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            counts = Counter(t for t in _tokenize(text) if t in self.vocabulary)
+            if not counts:
+                continue
+            weights = {self.vocabulary[t]: n * self.idf[self.vocabulary[t]] for t, n in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values()))
+            for col, weight in weights.items():
+                rows.append(row)
+                cols.append(col)
+                values.append(weight / norm)
+        return sparse.csr_matrix(
+            (values, (rows, cols)), shape=(len(texts), len(self.vocabulary)), dtype=np.float64
+        )
+
+
+def model_for(version: str, documents: Callable[[], Iterable[str]]) -> TfidfModel:
+    """Modèle TF-IDF de la version donnée, construit à la première demande."""
+    model = _models.get(version)
+    if model is None:
+        model = TfidfModel(documents())
+        _models[version] = model
+        while len(_models) > MAX_MODELS:
+            _models.popitem(last=False)
+        logger.info("🧮 Modèle TF-IDF %s : %d libellés, %d tokens", version, model.n_docs, len(model.vocabulary))
+    else:
+        _models.move_to_end(version)
+    return model
+
+
+def pool_model(jobs: Dict[str, List[str]]) -> TfidfModel:
+    """Modèle TF-IDF calculé sur les compétences du pool de métiers (sans référentiel local)."""
+    labels = sorted({label for comps in jobs.values() for label in comps})
+    version = "pool:" + hashlib.sha1("\n".join(labels).encode("utf-8")).hexdigest()
+    return model_for(version, lambda: labels)
+
+
+def projection_model(jobs: Dict[str, List[str]], local_referential: bool) -> TfidfModel:
+    """Modèle du référentiel local (par version) s'il sert l'analyse, sinon du pool."""
+    if local_referential:
+        return model_for("referential:" + referential_version(), referential_competencies)
+    return pool_model(jobs)
+
+
+def score_jobs(
+    model: TfidfModel,
+    user_competencies: List[str],
+    jobs: Dict[str, List[str]],
+) -> Dict[str, Tuple[List[str], List[str]]]:
+    """
+    Compétences maîtrisées / manquantes de chaque métier du pool.
+
+    Args:
+        model: modèle TF-IDF (vocabulaire, IDF)
+        user_competencies: libellés des compétences de l'utilisateur
+        jobs: {code: libellés des compétences du métier}
+
+    Returns:
+        {code: (maîtrisées, manquantes)}, dans l'ordre des compétences du métier
+    """
+    codes = list(jobs)
+    labels = list(dict.fromkeys(label for code in codes for label in jobs[code]))
+    if not labels or not user_competencies:
+        return {code: ([], list(jobs[code])) for code in codes}
+    column = {label: i for i, label in enumerate(labels)}
+
+    similarities = model.transform(labels) @ model.transform(user_competencies).T
+    covered = similarities.max(axis=1).toarray().ravel() >= VECTOR_THRESHOLD
+
+    results = {}
+    for code in codes:
+        owned = [label for label in jobs[code] if covered[column[label]]]
+        missing = [label for label in jobs[code] if not covered[column[label]]]
+        results[code] = (owned, missing)
+    return results
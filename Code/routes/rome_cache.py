@@ -0,0 +1,298 @@
+# Code/routes/rome_cache.py
+# -*- coding: utf-8 -*-
+"""
+Cache persistant des réponses de l'API ROME (table rome_cache).
+
+Une analyse de projection métier répète des centaines de fois les mêmes
+appels (/metier/recherche par mot, /fiche-metier par code). Chaque réponse
+est gardée en base, compressée, avec sa date d'appel :
+
+- âge < ROME_CACHE_TTL                       : servie depuis la base, pas d'appel réseau ;
+- âge < ROME_CACHE_TTL + ROME_CACHE_STALE_TTL : servie telle quelle, et rafraîchie
+  en tâche de fond (stale-while-revalidate) ;
+- au-delà, ou absente                        : appel réseau, réponse stockée.
+
+Les erreurs (timeout, HTTP != 200, pas de token) ne sont pas mises en cache.
+Au-delà de ROME_CACHE_MAX_BYTES, les réponses les plus anciennes sont supprimées.
+ROME_CACHE_TTL=0 désactive le cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+
+from Code.extensions import db
+from Code.models.models import RomeCacheEntry
+
+
+logger = logging.getLogger("projection_metier.cache")
+
+ROME_CACHE_TTL = int(os.getenv("ROME_CACHE_TTL", str(7 * 24 * 3600)))
+ROME_CACHE_STALE_TTL = int(os.getenv("ROME_CACHE_STALE_TTL", str(30 * 24 * 3600)))
+ROME_CACHE_MAX_BYTES = int(os.getenv("ROME_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Après éviction, la taille du cache redescend à cette part du maximum
+EVICT_TARGET_RATIO = 0.9
+ZLIB_LEVEL = 6
+# Threads du pool de rafraîchissement en tâche de fond (les autres clés attendent leur tour)
+MAX_BACKGROUND_REFRESH = 4
+
+FRESH, STALE, MISS = "fresh", "stale", "miss"
+
+_schema_ready = False
+# Taille totale connue du cache (None : à recompter), évite un SUM par écriture
+_size_state = {"total": None}
+_refreshing = set()
+_lock = threading.Lock()
+_refresh_pool = ThreadPoolExecutor(max_workers=MAX_BACKGROUND_REFRESH, thread_name_prefix="rome-refresh")
+
+
+def ensure_rome_cache_schema() -> None:
+    """Crée la table rome_cache si elle n'existe pas (idempotent)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    RomeCacheEntry.__table__.create(db.engine, checkfirst=True)
+    _schema_ready = True
+
+
+def cache_enabled() -> bool:
+    return ROME_CACHE_TTL > 0
+
+
+def cache_key(endpoint: str, params: Dict[str, Any]) -> str:
+    raw = endpoint + "?" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+#  LECTURE / ÉCRITURE
+# ============================================================
+
+def cache_lookup(endpoint: str, params: Dict[str, Any]) -> Tuple[Any, str]:
+    """
+    Réponse en cache et son état : (données, "fresh" | "stale") ou (None, "miss").
+    """
+    if not cache_enabled():
+        return None, MISS
+    try:
+        ensure_rome_cache_schema()
+        row = db.session.execute(
+            select(RomeCacheEntry.payload, RomeCacheEntry.fetched_at)
+            .where(RomeCacheEntry.cache_key == cache_key(endpoint, params))
+        ).first()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Cache ROME illisible (%s) : appel réseau", e)
+        return None, MISS
+    if row is None:
+        return None, MISS
+
+    age = (datetime.utcnow() - row.fetched_at).total_seconds()
+    if age >= ROME_CACHE_TTL + ROME_CACHE_STALE_TTL:
+        return None, MISS
+    data = json.loads(zlib.decompress(row.payload).decode("utf-8"))
+    return data, FRESH if age < ROME_CACHE_TTL else STALE
+
+
+def cache_store(endpoint: str, params: Dict[str, Any], data: Any) -> None:
+    """Enregistre (ou remplace) la réponse d'un appel réussi."""
+    if not cache_enabled():
+        return
+    payload = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"), ZLIB_LEVEL)
+    key = cache_key(endpoint, params)
+    try:
+        ensure_rome_cache_schema()
+        entry = db.session.get(RomeCacheEntry, key)
+        if entry is None:
+            entry = RomeCacheEntry(cache_key=key, endpoint=endpoint,
+                                   params=json.dumps(params, sort_keys=True, ensure_ascii=False))
+            db.session.add(entry)
+            added = len(payload)
+        else:
+            added = len(payload) - (entry.size_bytes or 0)
+        entry.payload = payload
+        entry.size_bytes = len(payload)
+        entry.fetched_at = datetime.utcnow()
+        db.session.commit()
+    except IntegrityError:
+        # Même réponse stockée en parallèle par un autre worker
+        db.session.rollback()
+        return
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Réponse ROME non mise en cache (%s)", e)
+        return
+
+    with _lock:
+        if _size_state["total"] is not None:
+            _size_state["total"] += added
+    _evict_if_needed()
+
+
+def _evict_if_needed() -> None:
+    """Supprime les réponses les plus anciennes si le cache dépasse ROME_CACHE_MAX_BYTES."""
+    with _lock:
+        total = _size_state["total"]
+    if total is None:
+        total = db.session.scalar(select(func.coalesce(func.sum(RomeCacheEntry.size_bytes), 0)))
+    if total <= ROME_CACHE_MAX_BYTES:
+        with _lock:
+            _size_state["total"] = total
+        return
+
+    target = int(ROME_CACHE_MAX_BYTES * EVICT_TARGET_RATIO)
+    evicted = []
+    for key, size in db.session.execute(
+        select(RomeCacheEntry.cache_key, RomeCacheEntry.size_bytes).order_by(RomeCacheEntry.fetched_at)
+    ):
+        if total <= target:
+            break
+        evicted.append(key)
+        total -= size or 0
+    try:
+        for i in range(0, len(evicted), 500):
+            db.session.execute(delete(RomeCacheEntry).where(RomeCacheEntry.cache_key.in_(evicted[i:i + 500])))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Éviction du cache ROME impossible (%s)", e)
+        total = None
+    with _lock:
+        _size_state["total"] = total
+    logger.info("🧹 Cache ROME : %d réponses évincées", len(evicted))
+
+
+# ============================================================
+#  APPEL AVEC CACHE
+# ============================================================
+
+def cached_fetch(endpoint: str, params: Dict[str, Any], fetch: Callable[[], Optional[Any]]) -> Optional[Any]:
+    """
+    Réponse de l'appel endpoint(params), depuis le cache si possible.
+    fetch() fait l'appel réseau : données JSON, ou None en cas d'échec (non mis en cache).
+    """
+    data, state = cache_lookup(endpoint, params)
+    if state == FRESH:
+        return data
+    if state == STALE:
+        _refresh_in_background(endpoint, params, fetch)
+        return data
+
+    data = fetch()
+    if data is not None:
+        cache_store(endpoint, params, data)
+    return data
+
+
+def cached_fetch_many(
+    endpoint: str,
+    params_list: List[Dict[str, Any]],
+    fetch: Callable[[Dict[str, Any]], Optional[Any]],
+    max_workers: int = 1,
+) -> List[Optional[Any]]:
+    """
+    cached_fetch pour une liste d'appels (réponses dans le même ordre).
+
+    Les lectures / écritures du cache restent dans le thread appelant (session
+    SQLAlchemy) ; seuls les appels réseau manquants, fetch(params), sont
+    répartis sur max_workers threads.
+    """
+    results: List[Optional[Any]] = [None] * len(params_list)
+    for i, data in cached_fetch_iter(endpoint, params_list, fetch, max_workers):
+        results[i] = data
+    return results
+
+
+def cached_fetch_iter(
+    endpoint: str,
+    params_list: List[Dict[str, Any]],
+    fetch: Callable[[Dict[str, Any]], Optional[Any]],
+    max_workers: int = 1,
+) -> Iterator[Tuple[int, Optional[Any]]]:
+    """
+    cached_fetch_many au fil de l'eau : (indice, réponse) dès qu'une réponse
+    est disponible, celles du cache d'abord, puis les appels réseau dans leur
+    ordre d'arrivée. Abandonner l'itération annule les appels pas encore lancés.
+    """
+    missing = []
+    for i, params in enumerate(params_list):
+        data, state = cache_lookup(endpoint, params)
+        if state == MISS:
+            missing.append(i)
+            continue
+        if state == STALE:
+            _refresh_in_background(endpoint, params, lambda p=params: fetch(p))
+        yield i, data
+
+    if not missing:
+        return
+    workers = min(max_workers, len(missing))
+    if workers > 1:
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rome-fetch")
+        try:
+            futures = {pool.submit(fetch, params_list[i]): i for i in missing}
+            fetched = ((futures[future], future.result()) for future in as_completed(futures))
+            for i, data in fetched:
+                if data is not None:
+                    cache_store(endpoint, params_list[i], data)
+                yield i, data
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        for i in missing:
+            data = fetch(params_list[i])
+            if data is not None:
+                cache_store(endpoint, params_list[i], data)
+            yield i, data
+
+
+def _refresh_in_background(endpoint: str, params: Dict[str, Any], fetch: Callable[[], Optional[Any]]) -> None:
+    """Rafraîchit une réponse périmée dans le pool de fond (un seul rafraîchissement par clé)."""
+    if not has_app_context():
+        return
+    key = cache_key(endpoint, params)
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    app = current_app._get_current_object()
+
+    def refresh():
+        try:
+            data = fetch()
+            if data is not None:
+                with app.app_context():
+                    cache_store(endpoint, params, data)
+        except Exception as e:
+            logger.warning("Rafraîchissement ROME %s échoué (%s)", endpoint, e)
+        finally:
+            with _lock:
+                _refreshing.discard(key)
+
+    _refresh_pool.submit(refresh)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Nombre de réponses, taille et plus ancienne date d'appel."""
+    ensure_rome_cache_schema()
+    count, size, oldest = db.session.execute(
+        select(func.count(), func.coalesce(func.sum(RomeCacheEntry.size_bytes), 0), func.min(RomeCacheEntry.fetched_at))
+    ).one()
+    return {
+        "entries": count,
+        "size_bytes": size,
+        "max_bytes": ROME_CACHE_MAX_BYTES,
+        "ttl": ROME_CACHE_TTL,
+        "stale_ttl": ROME_CACHE_STALE_TTL,
+        "oldest": oldest.isoformat(timespec="seconds") if oldest else None,
+    }
@@ -0,0 +1,354 @@
+# Code/routes/rome_referential.py
+# -*- coding: utf-8 -*-
+"""
+Référentiel ROME 4.0 local (tables rome_fiches et rome_index).
+
+Les fiches métiers sont importées une fois (téléchargement depuis l'API ou
+dump JSON local), puis la projection métier cherche dans un index inversé
+(token normalisé → codes ROME) construit avec _normalize / _tokenize :
+aucun appel réseau, réponse en quelques millisecondes.
+
+Chaque fiche garde sa version (champ version / dateModification de l'API,
+sinon SHA-1 du contenu) : un nouvel import ne réécrit que les fiches dont
+la version a changé.
+
+Import / rafraîchissement : Code/scripts/import_rome_referential.py
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, delete, func, insert, select
+
+from Code.extensions import db
+from Code.models.models import RomeFiche, RomeIndexTerm
+from Code.routes.projection_metier import (
+    ROME_MAX_WORKERS,
+    _extract_competencies_from_job,
+    _extract_job_code,
+    _extract_job_label,
+    _get_auth_headers,
+    _rome_get,
+    _tokenize,
+)
+
+
+logger = logging.getLogger("projection_metier.referential")
+
+ROME_LOCAL_SEARCH_LIMIT = int(os.getenv("ROME_LOCAL_SEARCH_LIMIT", "10"))
+
+# Poids d'un token selon l'endroit où il apparaît dans la fiche
+LABEL_WEIGHT = 4
+APPELLATION_WEIGHT = 2
+COMPETENCY_WEIGHT = 1
+
+VERSION_FIELDS = ("version", "dateModification", "dateMaj")
+MAX_TOKEN_LENGTH = 64
+ZLIB_LEVEL = 6
+CHUNK = 500
+# Délai avant de revérifier qu'un référentiel local est chargé
+READY_RECHECK_SECONDS = 60
+
+_schema_ready = False
+_ready_state = {"value": None, "checked_at": 0.0}
+
+
+def ensure_rome_referential_schema() -> None:
+    """Crée les tables rome_fiches / rome_index si elles n'existent pas (idempotent)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    RomeFiche.__table__.create(db.engine, checkfirst=True)
+    RomeIndexTerm.__table__.create(db.engine, checkfirst=True)
+    _schema_ready = True
+
+
+def referential_ready() -> bool:
+    """Vrai si un référentiel local est chargé (vérifié au plus une fois par minute)."""
+    now = time.monotonic()
+    if _ready_state["value"] is None or now - _ready_state["checked_at"] > READY_RECHECK_SECONDS:
+        try:
+            ensure_rome_referential_schema()
+            _ready_state["value"] = db.session.execute(select(RomeFiche.code).limit(1)).first() is not None
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Référentiel ROME local illisible (%s)", e)
+            _ready_state["value"] = False
+        _ready_state["checked_at"] = now
+    return _ready_state["value"]
+
+
+def _chunks(items: List[Any]) -> Iterable[List[Any]]:
+    for i in range(0, len(items), CHUNK):
+        yield items[i:i + CHUNK]
+
+
+# ============================================================
+#  FICHES & INDEX
+# ============================================================
+
+def _explicit_version(fiche: Dict[str, Any]) -> Optional[str]:
+    metier = fiche.get("metier") if isinstance(fiche.get("metier"), dict) else {}
+    for field in VERSION_FIELDS:
+        value = fiche.get(field) or metier.get(field)
+        if value:
+            return str(value)[:64]
+    return None
+
+
+def fiche_version(fiche: Dict[str, Any]) -> str:
+    """Version de la fiche : champ de l'API, sinon SHA-1 du contenu."""
+    return _explicit_version(fiche) or hashlib.sha1(
+        json.dumps(fiche, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def _appellations(fiche: Dict[str, Any]) -> List[str]:
+    metier = fiche.get("metier") if isinstance(fiche.get("metier"), dict) else {}
+    items = fiche.get("appellations") or metier.get("appellations") or []
+    return [(a.get("libelle") or "").strip() for a in items if isinstance(a, dict)]
+
+
+def index_terms(fiche: Dict[str, Any]) -> Dict[str, int]:
+    """Tokens indexés d'une fiche et leur poids (le plus fort si le token apparaît plusieurs fois)."""
+    weights: Dict[str, int] = {}
+
+    def add(text: str, weight: int) -> None:
+        for token in _tokenize(text):
+            if len(token) <= MAX_TOKEN_LENGTH and weights.get(token, 0) < weight:
+                weights[token] = weight
+
+    add(_extract_job_label(fiche), LABEL_WEIGHT)
+    for label in _appellations(fiche):
+        add(label, APPELLATION_WEIGHT)
+    for label in _extract_competencies_from_job(fiche):
+        add(label, COMPETENCY_WEIGHT)
+    return weights
+
+
+def _delete_fiches(codes: List[str]) -> None:
+    """Supprime les fiches des codes donnés et leur index."""
+    for chunk in _chunks(codes):
+        db.session.execute(delete(RomeIndexTerm).where(RomeIndexTerm.code.in_(chunk)))
+        db.session.execute(delete(RomeFiche).where(RomeFiche.code.in_(chunk)))
+
+
+def load_fiches(fiches: Iterable[Dict[str, Any]], prune: bool = False) -> Dict[str, int]:
+    """
+    Importe des fiches métiers (format /fiche-metier) dans le référentiel local.
+
+    Seules les fiches nouvelles ou dont la version a changé sont réécrites
+    (ligne + index). prune=True supprime les fiches absentes de l'import.
+
+    Returns:
+        {"added", "updated", "unchanged", "removed", "skipped"}
+    """
+    ensure_rome_referential_schema()
+    known = dict(db.session.execute(select(RomeFiche.code, RomeFiche.version)).all())
+    stats = Counter(added=0, updated=0, unchanged=0, removed=0, skipped=0)
+    seen = set()
+    fiche_rows, term_rows = [], []
+    now = datetime.utcnow()
+
+    for fiche in fiches:
+        code = _extract_job_code(fiche) if isinstance(fiche, dict) else ""
+        if not code or code in seen:
+            stats["skipped"] += 1
+            continue
+        seen.add(code)
+        version = fiche_version(fiche)
+        if known.get(code) == version:
+            stats["unchanged"] += 1
+            continue
+        stats["updated" if code in known else "added"] += 1
+        fiche_rows.append({
+            "b_code": code,
+            "b_libelle": _extract_job_label(fiche)[:255],
+            "b_version": version,
+            "b_payload": zlib.compress(json.dumps(fiche, ensure_ascii=False).encode("utf-8"), ZLIB_LEVEL),
+            "b_imported_at": now,
+        })
+        term_rows.extend(
+            {"b_token": token, "b_code": code, "b_weight": weight}
+            for token, weight in index_terms(fiche).items()
+        )
+
+    removed = [code for code in known if code not in seen] if prune else []
+    stats["removed"] = len(removed)
+    _delete_fiches([row["b_code"] for row in fiche_rows if row["b_code"] in known] + removed)
+    if fiche_rows:
+        db.session.execute(
+            insert(RomeFiche).values(
+                code=bindparam("b_code"), libelle=bindparam("b_libelle"), version=bindparam("b_version"),
+                payload=bindparam("b_payload"), imported_at=bindparam("b_imported_at"),
+            ),
+            fiche_rows,
+        )
+    if term_rows:
+        db.session.execute(
+            insert(RomeIndexTerm).values(
+                token=bindparam("b_token"), code=bindparam("b_code"), weight=bindparam("b_weight"),
+            ),
+            term_rows,
+        )
+    db.session.commit()
+    _ready_state["value"] = None
+
+    logger.info("📚 Référentiel ROME : %d ajoutées, %d mises à jour, %d inchangées, %d supprimées",
+                stats["added"], stats["updated"], stats["unchanged"], stats["removed"])
+    return dict(stats)
+
+
+def load_dump(path: str, prune: bool = False) -> Dict[str, int]:
+    """
+    Importe un dump JSON local (.json ou .json.gz) : liste de fiches au format
+    /fiche-metier, ou objet {"fiches": [...]}.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    fiches = data.get("fiches", []) if isinstance(data, dict) else data
+    return load_fiches(fiches, prune=prune)
+
+
+def download_referential(prune: bool = True) -> Dict[str, int]:
+    """
+    Télécharge le référentiel complet depuis l'API ROME (liste des fiches,
+    puis détail de chaque fiche en parallèle, dans la limite du quota).
+
+    Les fiches dont la liste annonce une version déjà importée ne sont pas
+    téléchargées ; prune=True supprime les fiches retirées du ROME.
+    """
+    ensure_rome_referential_schema()
+    listing = _rome_get("/v1/fiches-rome/fiche-metier", {}, "liste des fiches ROME")
+    if isinstance(listing, dict):
+        listing = listing.get("fiches") or listing.get("metiers")
+    if not isinstance(listing, list):
+        raise RuntimeError("Liste des fiches ROME indisponible")
+
+    known = dict(db.session.execute(select(RomeFiche.code, RomeFiche.version)).all())
+    listed, to_fetch = [], []
+    for summary in listing:
+        code = _extract_job_code(summary) if isinstance(summary, dict) else ""
+        if not code:
+            continue
+        listed.append(code)
+        version = _explicit_version(summary)
+        if not version or known.get(code) != version:
+            to_fetch.append(code)
+
+    _get_auth_headers()  # token obtenu une fois, avant de lancer les workers
+    with ThreadPoolExecutor(max_workers=ROME_MAX_WORKERS, thread_name_prefix="rome-download") as pool:
+        fiches = list(pool.map(
+            lambda code: _rome_get("/v1/fiches-rome/fiche-metier", {"code": code}, f"fiche ROME {code}"),
+            to_fetch,
+        ))
+    failed = sum(1 for fiche in fiches if not isinstance(fiche, dict))
+
+    stats = load_fiches([fiche for fiche in fiches if isinstance(fiche, dict)])
+    stats["unchanged"] += len(listed) - len(to_fetch)
+    stats["failed"] = failed
+    if prune:
+        keep = set(listed)
+        removed = [code for code in known if code not in keep]
+        if removed:
+            _delete_fiches(removed)
+            db.session.commit()
+            _ready_state["value"] = None
+        stats["removed"] = len(removed)
+    return stats
+
+
+# ============================================================
+#  RECHERCHE LOCALE
+# ============================================================
+
+def search_local_many(queries: Iterable[str], limit: int = ROME_LOCAL_SEARCH_LIMIT) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Recherche de métiers dans l'index inversé, pour plusieurs termes en une requête.
+    Score d'une fiche : somme des poids des tokens du terme qu'elle contient.
+
+    Returns:
+        {terme: [{"code", "libelle"}, ...]} (format de /metier/recherche)
+    """
+    tokens_by_query = {q: set(_tokenize(q)) for q in queries if q}
+    all_tokens = sorted(set().union(*tokens_by_query.values())) if tokens_by_query else []
+
+    postings = defaultdict(list)
+    for chunk in _chunks(all_tokens):
+        for token, code, weight in db.session.execute(
+            select(RomeIndexTerm.token, RomeIndexTerm.code, RomeIndexTerm.weight)
+            .where(RomeIndexTerm.token.in_(chunk))
+        ):
+            postings[token].append((code, weight))
+
+    ranked, wanted = {}, set()
+    for query, tokens in tokens_by_query.items():
+        scores = Counter()
+        for token in tokens:
+            for code, weight in postings.get(token, ()):
+                scores[code] += weight
+        ranked[query] = [code for code, _ in sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]]
+        wanted.update(ranked[query])
+
+    labels = {}
+    for chunk in _chunks(sorted(wanted)):
+        labels.update(db.session.execute(
+            select(RomeFiche.code, RomeFiche.libelle).where(RomeFiche.code.in_(chunk))
+        ).all())
+    return {
+        query: [{"code": code, "libelle": labels.get(code, "")} for code in codes]
+        for query, codes in ranked.items()
+    }
+
+
+def local_fiches(codes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Fiches complètes du référentiel local : {code: fiche} (codes absents ignorés)."""
+    fiches = {}
+    for chunk in _chunks(sorted(set(codes))):
+        for code, payload in db.session.execute(
+            select(RomeFiche.code, RomeFiche.payload).where(RomeFiche.code.in_(chunk))
+        ):
+            fiches[code] = json.loads(zlib.decompress(payload).decode("utf-8"))
+    return fiches
+
+
+def referential_version() -> str:
+    """
+    Empreinte du contenu du référentiel local : tout import qui modifie une
+    fiche change la date d'import maximale, toute suppression le nombre de fiches.
+    """
+    ensure_rome_referential_schema()
+    count, last_import = db.session.execute(
+        select(func.count(), func.max(RomeFiche.imported_at))
+    ).one()
+    return f"{count}:{last_import.isoformat() if last_import else '-'}"
+
+
+def referential_competencies() -> Iterable[str]:
+    """Libellés de compétences de toutes les fiches du référentiel local."""
+    ensure_rome_referential_schema()
+    for (payload,) in db.session.execute(select(RomeFiche.payload)):
+        yield from _extract_competencies_from_job(json.loads(zlib.decompress(payload).decode("utf-8")))
+
+
+def referential_stats() -> Dict[str, Any]:
+    """Nombre de fiches, de termes indexés et date du dernier import."""
+    ensure_rome_referential_schema()
+    fiches, last_import = db.session.execute(
+        select(func.count(), func.max(RomeFiche.imported_at))
+    ).one()
+    terms = db.session.scalar(select(func.count()).select_from(RomeIndexTerm))
+    return {
+        "fiches": fiches,
+        "terms": terms,
+        "last_import": last_import.isoformat(timespec="seconds") if last_import else None,
+    }
@@ -0,0 +1,161 @@
+# Code/routes/rome_token_store.py
+"""
+Token OAuth2 de l'API ROME et seau à jetons du quota d'appels, partagés
+entre les workers gunicorn d'une même machine (fichier SQLite local
+instance/rome_token.db, comme la file de carto_jobs).
+
+- Une seule ligne : token, date d'obtention / d'expiration, mode
+  d'authentification qui a fonctionné, dernier échec.
+- Renouvellement à exécution unique : un bail (refresh_owner / lease_until)
+  est pris par UPDATE atomique ; les autres appelants attendent le nouveau
+  token au lieu d'appeler ROME_TOKEN_URL à leur tour. Un bail expiré
+  (process tué pendant le renouvellement) peut être repris.
+- Quota ROME_RATE_LIMIT : un seul seau (rome_rate) pour tous les workers,
+  prélevé dans une transaction IMMEDIATE ; sans lui chaque worker aurait
+  son propre quota et la machine appellerait l'API N fois plus vite.
+
+Le fichier contient un token d'accès : créé avec les droits 0600.
+"""
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+
+TOKEN_DB_PATH = os.getenv(
+    "ROME_TOKEN_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "rome_token.db")
+)
+
+
+# Fichier dont le schéma a été créé par ce process (TOKEN_DB_PATH peut changer : scripts de bench)
+_schema_ready_for = None
+
+
+def ensure_token_store_schema(conn) -> None:
+    """Crée les tables rome_token / rome_rate (idempotent, une fois par process et par fichier)."""
+    global _schema_ready_for
+    if _schema_ready_for == TOKEN_DB_PATH:
+        return
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rome_token (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            access_token TEXT,
+            issued_at REAL,
+            expires_at REAL,
+            auth_mode TEXT,
+            failed_at REAL,
+            refresh_owner TEXT,
+            lease_until REAL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO rome_token (id) VALUES (1)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rome_rate (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            tokens REAL,
+            updated REAL
+        )
+    """)
+    _schema_ready_for = TOKEN_DB_PATH
+
+
+def _connect():
+    if _schema_ready_for != TOKEN_DB_PATH:
+        os.makedirs(os.path.dirname(TOKEN_DB_PATH), exist_ok=True)
+        if not os.path.exists(TOKEN_DB_PATH):
+            os.close(os.open(TOKEN_DB_PATH, os.O_CREAT | os.O_WRONLY, 0o600))
+    conn = sqlite3.connect(TOKEN_DB_PATH, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    ensure_token_store_schema(conn)
+    return conn
+
+
+def read_token() -> Dict[str, Any]:
+    """État partagé : access_token, issued_at, expires_at, auth_mode, failed_at (None si absents)."""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT access_token, issued_at, expires_at, auth_mode, failed_at FROM rome_token WHERE id = 1"
+        ).fetchone()
+        return dict(row)
+    finally:
+        conn.close()
+
+
+def acquire_refresh(owner: str, lease_seconds: float) -> bool:
+    """Prend le bail de renouvellement s'il est libre (ou expiré). Vrai si obtenu."""
+    now = time.time()
+    conn = _connect()
+    try:
+        cur = conn.execute(
+            "UPDATE rome_token SET refresh_owner = ?, lease_until = ? "
+            "WHERE id = 1 AND (lease_until IS NULL OR lease_until < ? OR refresh_owner = ?)",
+            (owner, now + lease_seconds, now, owner)
+        )
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def finish_refresh(
+    owner: str,
+    access_token: Optional[str],
+    issued_at: float = 0,
+    expires_at: float = 0,
+    auth_mode: Optional[str] = None,
+) -> None:
+    """
+    Enregistre le résultat du renouvellement (token ou échec) et libère le bail.
+    Le mode d'authentification qui a fonctionné est conservé pour le prochain essai.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        if access_token:
+            conn.execute(
+                "UPDATE rome_token SET access_token = ?, issued_at = ?, expires_at = ?, auth_mode = ?, "
+                "failed_at = NULL, refresh_owner = NULL, lease_until = NULL WHERE id = 1 AND refresh_owner = ?",
+                (access_token, issued_at, expires_at, auth_mode, owner)
+            )
+        else:
+            conn.execute(
+                "UPDATE rome_token SET failed_at = ?, refresh_owner = NULL, lease_until = NULL "
+                "WHERE id = 1 AND refresh_owner = ?",
+                (now, owner)
+            )
+    finally:
+        conn.close()
+
+
+def take_rate_token(rate: float, burst: float) -> float:
+    """
+    Prélève un jeton du seau partagé (rate jetons/s, au plus burst).
+    Retourne 0 si le jeton est obtenu, sinon le délai (s) avant le prochain.
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        row = conn.execute("SELECT tokens, updated FROM rome_rate WHERE id = 1").fetchone()
+        if row is None:
+            tokens = float(burst)
+        else:
+            tokens = min(float(burst), row["tokens"] + max(0.0, now - row["updated"]) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        conn.execute(
+            "INSERT OR REPLACE INTO rome_rate (id, tokens, updated) VALUES (1, ?, ?)", (tokens, now)
+        )
+        conn.execute("COMMIT")
+        return wait
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
@@ -0,0 +1,146 @@
+# Code/scripts/bench_competency_matching.py
+"""
+Benchmark : matching compétences utilisateur ↔ compétences des fiches ROME.
+
+Compare l'ancienne boucle d'analyze_user (_text_similarity sur chaque paire
+partageant un token) à CompetencyMatcher, sur un profil synthétique de
+300 compétences et 500 fiches de 15 compétences (libellés repris d'une
+fiche à l'autre, variantes proches : pluriels, mots échangés, fautes).
+
+Le script échoue (code 1) si une fiche n'obtient pas exactement les mêmes
+compétences maîtrisées / manquantes. Si numpy / scipy sont installés, le mode
+vectoriel (projection_vector, TF-IDF) est aussi chronométré, avec son taux
+d'accord avec l'heuristique.
+
+UTILISATION:
+    python Code/scripts/bench_competency_matching.py [nb_competences] [nb_fiches]
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.routes import projection_metier as pm
+from Code.routes import projection_vector as pv
+
+logging.getLogger("projection_metier").setLevel(logging.WARNING)
+
+ACTIONS = [
+    "gestion", "suivi", "analyse", "contrôle", "planification", "réalisation", "animation",
+    "coordination", "rédaction", "mise en place", "maintenance", "négociation", "conception",
+    "pilotage", "évaluation", "organisation", "préparation", "vérification", "optimisation", "accueil",
+]
+OBJECTS = [
+    "budget", "projet", "équipe", "client", "fournisseur", "stock", "production", "qualité",
+    "sécurité", "contrat", "planning", "document technique", "réunion", "formation", "achat",
+    "installation électrique", "réseau informatique", "données", "commande", "livraison",
+    "dossier administratif", "procédure", "indicateur", "chantier", "prestation", "risque",
+    "équipement industriel", "campagne marketing", "paie", "recrutement",
+]
+QUALIFIERS = ["", "", "", " opérationnel", " prévisionnel", " de l'entreprise", " en continu", " du service"]
+
+
+def phrase(rng):
+    return f"{rng.choice(ACTIONS).capitalize()} de la {rng.choice(OBJECTS)}{rng.choice(QUALIFIERS)}".strip()
+
+
+def variant(rng, text):
+    """Variante proche d'un libellé : pluriel, faute de frappe, mot remplacé ou inchangé."""
+    words = text.split()
+    kind = rng.randrange(5)
+    if kind == 0:
+        words[-1] += "s"
+    elif kind == 1 and len(words[-1]) > 4:
+        k = rng.randrange(1, len(words[-1]) - 1)
+        words[-1] = words[-1][:k] + words[-1][k + 1:]
+    elif kind == 2:
+        words[0] = rng.choice(ACTIONS).capitalize()
+    elif kind == 3:
+        words.append(rng.choice(["et", "des"]))
+        words.append(rng.choice(OBJECTS))
+    return " ".join(words)
+
+
+def build_dataset(n_user, n_fiches, seed=42):
+    rng = random.Random(seed)
+    rome_labels = list(dict.fromkeys(phrase(rng) for _ in range(2500)))
+    fiches = [[rng.choice(rome_labels) for _ in range(15)] for _ in range(n_fiches)]
+    user = [variant(rng, rng.choice(rome_labels)) if rng.random() < 0.7 else phrase(rng) for _ in range(n_user)]
+    items = []
+    for comp in user:
+        normalized = pm._normalize(comp)
+        tokens = set(pm._tokenize(comp))
+        if normalized and tokens:
+            items.append({"raw": comp, "normalized": normalized, "tokens": tokens})
+    return items, fiches
+
+
+def reference_split(user_items, job_competencies):
+    """Ancienne boucle d'analyze_user (référence)."""
+    all_user_tokens = set().union(*(item["tokens"] for item in user_items))
+    owned, missing = [], []
+    for rome_comp in job_competencies:
+        rome_tokens = set(pm._tokenize(rome_comp))
+        if not (rome_tokens & all_user_tokens):
+            missing.append(rome_comp)
+            continue
+        best_ratio = best_jaccard = 0.0
+        for user_item in user_items:
+            if not (rome_tokens & user_item["tokens"]):
+                continue
+            ratio, jaccard = pm._text_similarity(rome_comp, user_item["raw"])
+            best_ratio = max(best_ratio, ratio)
+            best_jaccard = max(best_jaccard, jaccard)
+        if best_ratio >= pm.RATIO_THRESHOLD or best_jaccard >= pm.JACCARD_THRESHOLD:
+            owned.append(rome_comp)
+        else:
+            missing.append(rome_comp)
+    return owned, missing
+
+
+def main():
+    n_user = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    n_fiches = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    items, fiches = build_dataset(n_user, n_fiches)
+    print(f"Matching : {len(items)} compétences utilisateur × {len(fiches)} fiches "
+          f"({sum(len(f) for f in fiches)} compétences ROME)")
+
+    t0 = time.perf_counter()
+    expected = [reference_split(items, fiche) for fiche in fiches]
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    matcher = pm.CompetencyMatcher(items)
+    got = [matcher.split(fiche) for fiche in fiches]
+    t_new = time.perf_counter() - t0
+
+    owned = sum(len(o) for o, _ in got)
+    print(f"  boucle d'origine   {t_ref:8.2f} s")
+    print(f"  CompetencyMatcher  {t_new:8.2f} s   (x{t_ref / t_new:.0f})")
+    print(f"  {owned} compétences maîtrisées, {len(matcher._memo)} libellés ROME distincts évalués")
+
+    if pv.vector_mode_available():
+        jobs = {str(i): fiche for i, fiche in enumerate(fiches)}
+        t0 = time.perf_counter()
+        model = pv.pool_model(jobs)
+        vector = pv.score_jobs(model, [item["raw"] for item in items], jobs)
+        t_vec = time.perf_counter() - t0
+        agree = sum(
+            1 for i, fiche in enumerate(fiches) for label in fiche
+            if (label in vector[str(i)][0]) == (label in got[i][0])
+        )
+        print(f"  mode vectoriel     {t_vec:8.2f} s   ({agree / sum(len(f) for f in fiches):.0%} "
+              f"d'accord avec l'heuristique, seuil {pv.VECTOR_THRESHOLD})")
+
+    diffs = sum(1 for a, b in zip(expected, got) if a != b)
+    if diffs:
+        print(f"  ❌ {diffs} fiche(s) avec un résultat différent")
+        sys.exit(1)
+    print("  ✅ résultats identiques")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Code/scripts/bench_extract_visio.py
+"""
+Benchmark : nombre de requêtes de l'import VSDX (extract_visio.import_shapes).
+
+Les formes sont générées en mémoire (mêmes attributs que vsdx.Shape : ID,
+text, xml) : N/3 activités, N/6 retours, N/2 connecteurs reliant deux
+activités (ou une activité et un retour).
+
+Deux scénarios :
+  1) import initial (tout est créé)
+  2) ré-import identique (rien ne change)
+
+Le script échoue (code 1) si l'import lit la base plus de MAX_SELECTS fois :
+les formes doivent être rapprochées via les cartes d'identité préchargées,
+pas par une requête par forme / par lien.
+
+UTILISATION:
+    python Code/scripts/bench_extract_visio.py [nb_formes]
+
+    Par défaut une base SQLite temporaire est utilisée (les INSERT y sont
+    exécutés ligne par ligne par l'ORM ; PostgreSQL les regroupe). Pour
+    PostgreSQL, définir BENCH_DATABASE_URL vers une base de TEST.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from flask import Flask
+from sqlalchemy import event
+
+from Code.extensions import db
+from Code.models.models import Activities, Data, Link
+from Code.scripts import extract_visio
+
+
+# Préchargement Activities + Data (+ marge pour le dialecte)
+MAX_SELECTS = 4
+
+
+class FakeShape:
+    """Forme minimale lue par extract_visio (ID, text, xml)."""
+
+    def __init__(self, shape_id, text, layer, begin=None, end=None):
+        self.ID = str(shape_id)
+        self.text = text
+        self.xml = ET.Element("Shape")
+        ET.SubElement(self.xml, "Cell", N="LayerMember", V=layer)
+        if begin is not None:
+            ET.SubElement(self.xml, "Cell", N="BeginX", F=f"PAR(PNT(Sheet.{begin}!Connections.X1))")
+        if end is not None:
+            ET.SubElement(self.xml, "Cell", N="EndX", F=f"PAR(PNT(Sheet.{end}!Connections.X1))")
+
+
+def make_shapes(n):
+    n_act = max(n // 3, 2)
+    n_ret = max(n // 6, 1)
+    n_conn = max(n - n_act - n_ret, 1)
+    shapes = [FakeShape(i, f"Activité {i}", "1") for i in range(1, n_act + 1)]
+    shapes += [FakeShape(n_act + i, f"Retour {i}", "8") for i in range(1, n_ret + 1)]
+    targets = n_act + n_ret
+    for i in range(n_conn):
+        begin = 1 + i % n_act
+        end = 1 + (i * 7 + 1) % targets
+        if end == begin:
+            end = 1 + (end % n_act)
+        layer = "10" if i % 2 else "9"
+        shapes.append(FakeShape(targets + 1 + i, f"Donnée {i}", layer, begin, end))
+    return shapes
+
+
+def create_app(db_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def run(shapes, statements):
+    statements.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        extract_visio.import_shapes(shapes)
+        elapsed = time.perf_counter() - t0
+    kinds = Counter(stmt.lstrip().split(None, 1)[0].upper() for stmt in statements)
+    return elapsed, kinds
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    db_url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench_visio.db"
+    app = create_app(db_url)
+    shapes = make_shapes(n)
+
+    with app.app_context():
+        db.create_all()
+        Link.query.delete()
+        Data.query.delete()
+        Activities.query.delete()
+        db.session.commit()
+
+        statements = []
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        print(f"Import VSDX simulé : {len(shapes)} formes ({db.engine.dialect.name})")
+        ok = True
+        for label in ("import initial", "ré-import identique"):
+            elapsed, kinds = run(shapes, statements)
+            total = sum(kinds.values())
+            detail = ", ".join(f"{k} {v}" for k, v in sorted(kinds.items()))
+            print(f"  {label:22s} {elapsed:7.2f} s  {total:6d} requêtes ({detail})")
+            if kinds.get("SELECT", 0) > MAX_SELECTS:
+                print(f"  ❌ {kinds['SELECT']} SELECT (> {MAX_SELECTS}) : requêtes par forme ?")
+                ok = False
+
+        print(f"  Base : {Activities.query.count()} activités, {Data.query.count()} données, {Link.query.count()} liens")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
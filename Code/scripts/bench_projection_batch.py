@@ -0,0 +1,184 @@
+# Code/scripts/bench_projection_batch.py
+"""
+Benchmark : projection métier d'une entité entière, utilisateur par
+utilisateur (un analyze_user chacun) puis par lot (projection_batch).
+
+Faux serveur ROME local (rome_stub_server), cache des réponses ROME
+désactivé pour mesurer le vrai trafic API. L'entité de test compte N
+collaborateurs répartis sur 20 rôles (2 rôles chacun).
+
+Vérifie :
+  - le lot fait une recherche par mot-clé distinct et un téléchargement
+    par fiche distincte de l'entité ;
+  - les résultats enregistrés par le lot sont identiques à ceux d'analyze_user,
+    qui les relit ensuite sans aucun appel réseau ;
+  - le job d'arrière-plan (POST /projection_metier/api/batch) aboutit.
+Le script échoue (code 1) sinon.
+
+UTILISATION:
+    python Code/scripts/bench_projection_batch.py [nb_utilisateurs] [latence_ms]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.scripts.rome_stub_server import COMPETENCY_WORDS, start_stub_server
+
+N_USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+DELAY = (float(sys.argv[2]) if len(sys.argv) > 2 else 5.0) / 1000
+N_ROLES = 20
+server, base_url = start_stub_server(delay=DELAY)
+os.environ.update({
+    "ROME_BASE_URL": base_url,
+    "ROME_TOKEN_URL": base_url + "/token",
+    "ROME_CLIENT_ID": "stub",
+    "ROME_CLIENT_SECRET": "stub",
+    "ROME_RATE_LIMIT": "0",
+    "ROME_SOURCE": "api",
+    "ROME_TOKEN_DB": os.path.join(tempfile.mkdtemp(), "rome_token.db"),
+    "CARTO_JOBS_DB": os.path.join(tempfile.mkdtemp(), "jobs.db"),
+})
+
+import logging
+from flask import Flask
+
+from Code.extensions import db
+from Code.models.models import (
+    Activities, Competency, Entity, Role, Savoir, SavoirFaire, User, UserRole, activity_roles,
+)
+from Code.routes import rome_cache
+from Code.routes.projection_batch import entity_user_ids, project_users
+from Code.routes.projection_metier import projection_metier_bp
+from Code.routes.projection_results import discard_results
+
+logging.getLogger("projection_metier").setLevel(logging.WARNING)
+
+
+def create_app(db_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.secret_key = "bench"
+    db.init_app(app)
+    app.register_blueprint(projection_metier_bp)
+    return app
+
+
+def seed_entity(n_users):
+    """Entité de n_users collaborateurs, 2 rôles chacun parmi N_ROLES (3 activités par rôle)."""
+    owner = User(first_name="Admin", last_name="Bench", email="owner@bench", password="x")
+    db.session.add(owner)
+    db.session.flush()
+    entity = Entity(name="Entité bench", owner_id=owner.id)
+    db.session.add(entity)
+    db.session.flush()
+
+    words = COMPETENCY_WORDS
+    role_ids = []
+    for r in range(N_ROLES):
+        role = Role(name=f"Rôle {r}", entity_id=entity.id)
+        db.session.add(role)
+        db.session.flush()
+        role_ids.append(role.id)
+        for a in range(3):
+            w = [words[(r * 3 + a + k * 7) % len(words)] for k in range(3)]
+            act = Activities(name=f"Activité {w[0]} {w[1]}", entity_id=entity.id)
+            db.session.add(act)
+            db.session.flush()
+            db.session.execute(activity_roles.insert().values(activity_id=act.id, role_id=role.id, status="titulaire"))
+            db.session.add(Competency(description=f"{w[0].capitalize()} de la {w[1]}", activity_id=act.id))
+            db.session.add(Savoir(description=f"{w[1].capitalize()} et {w[2]}", activity_id=act.id))
+            db.session.add(SavoirFaire(description=f"{w[2].capitalize()} de la {w[0]}", activity_id=act.id))
+
+    for i in range(n_users):
+        user = User(first_name="Collaborateur", last_name=str(i), email=f"user{i}@bench",
+                    password="x", entity_id=entity.id)
+        db.session.add(user)
+        db.session.flush()
+        for role_id in {role_ids[i % N_ROLES], role_ids[(i * 7 + 3) % N_ROLES]}:
+            db.session.add(UserRole(user_id=user.id, role_id=role_id))
+    db.session.commit()
+    return owner.id, entity.id
+
+
+def network_calls():
+    return sum(n for path, n in server.calls.items() if path != "/token")
+
+
+def main():
+    app = create_app(f"sqlite:///{tempfile.mkdtemp()}/bench_batch.db")
+    ok = True
+    with app.app_context():
+        db.create_all()
+        owner_id, entity_id = seed_entity(N_USERS)
+        user_ids = entity_user_ids(entity_id)
+        client = app.test_client()
+        rome_cache.ROME_CACHE_TTL = 0
+
+        print(f"Projection de {len(user_ids)} collaborateurs (latence simulée {DELAY * 1000:.0f} ms)")
+
+        server.reset()
+        t0 = time.perf_counter()
+        one_by_one = {}
+        for uid in user_ids:
+            payload = client.get(
+                f"/projection_metier/analyze_user/{uid}?full_limit=1000&partial_limit=1000&refresh=1"
+            ).get_json()
+            one_by_one[uid] = (payload["full"], payload["partial"])
+        elapsed = time.perf_counter() - t0
+        print(f"  utilisateur par utilisateur {elapsed:7.2f} s  {network_calls():6d} appels réseau")
+
+        discard_results()
+        server.reset()
+        t0 = time.perf_counter()
+        stats = project_users(user_ids)
+        elapsed = time.perf_counter() - t0
+        calls = network_calls()
+        print(f"  par lot                     {elapsed:7.2f} s  {calls:6d} appels réseau  "
+              f"({stats['searches']} recherches, {stats['fiches']} fiches)")
+        if calls != stats["searches"] + stats["fiches"] or stats["computed"] != len(user_ids):
+            print(f"  ❌ trafic ou nombre de projections inattendu : {stats}")
+            ok = False
+
+        server.reset()
+        mismatches = 0
+        for uid in user_ids:
+            payload = client.get(
+                f"/projection_metier/analyze_user/{uid}?full_limit=1000&partial_limit=1000"
+            ).get_json()
+            if payload["info"]["cache"] != "hit" or (payload["full"], payload["partial"]) != one_by_one[uid]:
+                mismatches += 1
+        print(f"  relecture analyze_user      {network_calls():6d} appels réseau, {mismatches} écart(s)")
+        if mismatches or network_calls():
+            ok = False
+
+        stats = project_users(user_ids)
+        print(f"  relance du lot              {stats['reused']} résultats réutilisés, {stats['computed']} recalculés")
+        if stats["computed"]:
+            ok = False
+
+        # Job d'arrière-plan depuis l'API
+        with client.session_transaction() as session:
+            session["user_id"] = owner_id
+            session["active_entity_id"] = entity_id
+        response = client.post("/projection_metier/api/batch", json={"refresh": True})
+        job_url = response.get_json()["job_url"]
+        deadline = time.time() + 300
+        job = client.get(job_url).get_json()
+        while job["status"] in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.2)
+            job = client.get(job_url).get_json()
+        print(f"  job d'arrière-plan          {job['status']}  {job['progress']}  "
+              f"{(job['result'] or {}).get('computed')} recalculés en {job['duration_seconds']} s")
+        if job["status"] != "done" or job["result"]["computed"] != len(user_ids):
+            ok = False
+
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Code/scripts/bench_projection_stream.py
+"""
+Benchmark : délai avant le premier métier affiché, analyse classique
+(/projection_metier/analyze_user/<id>) contre analyse progressive
+(/projection_metier/analyze_user/<id>/stream, Server-Sent Events).
+
+Faux serveur ROME local (rome_stub_server) avec latence simulée, cache des
+réponses ROME désactivé. Le script échoue (code 1) si le flux ne termine
+pas par un événement "summary", si ses métiers diffèrent du résultat
+d'analyze_user ou si le premier métier n'arrive pas avant la fin de l'analyse.
+
+UTILISATION:
+    python Code/scripts/bench_projection_stream.py [latence_ms]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.scripts.rome_stub_server import start_stub_server
+
+DELAY = (float(sys.argv[1]) if len(sys.argv) > 1 else 100.0) / 1000
+server, base_url = start_stub_server(delay=DELAY)
+os.environ.update({
+    "ROME_BASE_URL": base_url,
+    "ROME_TOKEN_URL": base_url + "/token",
+    "ROME_CLIENT_ID": "stub",
+    "ROME_CLIENT_SECRET": "stub",
+    "ROME_RATE_LIMIT": "0",
+    "ROME_SOURCE": "api",
+    "ROME_TOKEN_DB": os.path.join(tempfile.mkdtemp(), "rome_token.db"),
+})
+
+import logging
+from flask import Flask
+
+from Code.extensions import db
+from Code.routes import rome_cache
+from Code.routes.projection_metier import projection_metier_bp
+from Code.scripts.rome_stub_server import seed_projection_user
+
+logging.getLogger("projection_metier").setLevel(logging.WARNING)
+
+
+def create_app(db_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    app.register_blueprint(projection_metier_bp)
+    return app
+
+
+def read_events(response):
+    """(événement, données) au fil du flux SSE."""
+    buffer = ""
+    for chunk in response.response:
+        buffer += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        while "\n\n" in buffer:
+            message, buffer = buffer.split("\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in message.splitlines())
+            yield fields["event"], json.loads(fields["data"])
+
+
+def main():
+    app = create_app(f"sqlite:///{tempfile.mkdtemp()}/bench_stream.db")
+    ok = True
+    with app.app_context():
+        db.create_all()
+        uid = seed_projection_user()
+        client = app.test_client()
+        rome_cache.ROME_CACHE_TTL = 0
+
+        print(f"Premier métier affiché (latence simulée {DELAY * 1000:.0f} ms par appel ROME)")
+        t0 = time.perf_counter()
+        payload = client.get(
+            f"/projection_metier/analyze_user/{uid}?full_limit=1000&partial_limit=1000&refresh=1"
+        ).get_json()
+        classic = time.perf_counter() - t0
+        print(f"  analyze_user            {classic:6.2f} s  (réponse complète)")
+
+        t0 = time.perf_counter()
+        response = client.get(f"/projection_metier/analyze_user/{uid}/stream?refresh=1", buffered=False)
+        first_job, jobs, summary = None, {"full": [], "partial": []}, None
+        for event, data in read_events(response):
+            if event == "job":
+                if first_job is None:
+                    first_job = time.perf_counter() - t0
+                jobs[data["kind"]].append(data["job"])
+            elif event == "summary":
+                summary = data
+        total = time.perf_counter() - t0
+        print(f"  stream : premier métier {first_job or 0:6.2f} s, fin {total:6.2f} s, "
+              f"{len(jobs['full']) + len(jobs['partial'])} métiers")
+
+        if summary is None or summary["total"] != {k: len(v) for k, v in jobs.items()}:
+            print("  ❌ résumé absent ou incohérent")
+            ok = False
+        key = lambda job: job["code"]
+        if any(sorted(jobs[k], key=key) != sorted(payload[k], key=key) for k in ("full", "partial")):
+            print("  ❌ métiers différents d'analyze_user")
+            ok = False
+        if first_job is None or first_job >= total * 0.8:
+            print("  ❌ aucun métier avant la fin de l'analyse")
+            ok = False
+
+        page = client.get(f"/projection_metier/analyze_user/{uid}?full_limit=1000&partial_limit=1000").get_json()
+        print(f"  pagination après le flux : résultat {page['info']['cache']}")
+        if page["info"]["cache"] != "hit" or (page["full"], page["partial"]) != (payload["full"], payload["partial"]):
+            print("  ❌ classement enregistré différent")
+            ok = False
+
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
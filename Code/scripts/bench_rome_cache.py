@@ -0,0 +1,180 @@
+# Code/scripts/bench_rome_cache.py
+"""
+Benchmark : appels ROME de la projection métier (parallélisme, quota, cache).
+
+Un faux serveur ROME local (rome_stub_server) répond avec une latence
+simulée ; un utilisateur de test (rôles, activités, compétences) est
+analysé via /projection_metier/analyze_user/<id> :
+  - sans cache, appels séquentiels (1 worker) puis en parallèle
+    (ROME_MAX_WORKERS), puis limités à 10 appels/s ;
+  - avec cache : vide (un appel par recherche / fiche distincte), chaud
+    (aucun appel réseau), périmé (servi depuis la base, rafraîchi en tâche de fond) ;
+  - avec le résultat enregistré (projection_results) : page suivante relue
+    sans recalcul, puis recalcul après modification du profil.
+
+Le script échoue (code 1) si l'analyse à cache chaud appelle le réseau, si
+le quota est dépassé, si le résultat diffère entre les passes, si la page
+suivante est recalculée ou si un profil modifié ne l'est pas.
+
+UTILISATION:
+    python Code/scripts/bench_rome_cache.py [latence_ms]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.scripts.rome_stub_server import start_stub_server
+
+DELAY = (float(sys.argv[1]) if len(sys.argv) > 1 else 20.0) / 1000
+server, base_url = start_stub_server(delay=DELAY)
+os.environ.update({
+    "ROME_BASE_URL": base_url,
+    "ROME_TOKEN_URL": base_url + "/token",
+    "ROME_CLIENT_ID": "stub",
+    "ROME_CLIENT_SECRET": "stub",
+    "ROME_RATE_LIMIT": "0",
+    "ROME_SOURCE": "api",
+    "ROME_TOKEN_DB": os.path.join(tempfile.mkdtemp(), "rome_token.db"),
+})
+
+import logging
+from flask import Flask
+from sqlalchemy import func, select, update
+
+from Code.extensions import db
+from Code.models.models import Competency, RomeCacheEntry
+from Code.routes import rome_cache
+from Code.routes import projection_metier as pm
+from Code.routes.projection_results import discard_results
+from Code.routes.projection_metier import projection_metier_bp
+from Code.scripts.rome_stub_server import seed_projection_user
+
+logging.getLogger("projection_metier").setLevel(logging.WARNING)
+
+
+def create_app(db_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    app.register_blueprint(projection_metier_bp)
+    return app
+
+
+def analyze(client, uid, query="full_limit=0&partial_limit=1000&refresh=1"):
+    server.reset()
+    t0 = time.perf_counter()
+    response = client.get(f"/projection_metier/analyze_user/{uid}?{query}")
+    elapsed = time.perf_counter() - t0
+    return elapsed, dict(server.calls), response.get_json()
+
+
+class CountingFetch:
+    """Compte les lots de requêtes ROME (recherches / fiches) de l'analyse."""
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.fetch(*args, **kwargs)
+
+
+def main():
+    app = create_app(f"sqlite:///{tempfile.mkdtemp()}/bench_rome.db")
+    ok = True
+    with app.app_context():
+        db.create_all()
+        uid = seed_projection_user()
+        client = app.test_client()
+
+        print(f"Analyse projection métier (latence simulée {DELAY * 1000:.0f} ms)")
+        results = []
+
+        ttl, workers = rome_cache.ROME_CACHE_TTL, pm.ROME_MAX_WORKERS
+        rome_cache.ROME_CACHE_TTL = 0
+        for label, n_workers, rate in (("séquentiel", 1, 0), (f"{workers} workers", workers, 0),
+                                       ("quota 10/s", workers, 10)):
+            pm.ROME_MAX_WORKERS = n_workers
+            pm._rate_limiter = pm._RateLimiter(rate, 1)
+            elapsed, calls, payload = analyze(client, uid)
+            results.append(payload)
+            network = sum(n for path, n in calls.items() if path != "/token")
+            print(f"  {label:14s} {elapsed:7.2f} s  {network:5d} appels réseau  "
+                  f"{network / elapsed:6.1f} appels/s")
+            if rate and network / elapsed > rate * 1.1:
+                print("  ❌ quota dépassé")
+                ok = False
+        rome_cache.ROME_CACHE_TTL, pm.ROME_MAX_WORKERS = ttl, workers
+        pm._rate_limiter = pm._RateLimiter(0, 1)
+
+        for label in ("cache vide", "cache chaud", "cache périmé"):
+            if label == "cache périmé":
+                db.session.execute(update(RomeCacheEntry).values(
+                    fetched_at=datetime.utcnow() - timedelta(seconds=rome_cache.ROME_CACHE_TTL + 1)
+                ))
+                db.session.commit()
+            elapsed, calls, payload = analyze(client, uid)
+            results.append(payload)
+            network = sum(n for path, n in calls.items() if path != "/token")
+            print(f"  {label:14s} {elapsed:7.2f} s  {network:5d} appels réseau  "
+                  f"{payload['page']['partial']['total']} métiers envisageables"
+                  + ("  (rafraîchissements en tâche de fond)" if label == "cache périmé" else ""))
+            if label == "cache chaud" and network:
+                print("  ❌ appels réseau avec un cache chaud")
+                ok = False
+
+        # Rafraîchissements en tâche de fond de la passe « périmé »
+        deadline = time.time() + 30
+        while rome_cache._refreshing and time.time() < deadline:
+            time.sleep(0.1)
+        stale = db.session.scalar(select(func.count()).where(
+            RomeCacheEntry.fetched_at < datetime.utcnow() - timedelta(seconds=rome_cache.ROME_CACHE_TTL)
+        ))
+        print(f"  encore périmées après rafraîchissement : {stale}")
+        if stale:
+            ok = False
+        print(f"  cache : {rome_cache.cache_stats()}")
+
+        # Résultat enregistré : pagination et profil modifié
+        pm.cached_fetch_many = counting_fetch_many = CountingFetch(pm.cached_fetch_many)
+        discard_results(uid)
+        passes = (
+            ("page 1", "partial_limit=30", "miss"),
+            ("page 2", "partial_limit=30&partial_offset=30", "hit"),
+            ("profil modifié", "partial_limit=30", "miss"),
+        )
+        for label, query, expected in passes:
+            if label == "profil modifié":
+                activity_id = db.session.scalar(select(Competency.activity_id).limit(1))
+                db.session.add(Competency(description="Pilotage de la production", activity_id=activity_id))
+                db.session.commit()
+            counting_fetch_many.calls = 0
+            elapsed, calls, payload = analyze(client, uid, query)
+            info = payload["info"]
+            print(f"  {label:14s} {elapsed:7.2f} s  résultat {info['cache']:5s} "
+                  f"({counting_fetch_many.calls} lots ROME, âge {info['age_seconds']} s)")
+            if info["cache"] != expected or (expected == "hit") != (counting_fetch_many.calls == 0):
+                print(f"  ❌ attendu : {expected}")
+                ok = False
+        page1 = analyze(client, uid, "partial_limit=30&refresh=1")[2]["partial"]
+        page2 = analyze(client, uid, "partial_limit=30&partial_offset=30")[2]["partial"]
+        if {job["code"] for job in page1} & {job["code"] for job in page2}:
+            print("  ❌ pages qui se recouvrent")
+            ok = False
+
+        if any(r["partial"] != results[0]["partial"] for r in results[1:]):
+            print("  ❌ résultats différents entre les passes")
+            ok = False
+
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Code/scripts/bench_rome_referential.py
+"""
+Benchmark : référentiel ROME local et recherche par index inversé.
+
+1) téléchargement du référentiel complet depuis un faux serveur ROME
+   (rome_stub_server), puis second téléchargement (aucune fiche réécrite) ;
+2) import d'un dump JSON dont 2 fiches ont changé (2 mises à jour) ;
+3) analyse /projection_metier/analyze_user/<id> sur le référentiel local,
+   serveur arrêté (hors ligne) ;
+4) latence de la recherche locale.
+
+Le script échoue (code 1) si un rafraîchissement réécrit des fiches
+inchangées ou si l'analyse hors ligne appelle le réseau / échoue.
+
+UTILISATION:
+    python Code/scripts/bench_rome_referential.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.scripts.rome_stub_server import start_stub_server
+
+server, base_url = start_stub_server()
+os.environ.update({
+    "ROME_BASE_URL": base_url,
+    "ROME_TOKEN_URL": base_url + "/token",
+    "ROME_CLIENT_ID": "stub",
+    "ROME_CLIENT_SECRET": "stub",
+    "ROME_RATE_LIMIT": "0",
+    "ROME_SOURCE": "auto",
+    "ROME_TOKEN_DB": os.path.join(tempfile.mkdtemp(), "rome_token.db"),
+})
+
+import logging
+from flask import Flask
+
+from Code.extensions import db
+from Code.routes.projection_metier import projection_metier_bp
+from Code.routes.rome_referential import download_referential, load_dump, referential_stats, search_local_many
+from Code.scripts.rome_stub_server import COMPETENCY_WORDS, referential_dump, seed_projection_user
+
+logging.getLogger("projection_metier").setLevel(logging.WARNING)
+
+
+def create_app(db_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    app.register_blueprint(projection_metier_bp)
+    return app
+
+
+def timed(label, fn):
+    server.reset()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    network = sum(n for path, n in server.calls.items() if path != "/token")
+    shown = f"HTTP {result.status_code}" if hasattr(result, "status_code") else result
+    print(f"  {label:28s} {elapsed * 1000:9.1f} ms  {network:4d} appels  {shown}")
+    return result
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    app = create_app(f"sqlite:///{tmp}/bench_referential.db")
+    ok = True
+    with app.app_context():
+        db.create_all()
+        uid = seed_projection_user()
+        client = app.test_client()
+
+        print("Référentiel ROME local")
+        timed("téléchargement initial", download_referential)
+        stats = timed("second téléchargement", download_referential)
+        if stats["added"] or stats["updated"]:
+            print("  ❌ fiches inchangées réécrites")
+            ok = False
+
+        dump = referential_dump()
+        for fiche in dump[:2]:
+            fiche["groupesCompetencesMobilisees"][0]["competences"].append({"libelle": "Veille réglementaire"})
+            fiche["dateModification"] = "2026-06-01"
+        path = os.path.join(tmp, "fiches.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"fiches": dump}, f, ensure_ascii=False)
+        stats = timed("dump (2 fiches modifiées)", lambda: load_dump(path, prune=True))
+        if stats["updated"] != 2 or stats["added"] or stats["removed"]:
+            print("  ❌ rafraîchissement incorrect")
+            ok = False
+        print(f"  {referential_stats()}")
+
+        server.shutdown()
+        server.server_close()
+        response = timed("analyse hors ligne", lambda: client.get(
+            f"/projection_metier/analyze_user/{uid}?full_limit=0&partial_limit=1000"
+        ))
+        payload = response.get_json() or {}
+        partial = payload.get("page", {}).get("partial", {}).get("total", 0)
+        print(f"  → {partial} métiers envisageables")
+        if response.status_code != 200 or not partial:
+            ok = False
+
+        response = timed("analyse hors ligne (vector)", lambda: client.get(
+            f"/projection_metier/analyze_user/{uid}?full_limit=0&partial_limit=1000&mode=vector"
+        ))
+        payload = response.get_json() or {}
+        print(f"  → mode {payload.get('info', {}).get('mode')}, "
+              f"{payload.get('page', {}).get('partial', {}).get('total', 0)} métiers envisageables")
+        if response.status_code != 200:
+            ok = False
+
+        t0 = time.perf_counter()
+        for _ in range(20):
+            search_local_many(COMPETENCY_WORDS)
+        print(f"  recherche locale : {(time.perf_counter() - t0) / 20 * 1000:.1f} ms "
+              f"pour {len(COMPETENCY_WORDS)} termes")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Code/scripts/bench_rome_token.py
+"""
+Benchmark : token OAuth2 ROME partagé entre workers (rome_token_store).
+
+Faux serveur ROME local (rome_stub_server), latence simulée sur /token :
+  1. 3 process (workers gunicorn simulés) × 8 threads demandent un token
+     en même temps → une seule demande à ROME_TOKEN_URL ;
+  2. authentification BASIC refusée : le premier renouvellement essaie les
+     2 modes, le suivant directement celui qui a fonctionné ;
+  3. token à moins de ROME_TOKEN_REFRESH_AHEAD de son expiration : rendu
+     sans attendre, renouvelé en tâche de fond.
+
+Le script échoue (code 1) si un de ces comptes d'appels diffère.
+
+UTILISATION:
+    python Code/scripts/bench_rome_token.py [latence_ms]
+"""
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.scripts.rome_stub_server import start_stub_server
+
+DELAY = (float(sys.argv[1]) if len(sys.argv) > 1 else 200.0) / 1000
+WORKERS, THREADS = 3, 8
+server, base_url = start_stub_server(delay=DELAY)
+os.environ.update({
+    "ROME_BASE_URL": base_url,
+    "ROME_TOKEN_URL": base_url + "/token",
+    "ROME_CLIENT_ID": "stub",
+    "ROME_CLIENT_SECRET": "stub",
+    "ROME_TOKEN_DB": os.path.join(tempfile.mkdtemp(), "rome_token.db"),
+})
+
+import logging
+
+from Code.routes import projection_metier as pm
+from Code.routes import rome_token_store
+
+logging.getLogger("projection_metier").setLevel(logging.WARNING)
+
+
+def reset(token_db=None):
+    """Oublie le token du process (et change de fichier partagé si demandé)."""
+    pm._token_cache.update(access_token=None, issued_at=0, expires_at=0, auth_mode=None)
+    if token_db:
+        rome_token_store.TOKEN_DB_PATH = token_db
+    server.reset()
+
+
+def worker(results):
+    """Un worker gunicorn simulé : THREADS demandes de token simultanées."""
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(pm.get_access_token())) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put(tokens)
+
+
+def check(label, condition):
+    print(f"  {'✅' if condition else '❌'} {label}")
+    return condition
+
+
+def main():
+    ok = True
+    print(f"Token ROME partagé (latence simulée {DELAY * 1000:.0f} ms)")
+
+    # 1. Plusieurs workers, plusieurs threads : une seule demande
+    reset()
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(results,)) for _ in range(WORKERS)]
+    t0 = time.perf_counter()
+    for p in processes:
+        p.start()
+    tokens = [token for _ in processes for token in results.get(timeout=60)]
+    for p in processes:
+        p.join()
+    print(f"  {WORKERS} workers × {THREADS} threads : {server.calls['/token']} demande(s) de token "
+          f"en {time.perf_counter() - t0:.2f} s")
+    ok &= check("une seule demande, token reçu partout",
+                server.calls["/token"] == 1 and tokens == ["stub-token"] * WORKERS * THREADS)
+
+    # 2. Mode d'authentification mémorisé
+    server.basic_auth = False
+    reset(os.path.join(tempfile.mkdtemp(), "rome_token.db"))
+    pm.get_access_token()
+    first = server.calls["/token"]
+    conn = sqlite3.connect(rome_token_store.TOKEN_DB_PATH)
+    conn.execute("UPDATE rome_token SET expires_at = 0")
+    conn.commit()
+    conn.close()
+    reset()
+    pm.get_access_token()
+    print(f"  BASIC refusé : {first} demande(s) au premier renouvellement, "
+          f"{server.calls['/token']} au suivant ({rome_token_store.read_token()['auth_mode']})")
+    ok &= check("mode qui fonctionne essayé en premier", first == 2 and server.calls["/token"] == 1)
+
+    # 3. Renouvellement anticipé en tâche de fond : token vieilli à 200 s de son expiration
+    reset(os.path.join(tempfile.mkdtemp(), "rome_token.db"))
+    pm.get_access_token()
+    age = pm._token_cache["expires_at"] - pm._token_cache["issued_at"] - 200
+    conn = sqlite3.connect(rome_token_store.TOKEN_DB_PATH)
+    conn.execute("UPDATE rome_token SET issued_at = issued_at - ?, expires_at = expires_at - ?", (age, age))
+    conn.commit()
+    conn.close()
+    pm._token_cache["issued_at"] -= age
+    pm._token_cache["expires_at"] -= age
+    expires_at = pm._token_cache["expires_at"]
+    server.reset()
+    t0 = time.perf_counter()
+    token = pm.get_access_token()
+    waited = time.perf_counter() - t0
+    time.sleep(DELAY * 2 + 0.5)
+    print(f"  token à 200 s de l'expiration rendu en {waited * 1000:.1f} ms, "
+          f"{server.calls['/token']} demande(s) en tâche de fond, "
+          f"expiration repoussée de {pm._token_cache['expires_at'] - expires_at:.0f} s")
+    ok &= check("renouvelé sans bloquer l'appelant",
+                token == "stub-token" and waited < DELAY and server.calls["/token"] == 1
+                and pm._token_cache["expires_at"] > expires_at)
+
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
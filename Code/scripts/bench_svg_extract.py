@@ -0,0 +1,121 @@
+# Code/scripts/bench_svg_extract.py
+"""
+Benchmark : extraction des activités d'un gros SVG Visio.
+
+Compare l'ancienne extraction (ET.parse + root.iter() + elem.iter(text)
+imbriqué) avec l'extraction en flux de extract_activities_from_svg,
+sur un SVG généré d'environ 50 Mo (groupes Visio imbriqués, calques
+mélangés, doublons de noms).
+
+UTILISATION:
+    python Code/scripts/bench_svg_extract.py [taille_mo]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.routes.activities_map import extract_activities_from_svg, SVG_NS, VISIO_NS
+
+
+def legacy_extract(svg_path):
+    """Ancienne implémentation (parse complet du DOM), conservée pour comparaison."""
+    activities = []
+    seen_names = set()
+    tree = ET.parse(svg_path)
+    root = tree.getroot()
+    for elem in root.iter():
+        mid = elem.get(f"{{{VISIO_NS}}}mID")
+        if not mid:
+            continue
+        layer = elem.get(f"{{{VISIO_NS}}}layerMember", "")
+        if layer != "1":
+            continue
+        text_content = None
+        for text_elem in elem.iter(f"{{{SVG_NS}}}text"):
+            t = "".join(text_elem.itertext()).strip()
+            if t and len(t) > 2:
+                text_content = t
+                break
+        if not text_content:
+            continue
+        if len(text_content) > 80:
+            continue
+        if text_content.lower() not in seen_names:
+            seen_names.add(text_content.lower())
+            activities.append({"shape_id": mid, "name": text_content})
+    return activities
+
+
+def generate_svg(path, target_mb=50):
+    """Génère un SVG façon export Visio d'environ target_mb Mo."""
+    target = target_mb * 1024 * 1024
+    layers = ["1", "1", "2", "6", "8", "9", "10", "1 2"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+        f.write(f'<svg xmlns="{SVG_NS}" xmlns:v="{VISIO_NS}" viewBox="0 0 4000 3000">\n')
+        f.write('<g v:mID="0" v:index="1" v:groupContext="foregroundPage">\n')
+        i = 0
+        while f.tell() < target:
+            i += 1
+            layer = layers[i % len(layers)]
+            # Un nom sur 7 est un doublon, un sur 11 est une description trop longue
+            name = f"Activité {i // 7 if i % 7 == 0 else i}"
+            if i % 11 == 0:
+                name = "Description " * 10
+            f.write(f'<g id="group{i}" v:mID="{i}" v:groupContext="group" v:layerMember="{layer}">')
+            f.write('<v:custProps><v:cp v:nameU="Cost" v:lbl="Coût" v:type="7"/></v:custProps>')
+            f.write(f'<title>Forme {i}</title><rect x="{i % 4000}" y="{i % 3000}" width="120" height="60" class="st1"/>')
+            # Sous-forme imbriquée sur le layer 1 (groupes Visio)
+            f.write(f'<g id="shape{i}.1" v:mID="{i}001" v:groupContext="shape" v:layerMember="1">')
+            f.write(f'<path d="M0 0 L120 0 L120 60 L0 60 Z" class="st2"/>')
+            f.write(f'<text x="4" y="20" class="st3">{"ab" if i % 5 == 0 else ""}'
+                    f'<tspan x="4" dy="1.2em">Sous {i}</tspan></text>')
+            f.write('</g>')
+            f.write(f'<text x="10" y="30" class="st3" v:langID="1036">{name}<v:newlineChar/></text>')
+            f.write('</g>\n')
+        f.write('</g>\n</svg>\n')
+    return i
+
+
+def measure(fn, svg_path):
+    """Mesure le temps (sans tracemalloc, qui fausse les durées) puis le pic mémoire."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        result = fn(svg_path)
+        elapsed = time.perf_counter() - t0
+
+        tracemalloc.start()
+        fn(svg_path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    target_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        svg_path = os.path.join(tmp, "carto_bench.svg")
+        print(f"Génération d'un SVG de ~{target_mb} Mo...")
+        shapes = generate_svg(svg_path, target_mb)
+        size_mb = os.path.getsize(svg_path) / (1024 * 1024)
+        print(f"  → {size_mb:.1f} Mo, {shapes} groupes")
+
+        legacy, t_legacy, m_legacy = measure(legacy_extract, svg_path)
+        streaming, t_stream, m_stream = measure(extract_activities_from_svg, svg_path)
+
+        print(f"Ancienne extraction : {t_legacy:6.2f} s  pic mémoire {m_legacy / 1e6:8.1f} Mo  ({len(legacy)} activités)")
+        print(f"Extraction en flux  : {t_stream:6.2f} s  pic mémoire {m_stream / 1e6:8.1f} Mo  ({len(streaming)} activités)")
+        print("Résultats identiques :", "OUI" if legacy == streaming else "NON")
+        if legacy != streaming:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Code/scripts/bench_sync_activities.py
+"""
+Benchmark : synchronisation SVG → base pour 5 000 formes.
+
+Compare l'ancienne synchronisation (un commit par ajout / renommage)
+avec reconcile_activities (INSERT et UPDATE groupés, une transaction).
+
+Deux scénarios :
+  1) import initial de N formes (N ajouts)
+  2) re-synchronisation avec 10 % de formes renommées
+
+UTILISATION:
+    python Code/scripts/bench_sync_activities.py [nb_formes]
+
+    Par défaut une base SQLite temporaire est utilisée. Pour PostgreSQL,
+    définir BENCH_DATABASE_URL vers une base de TEST (les tables sont
+    créées puis vidées par le script).
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from flask import Flask
+
+from Code.extensions import db
+from Code.models.models import Activities, Entity
+from Code.routes.activities_map import reconcile_activities
+
+
+def create_app(db_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def legacy_sync(entity_id, svg_activities):
+    """Ancienne logique : un commit par activité ajoutée ou renommée."""
+    svg_shape_map = {str(act["shape_id"]): act["name"] for act in svg_activities}
+    existing = Activities.query.filter_by(entity_id=entity_id).all()
+    existing_map = {str(a.shape_id): a for a in existing if a.shape_id}
+
+    for shape_id in set(svg_shape_map) - set(existing_map):
+        db.session.add(Activities(
+            entity_id=entity_id, shape_id=shape_id, name=svg_shape_map[shape_id],
+            description="", is_result=False, duration_minutes=0, delay_minutes=0
+        ))
+        db.session.commit()
+
+    for shape_id in set(svg_shape_map) & set(existing_map):
+        act = existing_map[shape_id]
+        if act.name != svg_shape_map[shape_id]:
+            act.name = svg_shape_map[shape_id]
+            db.session.commit()
+
+
+def reset_entity(name):
+    entity = Entity.query.filter_by(name=name).first()
+    if entity:
+        Activities.query.filter_by(entity_id=entity.id).delete()
+        db.session.delete(entity)
+        db.session.commit()
+    entity = Entity(name=name, is_active=False)
+    db.session.add(entity)
+    db.session.commit()
+    return entity.id
+
+
+def timed(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - t0
+
+
+def run(nb_shapes):
+    initial = [{"shape_id": str(i), "name": f"Activité {i}"} for i in range(1, nb_shapes + 1)]
+    renamed = [
+        {"shape_id": a["shape_id"], "name": a["name"] + (" (v2)" if i % 10 == 0 else "")}
+        for i, a in enumerate(initial)
+    ]
+
+    results = {}
+    for label, fn in (("ancienne", legacy_sync), ("groupée", reconcile_activities)):
+        entity_id = reset_entity(f"bench-sync-{label}")
+        t_import = timed(fn, entity_id, initial)
+        t_resync = timed(fn, entity_id, renamed)
+        count = Activities.query.filter_by(entity_id=entity_id).count()
+        results[label] = (t_import, t_resync, count)
+        reset_entity(f"bench-sync-{label}")
+    return results
+
+
+def main():
+    nb_shapes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    db_url = os.getenv("BENCH_DATABASE_URL")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not db_url:
+            db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = create_app(db_url)
+        with app.app_context():
+            db.create_all()
+            print(f"Base : {db.engine.dialect.name} — {nb_shapes} formes")
+            results = run(nb_shapes)
+            for label, (t_import, t_resync, count) in results.items():
+                print(f"  {label:9s}: import {t_import:7.2f} s | resync 10 % renommées {t_resync:7.2f} s | {count} lignes")
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# Code/scripts/bench_user_profiles.py
+"""
+Benchmark : profils de compétences précalculés (Code/models/user_profiles.py).
+
+Un utilisateur de test (5 rôles, 40 activités par rôle, 2 éléments de chaque
+type par activité) est extrait :
+  1) par l'ancienne extraction (chargement paresseux activité par activité) ;
+  2) par le profil, à froid (construction) puis à chaud (lecture de la table).
+
+Puis l'invalidation est vérifiée : modifications ORM concernant l'utilisateur
+(profil supprimé), sans rapport avec lui (profil conservé), et écritures hors
+ORM sur les tables sources (tous les profils supprimés, sauf un INSERT
+d'activités qui ne touche aucun profil).
+
+Le script échoue (code 1) si les libellés diffèrent de l'ancienne extraction
+ou si une invalidation attendue n'a pas lieu.
+
+UTILISATION:
+    python Code/scripts/bench_user_profiles.py
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from flask import Flask
+from sqlalchemy import event, insert, text
+
+from Code.extensions import db
+from Code.models.models import (
+    Activities, Aptitude, Competency, Role, Savoir, SavoirFaire, Softskill, User, UserCompetencyProfile,
+    UserRole, activity_roles,
+)
+from Code.models.user_profiles import user_competency_profile
+from Code.routes import projection_metier  # noqa: F401  (normalisation des libellés)
+
+logging.getLogger("projection_metier").setLevel(logging.WARNING)
+
+N_ROLES = 5
+ACTIVITIES_PER_ROLE = 40
+ITEMS_PER_TYPE = 2
+
+
+def create_app(db_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed():
+    users = [User(first_name="Test", last_name=f"Profil {i}", email=f"profil{i}@bench", password="x")
+             for i in range(2)]
+    db.session.add_all(users)
+    db.session.flush()
+    for r in range(N_ROLES + 1):
+        role = Role(name=f"Rôle {r}")
+        db.session.add(role)
+        db.session.flush()
+        # Dernier rôle : celui de l'autre utilisateur
+        db.session.add(UserRole(user_id=users[0 if r < N_ROLES else 1].id, role_id=role.id))
+        for a in range(ACTIVITIES_PER_ROLE):
+            act = Activities(name=f"Activité {r}-{a}")
+            db.session.add(act)
+            db.session.flush()
+            db.session.execute(activity_roles.insert().values(activity_id=act.id, role_id=role.id, status="titulaire"))
+            for i in range(ITEMS_PER_TYPE):
+                db.session.add_all([
+                    Competency(description=f"Compétence {r}-{a}-{i}", activity_id=act.id),
+                    Savoir(description=f"Savoir {r}-{a}-{i}", activity_id=act.id),
+                    SavoirFaire(description=f"Savoir-faire {r}-{a}-{i}", activity_id=act.id),
+                    Softskill(habilete=f"Habileté {r}-{a}-{i}", niveau="2", activity_id=act.id),
+                    Aptitude(description=f"Aptitude {r}-{a}-{i}", activity_id=act.id),
+                ])
+    db.session.commit()
+    return users[0].id, users[1].id
+
+
+def legacy_extraction(user_id):
+    """Ancienne _extract_user_competencies (référence)."""
+    labels = []
+    roles = Role.query.join(UserRole, UserRole.role_id == Role.id).filter(UserRole.user_id == user_id).all()
+    labels += [role.name for role in roles if role.name]
+    activities = (
+        Activities.query
+        .join(activity_roles, Activities.id == activity_roles.c.activity_id)
+        .filter(activity_roles.c.role_id.in_([role.id for role in roles]))
+        .all()
+    )
+    for activity in activities:
+        labels.append(activity.name)
+        labels += [c.description for c in activity.competencies]
+        labels += [s.description for s in activity.savoirs]
+        labels += [s.description for s in activity.savoir_faires]
+        labels += [s.habilete for s in activity.softskills]
+        labels += [a.description for a in activity.aptitudes]
+    return [label.strip() for label in labels if label and label.strip()]
+
+
+def measure(label, statements, fn):
+    db.session.expire_all()
+    statements.clear()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:26s} {elapsed * 1000:8.1f} ms  {len(statements):5d} requêtes")
+    return result
+
+
+def has_profile(user_id):
+    return db.session.get(UserCompetencyProfile, user_id) is not None
+
+
+def main():
+    app = create_app(f"sqlite:///{tempfile.mkdtemp()}/bench_profiles.db")
+    ok = True
+    with app.app_context():
+        db.create_all()
+        uid, other_uid = seed()
+        statements = []
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        print(f"Profil de compétences : {N_ROLES} rôles × {ACTIVITIES_PER_ROLE} activités")
+        legacy = measure("ancienne extraction", statements, lambda: legacy_extraction(uid))
+        cold = measure("profil (construction)", statements, lambda: user_competency_profile(uid))
+        warm = measure("profil (lecture)", statements, lambda: user_competency_profile(uid))
+        labels = [label for label, _, _ in warm]
+        print(f"  {len(labels)} libellés")
+        if sorted(set(legacy)) != sorted(labels) or cold != warm:
+            print("  ❌ libellés différents de l'ancienne extraction")
+            ok = False
+
+        user_competency_profile(other_uid)
+        activity = Activities.query.filter_by(name="Activité 0-0").one()
+
+        def check(label, change, expect_user, expect_other):
+            nonlocal ok
+            for user_id in (uid, other_uid):
+                user_competency_profile(user_id)
+            change()
+            db.session.commit()
+            state = (has_profile(uid), has_profile(other_uid))
+            expected = (not expect_user, not expect_other)
+            print(f"  {'✅' if state == expected else '❌'} {label:44s} profil supprimé : "
+                  f"{'oui' if not state[0] else 'non'} (autre utilisateur : {'oui' if not state[1] else 'non'})")
+            ok = ok and state == expected
+
+        print("Invalidation")
+        check("savoir ajouté à une de ses activités",
+              lambda: db.session.add(Savoir(description="Nouveau savoir", activity_id=activity.id)), True, False)
+        check("activité renommée",
+              lambda: setattr(activity, "name", "Activité renommée"), True, False)
+        check("durée d'activité modifiée",
+              lambda: setattr(activity, "duration_minutes", 42), False, False)
+        check("compétence supprimée",
+              lambda: db.session.delete(Competency.query.filter_by(activity_id=activity.id).first()), True, False)
+        check("rôle de l'autre utilisateur renommé",
+              lambda: setattr(Role.query.filter_by(name=f"Rôle {N_ROLES}").one(), "name", "Autre"), False, True)
+        check("rôle retiré (ORM)",
+              lambda: db.session.delete(UserRole.query.filter_by(user_id=uid).first()), True, False)
+        check("INSERT Core d'activités (import)",
+              lambda: db.session.execute(insert(Activities), [{"name": "Nouvelle activité"}]), False, False)
+        check("SQL texte sur activity_roles",
+              lambda: db.session.execute(text("DELETE FROM activity_roles WHERE activity_id=:aid"),
+                                         {"aid": activity.id}), True, True)
+        check("Query.delete() sur user_roles",
+              lambda: UserRole.query.filter_by(user_id=other_uid).delete(), True, True)
+
+        labels = [label for label, _, _ in user_competency_profile(uid)]
+        if "Nouveau savoir" in labels or "Activité renommée" in labels:
+            print("  ❌ profil reconstruit avec une activité retirée")
+            ok = False
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 import os
 import sys
+from sqlalchemy import inspect
 from vsdx import VisioFile
 
 # Pour pouvoir importer Code.extensions et Code.models.models
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from Code.extensions import db
-from Code.models.models import Activities, Data, Link
+from Code.models.entity_stats import rebuild_entity_stats
+from Code.models.link_sync import delete_endpoint_links, delete_orphan_links, link_key, sync_entity_links
+from Code.models.models import Activities, Data
+from Code.scripts.vsdx_pages import parse_vsdx
 
 # Calques Visio gérés
 LAYER_MAPPING = {
@@ -22,15 +26,34 @@ IGNORE_LAYERS = ["légende", "Color"]
 
 # ------------------- Variables globales -------------------
 # Elles sont utilisées par process_visio_file et print_summary
-activity_mapping = {}
-data_mapping = {}
-return_mapping = {}  # retours
+activity_mapping = {}   # shape_id -> Activities (forme vue dans ce VSDX)
+data_mapping = {}       # shape_id -> Data (connecteurs)
+return_mapping = {}     # shape_id -> Data (retours)
 
 connectors_list = []  # On y stocke toutes les infos des connecteurs (déclenchants/nourrissants)
 
 # Ces listes sont relues par print_summary()
 link_summaries = []     # (data_name, data_type, source_name, target_name)
 rename_summaries = []   # (old_name, new_name)
+merge_summaries = []    # (nom, shape_id gardé, [shape_id des retours fusionnés])
+
+# ------------------- Cartes d'identité (préchargées) -------------------
+# Toutes les lignes Activities / Data concernées sont lues UNE fois au début
+# de l'import ; les formes sont ensuite rapprochées en mémoire. Les créations
+# et modifications restent en attente dans la session et sont écrites en un
+# seul flush (puis un commit) au lieu d'une requête + commit par forme.
+activities_by_shape = {}   # shape_id -> Activities
+activities_by_id = {}      # id -> Activities (après flush)
+data_by_shape = {}         # (shape_id, type) -> Data
+data_by_id = {}            # id -> Data (après flush)
+retours_by_name = {}       # nom -> [Data(type='Retour')]
+activities_by_name = {}    # nom -> première Activities de ce nom (retours → activité)
+deleted_data = set()       # Data supprimées pendant l'import (fusion des retours)
+new_links = []             # Liens voulus d'après les connecteurs (dicts, cf. link_sync)
+link_signatures = set()    # link_key des liens voulus
+
+# Entité importée (None : import historique, toutes les lignes sans distinction)
+import_scope = {"entity_id": None}
 
 
 def create_app():
@@ -49,11 +72,16 @@ def create_app():
 
 def process_visio_file(vsdx_path):
     """
-    1) Parcours toutes les pages / formes du VSDX
-    2) Gère creation / maj / suppression de Activities/Data + fusion retours
-    3) Vide la table 'links'
-    4) Reconstruit tous les liens depuis 'connectors_list'
-    5) Nettoie orphelins
+    Import historique (vsdx.VisioFile, sans entité). Préférer import_vsdx.
+
+    1) Précharge Activities / Data en mémoire (cartes d'identité)
+    2) Parcours toutes les pages / formes du VSDX
+    3) Gère creation / maj / suppression de Activities/Data + fusion retours
+    4) Calcule les liens voulus depuis 'connectors_list'
+    5) Aligne la table 'links' (différence ensembliste : liens inchangés gardés)
+    6) Nettoie orphelins
+    Les modifications sont écrites en un flush (ids des nouvelles formes) puis
+    un commit final : quelques requêtes au lieu de plusieurs par forme.
     """
     if not os.path.exists(vsdx_path):
         print(f"ERREUR : Fichier Visio introuvable : {vsdx_path}")
@@ -61,35 +89,78 @@ def process_visio_file(vsdx_path):
 
     print(f"INFO : Démarrage de l’import depuis {vsdx_path}")
 
-    # Réinit des globales
-    activity_mapping.clear()
-    data_mapping.clear()
-    return_mapping.clear()
-    connectors_list.clear()
-    link_summaries.clear()
-    rename_summaries.clear()
-
     # Parcours du visio
+    shapes = []
     with VisioFile(vsdx_path) as visio:
         for page in visio.pages:
             print(f"INFO : Analyse de la page : {page.name}")
-            for shape in page.all_shapes:
-                process_shape(shape)
+            shapes.extend(page.all_shapes)
+        import_shapes(shapes)
+
+
+def import_vsdx(vsdx_path, entity_id, workers=None):
+    """
+    Import d'un .vsdx pour UNE entité :
+    - pages lues en parallèle, en flux (vsdx_pages.parse_vsdx) ;
+    - formes de toutes les pages rapprochées des seules activités / données
+      de l'entité (un shape_id d'une autre entité n'est jamais touché) ;
+    - liens de l'entité reconstruits, compteurs de l'entité recalculés.
+    """
+    if not os.path.exists(vsdx_path):
+        print(f"ERREUR : Fichier Visio introuvable : {vsdx_path}")
+        return
+
+    print(f"INFO : Démarrage de l’import depuis {vsdx_path} (entity_id={entity_id})")
+    shapes = parse_vsdx(vsdx_path, workers=workers)
+    import_shapes(shapes, entity_id=entity_id)
+
+    # Écritures groupées (suppression des liens) : compteurs recalculés
+    rebuild_entity_stats([entity_id])
+
+
+def import_shapes(shapes, entity_id=None):
+    """
+    Import d'une liste de formes Visio (objets vsdx.Shape ou équivalents : ID, text, xml).
+    entity_id : limite le rapprochement, les suppressions et les liens à cette entité.
+    """
+    _reset_import_state(entity_id)
 
-    # Suppression des activités et data obsolètes
-    del_act_count = remove_activities_not_in_new_mapping()
-    del_data_count = remove_data_not_in_new_mapping()
+    try:
+        for shape in shapes:
+            process_shape(shape)
 
-    # On vide la table 'links'
-    Link.query.delete()
-    db.session.commit()
-    print("INFO : Table 'links' vidée, on va la reconstruire à partir de connectors_list...")
+        # Suppression des activités et data obsolètes
+        del_act_count = remove_activities_not_in_new_mapping()
+        del_data_count = remove_data_not_in_new_mapping()
 
-    # Reconstruire la table des liens
-    rebuild_links_from_connectors()
+        # Liens des lignes supprimées retirés d'abord (clés étrangères)
+        delete_endpoint_links(
+            activity_ids=[act.id for act in db.session.deleted if isinstance(act, Activities)],
+            data_ids=[d.id for d in db.session.deleted if isinstance(d, Data)],
+        )
 
-    # Nettoyage final orphelins
-    cleanup_orphan_links()
+        # Un seul flush : INSERT / UPDATE / DELETE groupés, ids des nouvelles lignes connus
+        db.session.flush()
+        for act in activities_by_shape.values():
+            activities_by_id[act.id] = act
+        for act in activities_by_id.values():
+            activities_by_name.setdefault(act.name, act)
+        for d in data_by_shape.values():
+            data_by_id[d.id] = d
+
+        # Liens voulus d'après connectors_list, puis différence avec ceux en base
+        # (liens de l'entité seulement si import par entité) : les liens inchangés gardent leur id
+        rebuild_links_from_connectors()
+        counts = sync_entity_links(entity_id, new_links)
+        print(f"INFO : Liens : {counts['kept']} inchangés, {counts['added']} ajoutés, {counts['removed']} supprimés")
+
+        # Nettoyage final orphelins
+        cleanup_orphan_links()
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
 
     # Récap
     print("INFO : Import terminé.")
@@ -97,6 +168,141 @@ def process_visio_file(vsdx_path):
     print(f"      Data (connecteurs/retours) totaux : {len(data_mapping)+len(return_mapping)} ; supprimés : {del_data_count}")
 
 
+def _reset_import_state(entity_id):
+    """Réinit des globales et chargement des cartes d'identité."""
+    activity_mapping.clear()
+    data_mapping.clear()
+    return_mapping.clear()
+    connectors_list.clear()
+    link_summaries.clear()
+    rename_summaries.clear()
+    merge_summaries.clear()
+    import_scope["entity_id"] = entity_id
+    load_identity_maps(entity_id)
+
+
+def plan_shapes(shapes, entity_id=None):
+    """
+    Import « à blanc » : mêmes règles que import_shapes (créations, renommages,
+    suppressions, fusion des retours), appliquées aux seules cartes d'identité.
+    Aucune écriture : les objets en attente sont abandonnés (rollback) à la fin.
+
+    Retourne {"activities", "data", "merges", "links"} où "links" est la liste
+    des liens voulus, extrémités désignées par référence :
+    {"kind": "activity" | "data", "id": ...} ou {"kind": ..., "shape_id": ...} (forme nouvelle).
+    """
+    _reset_import_state(entity_id)
+    try:
+        with db.session.no_autoflush:
+            for shape in shapes:
+                process_shape(shape)
+            remove_activities_not_in_new_mapping()
+            remove_data_not_in_new_mapping()
+
+            # Même ordre que l'import : activités existantes puis nouvelles
+            for act in list(activities_by_id.values()) + [a for a in activities_by_shape.values() if a.id is None]:
+                activities_by_name.setdefault(act.name, act)
+
+            changes = {
+                "activities": _planned_rows(activities_by_shape.values(), ("name", "is_result")),
+                "data": _planned_rows([d for d in data_by_shape.values() if d not in deleted_data], ("name",)),
+                "merges": [
+                    {"name": name, "kept_shape_id": kept, "merged_shape_ids": merged}
+                    for name, kept, merged in merge_summaries
+                ],
+                "links": [],
+            }
+            changes["activities"]["delete"] = [
+                {"id": obj.id, "shape_id": obj.shape_id, "name": _committed(obj, "name")}
+                for obj in db.session.deleted if isinstance(obj, Activities)
+            ]
+            changes["data"]["delete"] = [
+                {"id": obj.id, "shape_id": obj.shape_id, "name": _committed(obj, "name"), "type": obj.type}
+                for obj in db.session.deleted if isinstance(obj, Data)
+            ]
+
+            seen = set()
+            for c, source, target in resolved_connectors():
+                link = {
+                    "type": c["data_type"],
+                    "description": c["data_name"],
+                    "source": _object_ref(*source),
+                    "target": _object_ref(*target),
+                }
+                signature = (link["type"], link["description"],
+                             tuple(sorted(link["source"].items())), tuple(sorted(link["target"].items())))
+                if signature not in seen:
+                    seen.add(signature)
+                    changes["links"].append(link)
+    finally:
+        db.session.rollback()
+        _clear_identity_maps()
+    return changes
+
+
+def _committed(obj, attr):
+    """Valeur en base d'un attribut (avant les modifications en attente)."""
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+
+def _object_ref(kind, obj):
+    return {"kind": kind, "id": obj.id} if obj.id is not None else {"kind": kind, "shape_id": obj.shape_id}
+
+
+def _planned_rows(objects, fields):
+    """Créations et mises à jour en attente (objets des cartes d'identité)."""
+    create, update = [], []
+    for obj in objects:
+        if obj.id is None:
+            if obj in db.session.new:
+                create.append({"shape_id": obj.shape_id, **_row_values(obj)})
+            continue
+        old = {field: _committed(obj, field) for field in fields}
+        if any(old[field] != getattr(obj, field) for field in fields):
+            update.append({"id": obj.id, "shape_id": obj.shape_id, "old_name": old["name"], **_row_values(obj)})
+    return {"create": create, "update": update}
+
+
+def _row_values(obj):
+    if isinstance(obj, Activities):
+        return {"name": obj.name, "is_result": bool(obj.is_result)}
+    return {"name": obj.name, "type": obj.type, "layer": obj.layer}
+
+
+def _scoped(query, model, entity_id):
+    return query if entity_id is None else query.filter(model.entity_id == entity_id)
+
+
+def _clear_identity_maps():
+    activities_by_shape.clear()
+    activities_by_id.clear()
+    data_by_shape.clear()
+    data_by_id.clear()
+    retours_by_name.clear()
+    activities_by_name.clear()
+    deleted_data.clear()
+    new_links.clear()
+    link_signatures.clear()
+
+
+def load_identity_maps(entity_id=None):
+    """Charge les activités et données (de l'entité) en une requête chacune."""
+    _clear_identity_maps()
+
+    for act in _scoped(Activities.query, Activities, entity_id).all():
+        activities_by_id[act.id] = act
+        if act.shape_id is not None:
+            activities_by_shape.setdefault(act.shape_id, act)
+
+    for d in _scoped(Data.query, Data, entity_id).all():
+        data_by_id[d.id] = d
+        if d.shape_id is not None:
+            data_by_shape.setdefault((d.shape_id, d.type), d)
+        if d.type == "Retour":
+            retours_by_name.setdefault(d.name, []).append(d)
+
+
 def process_shape(shape):
     """Oriente selon le calque (Activity, Return, T link, N link, etc.)."""
     layer = get_layer(shape)
@@ -125,7 +331,7 @@ def add_or_update_activity(shape, is_result=False):
     if fill and fill != "1":
         is_result = True
 
-    act = Activities.query.filter_by(shape_id=key).first()
+    act = activities_by_shape.get(key)
     if act:
         changed = False
         old_name = act.name
@@ -141,14 +347,12 @@ def add_or_update_activity(shape, is_result=False):
         else:
             print(f"INFO : Activity (ID={act.id}) déjà existante, pas de modif.")
     else:
-        new_a = Activities(name=txt, is_result=is_result, shape_id=key)
-        db.session.add(new_a)
-        db.session.flush()
-        print(f"INFO : Activity créée => '{txt}' (ID={new_a.id}, shape_id={key}, is_result={is_result})")
-        act = new_a
+        act = Activities(name=txt, is_result=is_result, shape_id=key, entity_id=import_scope["entity_id"])
+        db.session.add(act)
+        activities_by_shape[key] = act
+        print(f"INFO : Activity créée => '{txt}' (shape_id={key}, is_result={is_result})")
 
-    activity_mapping[key] = act.id
-    db.session.commit()
+    activity_mapping[key] = act
 
 
 def add_or_update_return(shape):
@@ -160,22 +364,32 @@ def add_or_update_return(shape):
     key = standardize_id(shape.ID)
     txt = shape.text.strip() or "Retour sans nom"
 
-    d = Data.query.filter_by(shape_id=key, type="Retour").first()
+    d = data_by_shape.get((key, "Retour"))
+    if d is not None and d in deleted_data:
+        if d in db.session.new or d.id is None:
+            d = None
+        else:
+            # Retour existant supprimé par la fusion d'une forme lue plus tôt :
+            # on le garde (même id, shape_id unique par entité), le doublon partira
+            deleted_data.discard(d)
+            db.session.add(d)
+            retours_by_name.setdefault(d.name, []).append(d)
     if d:
         old = d.name
         if old != txt:
             d.name = txt
             rename_summaries.append((old, txt))
-            db.session.commit()
+            retours_by_name.get(old, []).remove(d)
+            retours_by_name.setdefault(txt, []).append(d)
             print(f"INFO : Return (ID={d.id}) renommé '{old}' => '{txt}'")
     else:
-        d = Data(name=txt, type="Retour", shape_id=key)
+        d = Data(name=txt, type="Retour", shape_id=key, entity_id=import_scope["entity_id"])
         db.session.add(d)
-        db.session.flush()
-        print(f"INFO : Return créé => '{txt}' (ID={d.id}, shape_id={key})")
+        data_by_shape[(key, "Retour")] = d
+        retours_by_name.setdefault(txt, []).append(d)
+        print(f"INFO : Return créé => '{txt}' (shape_id={key})")
 
-    return_mapping[key] = d.id
-    db.session.commit()
+    return_mapping[key] = d
 
     # Fusion
     unify_retours(d)
@@ -183,16 +397,17 @@ def add_or_update_return(shape):
 
 def unify_retours(d):
     """Si d’autres Data(type='Retour') ont le même .name, on supprime (sauf d)."""
-    keeper_id = d.id
-    duplicates = Data.query.filter(
-        Data.type == "Retour",
-        Data.name == d.name,
-        Data.id != keeper_id
-    ).all()
+    duplicates = [dupe for dupe in retours_by_name.get(d.name, []) if dupe is not d]
+    if duplicates:
+        merge_summaries.append((d.name, d.shape_id, [dupe.shape_id for dupe in duplicates]))
     for dupe in duplicates:
         print(f"INFO : Fusion retours => supprime Return ID={dupe.id} shape_id={dupe.shape_id}")
-        db.session.delete(dupe)
-    db.session.commit()
+        retours_by_name[d.name].remove(dupe)
+        deleted_data.add(dupe)
+        if dupe in db.session.new:
+            db.session.expunge(dupe)
+        else:
+            db.session.delete(dupe)
 
 
 def store_connector_info(shape, layer):
@@ -204,22 +419,20 @@ def store_connector_info(shape, layer):
     txt = shape.text.strip() or "Donnée sans nom"
     data_type = "déclenchante" if layer == "T link" else "nourrissante"
 
-    d = Data.query.filter_by(shape_id=key, type=data_type).first()
+    d = data_by_shape.get((key, data_type))
     if d:
         old = d.name
         if old != txt:
             d.name = txt
             rename_summaries.append((old, txt))
-            db.session.commit()
             print(f"INFO : Connector rename: (ID={d.id}) '{old}' => '{txt}'")
     else:
-        d = Data(name=txt, type=data_type, shape_id=key, layer=layer)
+        d = Data(name=txt, type=data_type, shape_id=key, layer=layer, entity_id=import_scope["entity_id"])
         db.session.add(d)
-        db.session.flush()
-        print(f"INFO : Connector créé => '{txt}' (ID={d.id}, shape_id={key})")
+        data_by_shape[(key, data_type)] = d
+        print(f"INFO : Connector créé => '{txt}' (shape_id={key})")
 
-    data_mapping[key] = d.id
-    db.session.commit()
+    data_mapping[key] = d
 
     # Récupère from_id / to_id
     conns = analyze_connections(shape)
@@ -227,7 +440,7 @@ def store_connector_info(shape, layer):
     to_id = conns.get("to_id")
 
     connectors_list.append({
-        "data_id": d.id,
+        "data": d,
         "data_name": d.name,
         "data_type": data_type,
         "from_raw": from_id,
@@ -236,40 +449,42 @@ def store_connector_info(shape, layer):
 
 
 def remove_activities_not_in_new_mapping():
-    existing_acts = Activities.query.filter(Activities.shape_id.isnot(None)).all()
     count = 0
-    for act in existing_acts:
-        if act.shape_id not in activity_mapping:
+    for key, act in list(activities_by_shape.items()):
+        if key not in activity_mapping:
             print(f"INFO : Suppression Activity '{act.name}' (ID={act.id}, shape_id={act.shape_id})")
             db.session.delete(act)
+            del activities_by_shape[key]
+            activities_by_id.pop(act.id, None)
             count += 1
-    db.session.commit()
     return count
 
 
 def remove_data_not_in_new_mapping():
-    existing_data = Data.query.filter(Data.shape_id.isnot(None)).all()
     count = 0
-    for d in existing_data:
-        sid = d.shape_id
+    for (sid, data_type), d in list(data_by_shape.items()):
+        if d in deleted_data:
+            del data_by_shape[(sid, data_type)]
+            continue
         if sid not in data_mapping and sid not in return_mapping:
             print(f"INFO : Suppression data '{d.name}' (ID={d.id}, type={d.type}, shape_id={sid})")
             db.session.delete(d)
+            del data_by_shape[(sid, data_type)]
+            deleted_data.add(d)
             count += 1
-    db.session.commit()
+    for d in deleted_data:
+        data_by_id.pop(d.id, None)
     return count
 
 
-def rebuild_links_from_connectors():
+def resolved_connectors():
     """
-    Pour chaque connecteur stocké dans connectors_list, on crée un Link
-    (source=..., target=..., description=data_name) 
-    si from/to pointent vers des entités valides (Activity ou Data).
+    Connecteurs de connectors_list reliés à leurs extrémités :
+    (connecteur, (skind, source), (tkind, cible)), source / cible = Activities | Data.
+    Connecteurs partiels, en boucle ou vers une forme inconnue ignorés.
     """
     for c in connectors_list:
-        data_id = c["data_id"]
         data_name = c["data_name"]
-        data_type = c["data_type"]
         from_raw = c["from_raw"]
         to_raw = c["to_raw"]
 
@@ -277,81 +492,63 @@ def rebuild_links_from_connectors():
             print(f"INFO : Connecteur partiel/boucle => '{data_name}', on ignore.")
             continue
 
-        (skind, sid) = resolve_visio_id(from_raw)
-        (tkind, tid) = resolve_visio_id(to_raw)
+        source = resolve_visio_object(from_raw)
+        target = resolve_visio_object(to_raw)
 
-        if not sid or not tid or sid == tid:
+        if source[1] is None or target[1] is None or source == target:
             print(f"INFO : Connecteur impossible => '{data_name}' => on ignore")
             continue
 
-        create_single_link(data_id, data_name, data_type, skind, sid, tkind, tid)
+        yield c, source, target
+
+
+def rebuild_links_from_connectors():
+    """
+    Pour chaque connecteur stocké dans connectors_list, on ajoute un lien voulu
+    (source=..., target=..., description=data_name) à new_links
+    si from/to pointent vers des entités valides (Activity ou Data).
+    """
+    for c, (skind, source), (tkind, target) in resolved_connectors():
+        create_single_link(c["data"].id, c["data_name"], c["data_type"], skind, source.id, tkind, target.id)
 
 
 def create_single_link(data_id, data_name, data_type, skind, sid, tkind, tid):
     """
-    Crée un Link reliant source(activity/data) => target(activity/data).
+    Ajoute aux liens voulus un lien source(activity/data) => target(activity/data).
+    Les liens sont écrits ensuite en une fois (sync_entity_links).
     """
     s_name = get_entity_name(sid, skind)
     t_name = get_entity_name(tid, tkind)
 
-    new_link = Link(type=data_type, description=data_name)
-
-    if skind == 'activity':
-        new_link.source_activity_id = sid
-    else:
-        new_link.source_data_id = sid
-
-    if tkind == 'activity':
-        new_link.target_activity_id = tid
-    else:
-        new_link.target_data_id = tid
-
-    # Vérif duplication
-    q = Link.query.filter_by(type=data_type, description=data_name)
-    if new_link.source_activity_id:
-        q = q.filter_by(source_activity_id=new_link.source_activity_id)
-    else:
-        q = q.filter_by(source_data_id=new_link.source_data_id)
-
-    if new_link.target_activity_id:
-        q = q.filter_by(target_activity_id=new_link.target_activity_id)
-    else:
-        q = q.filter_by(target_data_id=new_link.target_data_id)
-
-    if q.first():
+    new_link = {
+        "type": data_type,
+        "description": data_name,
+        "source_activity_id": sid if skind == 'activity' else None,
+        "source_data_id": sid if skind != 'activity' else None,
+        "target_activity_id": tid if tkind == 'activity' else None,
+        "target_data_id": tid if tkind != 'activity' else None,
+    }
+
+    # Vérif duplication (même contenu dans cette cartographie)
+    signature = link_key(new_link)
+    if signature in link_signatures:
         print(f"INFO : Lien déjà existant => {s_name} -> {t_name} (data='{data_name}') => on ignore")
         return
 
-    db.session.add(new_link)
-    db.session.flush()
+    new_links.append(new_link)
+    link_signatures.add(signature)
 
     link_summaries.append((data_name, data_type, s_name, t_name))
-    print(f"INFO : Lien créé => {s_name} -> {t_name} (data='{data_name}')")
+    print(f"INFO : Lien => {s_name} -> {t_name} (data='{data_name}')")
 
 
 def cleanup_orphan_links():
     """
-    Si un lien pointe sur un ID inexistant, on le supprime.
+    Si un lien pointe sur un ID inexistant, on le supprime :
+    un seul DELETE (anti-jointure), liens de l'entité importée seulement.
     """
-    all_links = Link.query.all()
-    removed = 0
-    for lk in all_links:
-        remove_this = False
-        if lk.source_activity_id and not Activities.query.get(lk.source_activity_id):
-            remove_this = True
-        if lk.source_data_id and not Data.query.get(lk.source_data_id):
-            remove_this = True
-        if lk.target_activity_id and not Activities.query.get(lk.target_activity_id):
-            remove_this = True
-        if lk.target_data_id and not Data.query.get(lk.target_data_id):
-            remove_this = True
-        if remove_this:
-            print(f"INFO : Suppression lien orphelin ID={lk.id}, desc='{lk.description}'")
-            db.session.delete(lk)
-            removed += 1
-
+    removed = delete_orphan_links(import_scope["entity_id"])
     if removed > 0:
-        db.session.commit()
         print(f"INFO : {removed} lien(s) orphelin(s) supprimé(s).")
 
 
@@ -392,9 +589,9 @@ def extract_shape_id(f_val):
     return None
 
 
-def resolve_visio_id(raw_id):
+def resolve_visio_object(raw_id):
     """
-    Convertit l'int 'raw_id' en (kind, db_id).
+    Convertit l'int 'raw_id' en (kind, Activities | Data).
     S'il s'agit d'un Return, on tente d'associer l'activité correspondante si possible.
     """
     if not raw_id:
@@ -406,27 +603,35 @@ def resolve_visio_id(raw_id):
     if key in data_mapping:
         return ('data', data_mapping[key])
     if key in return_mapping:
-        d_id = return_mapping[key]
-        d = Data.query.get(d_id)
-        if d and d.type.lower() == "retour":
+        d = return_mapping[key]
+        if d in deleted_data:
+            # Retour fusionné : le lien serait orphelin
+            return (None, None)
+        if d.type.lower() == "retour":
             # Chercher l'activité portant le même nom
-            same_act = Activities.query.filter_by(name=d.name).first()
-            if same_act:
-                return ('activity', same_act.id)
-        return ('data', d_id)
+            same_act = activities_by_name.get(d.name)
+            if same_act is not None:
+                return ('activity', same_act)
+        return ('data', d)
 
     return (None, None)
 
 
+def resolve_visio_id(raw_id):
+    """Convertit l'int 'raw_id' en (kind, db_id)."""
+    kind, obj = resolve_visio_object(raw_id)
+    return (kind, obj.id) if obj is not None else (None, None)
+
+
 def get_entity_name(eid, kind):
     """Renvoie .name de l’activité ou du data pour logs."""
     if not eid:
         return "??"
     if kind == 'activity':
-        a = Activities.query.get(eid)
+        a = activities_by_id.get(eid)
         return a.name if a else "activité_inconnue"
     elif kind == 'data':
-        dd = Data.query.get(eid)
+        dd = data_by_id.get(eid)
         return dd.name if dd else "data_inconnue"
     return "inconnu"
 
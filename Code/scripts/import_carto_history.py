@@ -0,0 +1,44 @@
+# Code/scripts/import_carto_history.py
+"""
+Importe les copies horodatées de static/carto_history (AAAAMMJJ_HHMMSS_nom.svg,
+déposées à la main) dans l'historique versionné d'une entité, de la plus
+ancienne à la plus récente. Les doublons ne prennent pas de place
+(contenu dédupliqué) ; les fichiers .vsdx ne sont pas repris.
+
+UTILISATION:
+    python Code/scripts/import_carto_history.py <entity_id> [--author <user_id>]
+"""
+import argparse
+import glob
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.app import app
+from Code.routes.carto_history import HISTORY_DIR, history_usage, record_version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import des copies de cartographie dans l'historique versionné")
+    parser.add_argument("entity_id", type=int)
+    parser.add_argument("--author", type=int, default=None, help="id de l'utilisateur auteur")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(HISTORY_DIR, "*.svg")))
+    if not files:
+        print(f"[HISTORY] Aucun SVG dans {HISTORY_DIR}")
+        return
+
+    with app.app_context():
+        for path in files:
+            row = record_version(args.entity_id, path, author_id=args.author, filename=os.path.basename(path))
+            print(f"  v{row.version:<4d} {os.path.basename(path):45s} {row.size_bytes:>10d} o → {row.stored_bytes:>8d} o")
+
+        usage = history_usage(args.entity_id)
+        print(f"[HISTORY] {usage['versions']} version(s) : {usage['original_bytes']} o importés, "
+              f"{usage['stored_bytes']} o stockés")
+
+
+if __name__ == "__main__":
+    main()
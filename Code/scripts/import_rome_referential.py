@@ -0,0 +1,41 @@
+# Code/scripts/import_rome_referential.py
+"""
+Importe (ou rafraîchit) le référentiel ROME 4.0 local utilisé par la
+projection métier hors ligne (Code/routes/rome_referential.py).
+
+Seules les fiches nouvelles ou dont la version a changé sont réécrites :
+relancer la commande sert de rafraîchissement.
+
+UTILISATION:
+    python Code/scripts/import_rome_referential.py --download             # API ROME (identifiants .env)
+    python Code/scripts/import_rome_referential.py --dump fiches.json     # dump JSON local (.json / .json.gz)
+    python Code/scripts/import_rome_referential.py --dump fiches.json --prune
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.app import app
+from Code.routes.rome_referential import download_referential, load_dump, referential_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import du référentiel ROME local")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--download", action="store_true", help="télécharger depuis l'API ROME")
+    source.add_argument("--dump", metavar="FICHIER", help="importer un dump JSON local")
+    parser.add_argument("--prune", action="store_true",
+                        help="avec --dump : supprimer les fiches absentes du dump")
+    args = parser.parse_args()
+
+    with app.app_context():
+        stats = download_referential() if args.download else load_dump(args.dump, prune=args.prune)
+        print("[ROME] " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+        usage = referential_stats()
+        print(f"[ROME] {usage['fiches']} fiche(s), {usage['terms']} terme(s) indexé(s)")
+
+
+if __name__ == "__main__":
+    main()
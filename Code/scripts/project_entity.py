@@ -0,0 +1,62 @@
+# Code/scripts/project_entity.py
+"""
+Projection métier de tous les collaborateurs d'une entité (cf.
+Code/routes/projection_batch.py) : recherches et fiches ROME partagées,
+résultats enregistrés et relus ensuite par la page Projection métier.
+
+Les résultats encore valides sont conservés, sauf avec --refresh.
+
+UTILISATION:
+    python Code/scripts/project_entity.py 3
+    python Code/scripts/project_entity.py 3 --mode vector --refresh
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.app import app
+from Code.routes.projection_batch import entity_user_ids, project_users
+
+
+class ConsoleProgress:
+    """Affiche les changements de phase et l'avancement tous les 10 %."""
+
+    def __init__(self):
+        self.fields = {}
+        self._phase = None
+        self._step = None
+
+    def __call__(self, force_write=False, **fields):
+        self.fields.update(fields)
+        phase, total = self.fields.get("phase"), self.fields.get("users_total", 0)
+        if phase != self._phase:
+            self._phase = phase
+            details = {k: v for k, v in fields.items() if k != "phase"}
+            print(f"[PROJECTION] {phase} " + " ".join(f"{k}={v}" for k, v in details.items()))
+        elif phase == "scoring" and total:
+            step = self.fields.get("users_done", 0) * 10 // total
+            if step != self._step:
+                self._step = step
+                print(f"[PROJECTION]   {self.fields['users_done']}/{total} utilisateurs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Projection métier de toute une entité")
+    parser.add_argument("entity_id", type=int)
+    parser.add_argument("--mode", choices=("heuristic", "vector"), default="heuristic")
+    parser.add_argument("--refresh", action="store_true", help="recalculer les résultats encore valides")
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_ids = entity_user_ids(args.entity_id)
+        if not user_ids:
+            print(f"[PROJECTION] Aucun collaborateur dans l'entité {args.entity_id}")
+            sys.exit(1)
+        stats = project_users(user_ids, mode=args.mode, refresh=args.refresh, progress=ConsoleProgress())
+        print("[PROJECTION] " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Code/scripts/rebuild_entity_stats.py
+"""
+Recalcule la table entity_stats (compteurs d'activités, rôles, utilisateurs,
+outils et liens par entité) à partir de vrais COUNT.
+
+À lancer après des écritures faites hors ORM (scripts d'import, suppressions
+groupées, modifications SQL manuelles) si les compteurs affichés dérivent.
+
+UTILISATION:
+    python Code/scripts/rebuild_entity_stats.py            # toutes les entités
+    python Code/scripts/rebuild_entity_stats.py 3 7        # entités 3 et 7
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from Code.app import app
+from Code.models.entity_stats import entities_with_stats, rebuild_entity_stats
+from Code.models.models import Entity
+
+
+def main():
+    entity_ids = [int(arg) for arg in sys.argv[1:]] or None
+
+    with app.app_context():
+        count = rebuild_entity_stats(entity_ids)
+        print(f"[STATS] {count} entité(s) recalculée(s)")
+
+        criteria = [Entity.id.in_(entity_ids)] if entity_ids else []
+        for entity, stats in entities_with_stats(*criteria):
+            print(
+                f"  {entity.id:5d} {entity.name[:40]:40s} "
+                f"activités={stats.activities_count} rôles={stats.roles_count} "
+                f"utilisateurs={stats.users_count} outils={stats.tools_count} liens={stats.links_count}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Code/scripts/rome_stub_server.py
+"""
+Faux serveur ROME local (token OAuth2, /metier/recherche, /fiche-metier)
+pour les benchmarks de projection_metier : aucune donnée réelle, aucun
+appel à France Travail.
+
+- POST /token                                   → {"access_token", "expires_in"}
+- GET  /v1/fiches-rome/metier/recherche?libelle= → 3 métiers déterministes par mot
+- GET  /v1/fiches-rome/fiche-metier?code=        → fiche avec 12 compétences
+- GET  /v1/fiches-rome/fiche-metier              → liste des CODE_SPACE fiches
+
+Les appels sont comptés par chemin (server.calls) ; delay simule la latence
+réseau de l'API (token compris). basic_auth=False refuse l'authentification
+BASIC du token (seuls les identifiants dans le body sont acceptés).
+
+seed_projection_user() crée l'utilisateur analysé par les benchmarks.
+
+UTILISATION (dans un script) :
+    server, base_url = start_stub_server(delay=0.05)
+    os.environ["ROME_BASE_URL"] = base_url
+    os.environ["ROME_TOKEN_URL"] = base_url + "/token"
+    os.environ["ROME_TOKEN_DB"] = ...  # fichier temporaire : ne pas écraser le vrai token
+    ...  # importer Code.routes.projection_metier APRÈS
+    server.shutdown()
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+COMPETENCY_WORDS = [
+    "gestion", "projet", "planification", "client", "qualité", "budget", "équipe",
+    "analyse", "données", "maintenance", "production", "sécurité", "communication",
+    "négociation", "achats", "stock", "contrôle", "formation", "reporting", "audit",
+]
+CODE_SPACE = 400
+SEARCH_RESULTS = 3
+COMPETENCIES_PER_JOB = 12
+FICHE_VERSION = "2026-01-01"
+
+
+def _digest(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16)
+
+
+def job_code(n):
+    return f"{chr(ord('A') + n % 14)}{1000 + n:04d}"
+
+
+def search_results(word):
+    base = _digest(word)
+    return [
+        {"code": job_code((base + i * 37) % CODE_SPACE), "libelle": f"Métier {(base + i * 37) % CODE_SPACE}"}
+        for i in range(SEARCH_RESULTS)
+    ]
+
+
+def job_sheet(code):
+    base = _digest(code)
+    competences = []
+    for i in range(COMPETENCIES_PER_JOB):
+        a = COMPETENCY_WORDS[(base >> (i * 3)) % len(COMPETENCY_WORDS)]
+        b = COMPETENCY_WORDS[(base >> (i * 5 + 1)) % len(COMPETENCY_WORDS)]
+        competences.append({"libelle": f"{a.capitalize()} de la {b} {i}"})
+    return {
+        "code": code,
+        "dateModification": FICHE_VERSION,
+        "metier": {"code": code, "libelle": f"Métier {code}"},
+        "groupesCompetencesMobilisees": [{"competences": competences}],
+    }
+
+
+def all_codes():
+    return [job_code(n) for n in range(CODE_SPACE)]
+
+
+def referential_dump():
+    """Référentiel complet du faux serveur (dump JSON pour rome_referential.load_dump)."""
+    return [job_sheet(code) for code in all_codes()]
+
+
+def seed_projection_user():
+    """Utilisateur de test (2 rôles, 6 activités et leurs compétences), dans le contexte applicatif courant."""
+    from Code.extensions import db
+    from Code.models.models import (
+        Activities, Competency, Role, Savoir, SavoirFaire, User, UserRole, activity_roles,
+    )
+
+    user = User(first_name="Test", last_name="Projection", email="projection@bench", password="x")
+    db.session.add(user)
+    db.session.flush()
+    for r in range(2):
+        role = Role(name=f"Rôle {r}")
+        db.session.add(role)
+        db.session.flush()
+        db.session.add(UserRole(user_id=user.id, role_id=role.id))
+        for a in range(3):
+            words = COMPETENCY_WORDS[(r * 3 + a) * 2:(r * 3 + a) * 2 + 3]
+            act = Activities(name=f"Activité {' '.join(words)}")
+            db.session.add(act)
+            db.session.flush()
+            db.session.execute(activity_roles.insert().values(activity_id=act.id, role_id=role.id, status="titulaire"))
+            db.session.add(Competency(description=f"{words[0].capitalize()} de la {words[1]}", activity_id=act.id))
+            db.session.add(Savoir(description=f"{words[1].capitalize()} et {words[2]}", activity_id=act.id))
+            db.session.add(SavoirFaire(description=f"{words[2].capitalize()} de la {words[0]}", activity_id=act.id))
+    db.session.commit()
+    return user.id
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        url = urlparse(self.path)
+        self.server.count(url.path)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if url.path == "/token" and not self.server.basic_auth and self.headers.get("Authorization"):
+            self._send(401, {"error": "invalid_client"})
+        elif url.path == "/token":
+            self._send(200, {"access_token": "stub-token", "expires_in": self.server.token_ttl})
+        else:
+            self._send(404, {"error": "not_found"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.count(url.path)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.headers.get("Authorization") != "Bearer stub-token":
+            self._send(401, {"error": "unauthorized"})
+        elif url.path.endswith("/metier/recherche"):
+            self._send(200, search_results(query.get("libelle", "")))
+        elif url.path.endswith("/fiche-metier") and "code" in query:
+            self._send(200, job_sheet(query["code"]))
+        elif url.path.endswith("/fiche-metier"):
+            self._send(200, [
+                {"code": code, "libelle": f"Métier {code}", "dateModification": FICHE_VERSION}
+                for code in all_codes()
+            ])
+        else:
+            self._send(404, {"error": "not_found"})
+
+
+class StubRomeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, token_ttl=3600, basic_auth=True):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay = delay
+        self.token_ttl = token_ttl
+        self.basic_auth = basic_auth
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, path):
+        with self._lock:
+            self.calls[path] += 1
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def start_stub_server(delay=0.0, token_ttl=3600, basic_auth=True):
+    """Démarre le faux serveur dans un thread. Retourne (serveur, URL de base)."""
+    server = StubRomeServer(delay=delay, token_ttl=token_ttl, basic_auth=basic_auth)
+    threading.Thread(target=server.serve_forever, name="rome-stub", daemon=True).start()
+    return server, server.base_url
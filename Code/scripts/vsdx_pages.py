@@ -0,0 +1,232 @@
+# Code/scripts/vsdx_pages.py
+"""
+Lecture rapide des formes d'un fichier .vsdx, page par page et en parallèle.
+
+Un .vsdx est une archive zip : chaque page est une partie XML
+(visio/pages/pageN.xml). Plutôt que de charger tout le document avec
+vsdx.VisioFile (DOM complet de toutes les pages et de tous les masters),
+chaque page est lue en flux (iterparse) dans un process séparé, qui ne
+renvoie que ce que l'import utilise : ID, texte et quelques cellules
+(LayerMember, FillPattern, BeginX, EndX). Les textes hérités d'un master
+ne sont lus qu'ensuite, pour les seuls masters référencés sans texte propre.
+
+Les formes renvoyées (ParsedShape) ont la même interface que vsdx.Shape
+pour extract_visio (ID, text, xml) et sont dans le même ordre que
+page.all_shapes (ordre du document, pages dans l'ordre de pages.xml).
+
+Ce module n'importe ni Flask ni SQLAlchemy : les process de lecture
+démarrent vite (contexte "spawn", sûr dans un serveur multi-thread).
+"""
+import multiprocessing
+import os
+import posixpath
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+
+VISIO_NS = "http://schemas.microsoft.com/office/visio/2012/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+PAGES_PART = "visio/pages/pages.xml"
+MASTERS_PART = "visio/masters/masters.xml"
+
+# Cellules lues par extract_visio : première valeur (V) gardée, comme shape.xml.find(".//Cell[@N=...]")
+FIRST_VALUE_CELLS = ("LayerMember", "FillPattern")
+# Dernière formule (F) gardée, comme la boucle de analyze_connections
+LAST_FORMULA_CELLS = ("BeginX", "EndX")
+
+VSDX_WORKERS = int(os.getenv("VSDX_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+_SHAPE_TAG = f"{{{VISIO_NS}}}Shape"
+_CELL_TAG = f"{{{VISIO_NS}}}Cell"
+_TEXT_TAG = f"{{{VISIO_NS}}}Text"
+_REL_ID_ATTR = f"{{{REL_NS}}}id"
+
+
+class ParsedShape:
+    """Forme lue dans une page : ID, text et xml (les seules cellules utiles)."""
+
+    __slots__ = ("ID", "text", "xml", "page")
+
+    def __init__(self, shape_id, text, cells, page):
+        self.ID = shape_id
+        self.text = text
+        self.page = page
+        self.xml = ET.Element(_SHAPE_TAG, ID=shape_id)
+        for name, (value, formula) in cells.items():
+            attrs = {"N": name}
+            if value is not None:
+                attrs["V"] = value
+            if formula is not None:
+                attrs["F"] = formula
+            ET.SubElement(self.xml, _CELL_TAG, attrs)
+
+
+# ============================================================
+# STRUCTURE DU PACKAGE
+# ============================================================
+def _relationships(zf, part):
+    """Id de relation -> chemin de la partie cible, pour une partie du package."""
+    folder, name = posixpath.split(part)
+    rels_part = posixpath.join(folder, "_rels", name + ".rels")
+    if rels_part not in zf.namelist():
+        return {}
+    root = ET.fromstring(zf.read(rels_part))
+    return {
+        rel.get("Id"): posixpath.normpath(posixpath.join(folder, rel.get("Target")))
+        for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship")
+    }
+
+
+def list_pages(zf):
+    """[(nom, partie XML)] dans l'ordre de pages.xml."""
+    rels = _relationships(zf, PAGES_PART)
+    pages = []
+    for page in ET.fromstring(zf.read(PAGES_PART)).iter(f"{{{VISIO_NS}}}Page"):
+        rel = page.find(f"{{{VISIO_NS}}}Rel")
+        part = rels.get(rel.get(_REL_ID_ATTR)) if rel is not None else None
+        if part:
+            pages.append((page.get("Name") or page.get("NameU") or part, part))
+    return pages
+
+
+def _master_parts(zf):
+    """ID de master -> partie XML."""
+    if MASTERS_PART not in zf.namelist():
+        return {}
+    rels = _relationships(zf, MASTERS_PART)
+    parts = {}
+    for master in ET.fromstring(zf.read(MASTERS_PART)).iter(f"{{{VISIO_NS}}}Master"):
+        rel = master.find(f"{{{VISIO_NS}}}Rel")
+        if rel is not None and rels.get(rel.get(_REL_ID_ATTR)):
+            parts[master.get("ID")] = rels[rel.get(_REL_ID_ATTR)]
+    return parts
+
+
+# ============================================================
+# LECTURE D'UNE PAGE (process de lecture)
+# ============================================================
+def _stream_shapes(fileobj):
+    """
+    Formes d'une partie XML, dans l'ordre du document :
+    [(ID, texte | None, (Master, MasterShape) | None, {cellule: (V, F)})].
+    Texte None : pas d'élément <Text> propre (texte éventuel du master).
+    """
+    shapes = []
+    open_shapes = []   # [index dans shapes]
+    elem_stack = []
+    text_depth = 0
+
+    for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            elem_stack.append(elem)
+            if tag == _SHAPE_TAG:
+                master = elem.get("Master")
+                if master is None and open_shapes:
+                    # Sous-forme : même master que la forme qui la contient
+                    parent_key = shapes[open_shapes[-1]][2]
+                    master = parent_key[0] if parent_key else None
+                master_key = (master, elem.get("MasterShape")) if master else None
+                open_shapes.append(len(shapes))
+                shapes.append([elem.get("ID"), None, master_key, {}])
+            elif tag == _TEXT_TAG:
+                text_depth += 1
+            elif tag == _CELL_TAG and open_shapes:
+                name = elem.get("N")
+                if name in FIRST_VALUE_CELLS:
+                    # Cellule d'une sous-forme comprise : .//Cell cherche dans tout le sous-arbre
+                    for index in open_shapes:
+                        shapes[index][3].setdefault(name, (elem.get("V"), None))
+                elif name in LAST_FORMULA_CELLS:
+                    for index in open_shapes:
+                        shapes[index][3][name] = (None, elem.get("F"))
+            continue
+
+        elem_stack.pop()
+        if tag == _TEXT_TAG:
+            text_depth -= 1
+            parent = elem_stack[-1] if elem_stack else None
+            if parent is not None and parent.tag == _SHAPE_TAG and open_shapes:
+                shape = shapes[open_shapes[-1]]
+                if shape[1] is None:
+                    shape[1] = "".join(elem.itertext())
+        elif tag == _SHAPE_TAG:
+            open_shapes.pop()
+
+        # Sous-arbres libérés au fil de l'eau (sauf dans un <Text>, relu à sa fermeture)
+        if not text_depth:
+            elem.clear()
+    return shapes
+
+
+def parse_page(args):
+    """Lit une page du .vsdx (exécuté dans un process de lecture)."""
+    vsdx_path, part = args
+    with zipfile.ZipFile(vsdx_path) as zf, zf.open(part) as f:
+        return _stream_shapes(f)
+
+
+def _master_texts(zf, keys):
+    """(Master, MasterShape) -> texte de la forme du master (cf. vsdx Shape.master_shape)."""
+    parts = _master_parts(zf)
+    texts = {}
+    for master_id in sorted({master for master, _ in keys}):
+        part = parts.get(master_id)
+        if not part:
+            continue
+        with zf.open(part) as f:
+            shapes = _stream_shapes(f)
+        if not shapes:
+            continue
+        by_id = {shape[0]: shape for shape in shapes}
+        for key in keys:
+            if key[0] != master_id:
+                continue
+            # Sans MasterShape : la forme de premier niveau du master
+            shape = by_id.get(key[1]) if key[1] is not None else shapes[0]
+            texts[key] = (shape[1] or "") if shape else ""
+    return texts
+
+
+# ============================================================
+# LECTURE DU FICHIER
+# ============================================================
+def parse_vsdx(vsdx_path, workers=None):
+    """
+    Formes de toutes les pages du .vsdx (ParsedShape), pages lues en parallèle.
+    workers : nombre de process (VSDX_WORKERS par défaut) ; 1 = lecture séquentielle.
+    """
+    workers = workers or VSDX_WORKERS
+    with zipfile.ZipFile(vsdx_path) as zf:
+        pages = list_pages(zf)
+
+    t0 = time.perf_counter()
+    jobs = [(vsdx_path, part) for _, part in pages]
+    if workers > 1 and len(jobs) > 1:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=context) as pool:
+            results = list(pool.map(parse_page, jobs))
+    else:
+        results = [parse_page(job) for job in jobs]
+
+    with zipfile.ZipFile(vsdx_path) as zf:
+        master_keys = {
+            shape[2] for page_shapes in results for shape in page_shapes
+            if shape[1] is None and shape[2] is not None
+        }
+        master_texts = _master_texts(zf, master_keys) if master_keys else {}
+
+    shapes = []
+    for (page_name, _), page_shapes in zip(pages, results):
+        print(f"INFO : Analyse de la page : {page_name} ({len(page_shapes)} formes)")
+        for shape_id, text, master_key, cells in page_shapes:
+            if text is None:
+                text = master_texts.get(master_key, "") if master_key else ""
+            shapes.append(ParsedShape(shape_id, text, cells, page_name))
+
+    print(f"INFO : {len(shapes)} formes lues sur {len(pages)} page(s) en {time.perf_counter() - t0:.2f} s")
+    return shapes
@@ -41,6 +41,11 @@ const ZOOM_MAX = 10;
 // Entité actuellement sélectionnée dans le gestionnaire
 let selectedEntityId = null;
 
+// Chargement par tuiles (très grandes cartographies) : null = SVG complet
+let tileState = null;
+// ?tiles=1 force le mode tuiles même pour une petite cartographie
+const FORCE_TILES = new URLSearchParams(window.location.search).get("tiles") === "1";
+
 /* ============================================================
    CENTRER LA CARTOGRAPHIE AU CHARGEMENT
 ============================================================ */
@@ -65,6 +70,7 @@ function centerCartography() {
 
   panInner.style.transform = `translate(${panX}px, ${panY}px) scale(${currentScale})`;
   updateZoomDisplay();
+  scheduleTileUpdate();
 }
 
 /* ============================================================
@@ -82,6 +88,7 @@ function applyTransform() {
   if (!panInner) return;
   panInner.style.transform = `translate(${panX}px, ${panY}px) scale(${currentScale})`;
   updateZoomDisplay();
+  scheduleTileUpdate();
 }
 
 function zoomAtPoint(delta, mouseX, mouseY) {
@@ -249,8 +256,16 @@ async function loadSvgInline() {
   }
 
   try {
-    // Charger le SVG depuis l'API
-    const svgUrl = "/activities/svg?t=" + Date.now();
+    // Très grandes cartographies : socle + tuiles visibles seulement
+    const manifest = await fetchTileManifest();
+    if (manifest && (manifest.tiled || FORCE_TILES)) {
+      await loadTiledSvg(container, manifest);
+      return;
+    }
+
+    // Charger le SVG depuis l'API (URL versionnée par le hash du contenu :
+    // le navigateur garde le SVG en cache tant qu'il ne change pas)
+    const svgUrl = "/activities/svg?v=" + encodeURIComponent(window.SVG_VERSION || "");
     console.log("[CARTO] Chargement du SVG depuis:", svgUrl);
     
     const response = await fetch(svgUrl);
@@ -284,6 +299,117 @@ async function loadSvgInline() {
   }
 }
 
+/* ============================================================
+   CHARGEMENT PAR TUILES
+   Le serveur découpe les grandes cartographies par zone et par
+   niveau de détail (/activities/svg/tiles) : on charge le socle
+   (styles, defs) puis les tuiles qui recoupent la zone visible,
+   au niveau adapté au zoom courant.
+============================================================ */
+async function fetchTileManifest() {
+  try {
+    const res = await fetch("/activities/svg/tiles", { cache: "no-store" });
+    if (!res.ok) return null;
+    return await res.json();
+  } catch (e) {
+    return null;
+  }
+}
+
+async function loadTiledSvg(container, manifest) {
+  const version = encodeURIComponent(manifest.version);
+  const response = await fetch(`/activities/svg/tiles/base?v=${version}`);
+  if (!response.ok) {
+    throw new Error(`Socle des tuiles introuvable (${response.status})`);
+  }
+
+  container.innerHTML = await response.text();
+  svgElement = container.querySelector("svg");
+  if (!svgElement) {
+    throw new Error("Pas d'élément <svg> trouvé dans le socle des tuiles");
+  }
+
+  const layer = document.createElementNS("http://www.w3.org/2000/svg", "g");
+  layer.setAttribute("id", "carto-tiles");
+  svgElement.appendChild(layer);
+
+  tileState = { manifest, layer, loaded: new Map(), level: null, timer: null };
+  console.log(`[CARTO] Mode tuiles: ${manifest.units} formes, ${manifest.levels.length} niveaux`);
+
+  setupSvg();
+}
+
+function scheduleTileUpdate() {
+  if (!tileState) return;
+  clearTimeout(tileState.timer);
+  tileState.timer = setTimeout(updateVisibleTiles, 120);
+}
+
+function updateVisibleTiles() {
+  const wrapper = document.getElementById("carto-pan-wrapper");
+  if (!tileState || !wrapper || !svgWidth) return;
+
+  const manifest = tileState.manifest;
+  const rect = wrapper.getBoundingClientRect();
+  const [vbX, vbY, vbW] = manifest.view_box;
+
+  // Niveau de détail : une tuile du niveau z couvre à peu près l'écran
+  const ratio = (currentScale * svgWidth) / Math.max(rect.width, 1);
+  const z = Math.max(0, Math.min(manifest.max_level, Math.round(Math.log2(Math.max(ratio, 1)))));
+
+  // Zone visible, en unités de la viewBox
+  const unit = vbW / svgWidth;
+  const x0 = vbX + (-panX / currentScale) * unit;
+  const y0 = vbY + (-panY / currentScale) * unit;
+  const x1 = x0 + (rect.width / currentScale) * unit;
+  const y1 = y0 + (rect.height / currentScale) * unit;
+
+  tileState.level = z;
+  Object.entries(manifest.levels[z].tiles).forEach(([key, tile]) => {
+    const [bx0, by0, bx1, by1] = tile.bounds;
+    if (bx1 < x0 || bx0 > x1 || by1 < y0 || by0 > y1) return;
+    loadTile(z, key, tile);
+  });
+
+  tileState.loaded.forEach(entry => {
+    if (entry.el) entry.el.style.display = entry.z === z ? "" : "none";
+  });
+}
+
+async function loadTile(z, key, tile) {
+  const id = `${z}/${key}`;
+  if (tileState.loaded.has(id)) return;
+
+  const entry = { z, el: null };
+  tileState.loaded.set(id, entry);
+
+  const version = encodeURIComponent(tileState.manifest.version);
+  const path = tile.backdrop ? `${z}/backdrop` : `${z}/${tile.x}/${tile.y}`;
+
+  try {
+    const res = await fetch(`/activities/svg/tiles/${path}?v=${version}`);
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+
+    const doc = new DOMParser().parseFromString(await res.text(), "image/svg+xml");
+    const el = document.importNode(doc.documentElement, true);
+    el.style.display = tileState.level === z ? "" : "none";
+
+    // Arrière-plan (couloirs, conteneurs) sous les autres tuiles
+    if (tile.backdrop) {
+      tileState.layer.insertBefore(el, tileState.layer.firstChild);
+    } else {
+      tileState.layer.appendChild(el);
+    }
+    entry.el = el;
+
+    Object.assign(SHAPE_ACTIVITY_MAP, tile.activities || {});
+    activateSvgClicks(el);
+  } catch (e) {
+    console.error(`[CARTO] Tuile ${id} non chargée:`, e);
+    tileState.loaded.delete(id);
+  }
+}
+
 /* ============================================================
    CONFIGURATION DU SVG APRÈS CHARGEMENT
 ============================================================ */
@@ -343,8 +469,8 @@ function setupSvg() {
 /* ============================================================
    ACTIVATION DES CLICS SUR LES ACTIVITÉS
 ============================================================ */
-function activateSvgClicks() {
-  if (!svgElement) {
+function activateSvgClicks(root = svgElement) {
+  if (!root) {
     console.error("[CARTO] svgElement est null");
     return;
   }
@@ -353,7 +479,7 @@ function activateSvgClicks() {
   console.log("[CARTO] SHAPE_ACTIVITY_MAP:", SHAPE_ACTIVITY_MAP);
   console.log("[CARTO] Nombre d'entrées:", Object.keys(SHAPE_ACTIVITY_MAP).length);
 
-  const allElements = svgElement.querySelectorAll("*");
+  const allElements = root.querySelectorAll("*");
   console.log("[CARTO] Éléments dans le SVG:", allElements.length);
 
   let foundMids = [];
@@ -429,7 +555,8 @@ function activateSvgClicks() {
   console.log(`[CARTO] mIDs trouvés: ${foundMids.length}`);
   console.log(`[CARTO] Activités cliquables: ${activatedCount}`);
   
-  if (activatedCount === 0 && Object.keys(SHAPE_ACTIVITY_MAP).length > 0) {
+  // (une tuile peut légitimement ne contenir aucune activité)
+  if (activatedCount === 0 && root === svgElement && Object.keys(SHAPE_ACTIVITY_MAP).length > 0) {
     console.warn("[CARTO] ⚠️ Aucune activité cliquable !");
     console.warn("[CARTO] mIDs dans SVG:", [...new Set(foundMids)].slice(0, 20));
     console.warn("[CARTO] mIDs attendus:", Object.keys(SHAPE_ACTIVITY_MAP).slice(0, 20));
@@ -506,6 +633,32 @@ function initCartoDropzone() {
   });
 }
 
+/* ============================================================
+   SUIVI DES JOBS D'ARRIÈRE-PLAN (upload / re-synchronisation)
+============================================================ */
+function formatJobProgress(job) {
+  const p = job.progress || {};
+  if (p.phase === "slim") return "Allègement de la cartographie...";
+  if (p.phase === "compress") return "Compression de la cartographie...";
+  if (p.phase === "sync") {
+    return `Synchronisation : ${p.shapes_parsed || 0} formes lues, ${p.rows_written || 0} lignes écrites`;
+  }
+  return "En attente...";
+}
+
+async function waitForJob(jobUrl, onProgress) {
+  // Interroge /activities/api/jobs/<id> jusqu'à la fin du job
+  while (true) {
+    const res = await fetch(jobUrl, { cache: "no-store" });
+    const job = await res.json();
+    if (job.error && !job.status) throw new Error(job.error);
+    if (job.status === "done") return job.result || {};
+    if (job.status === "error") throw new Error(job.error || "Échec du job");
+    if (onProgress) onProgress(job);
+    await new Promise(resolve => setTimeout(resolve, 1000));
+  }
+}
+
 async function uploadCartoFile(file, statusEl) {
   if (!file.name.toLowerCase().endsWith(".svg")) {
     statusEl.innerHTML = '<span class="status-error">❌ Format invalide - fichier SVG requis</span>';
@@ -530,8 +683,13 @@ async function uploadCartoFile(file, statusEl) {
       return;
     }
     
+    const sync = data.job_url
+      ? await waitForJob(data.job_url, job => {
+          statusEl.innerHTML = `<span class="status-loading">⏳ ${formatJobProgress(job)}</span>`;
+        })
+      : (data.sync || {});
+    
     // Afficher le résumé de la synchronisation
-    const sync = data.sync || {};
     let html = '<div class="sync-result">';
     html += '<h4>✅ Cartographie mise à jour</h4>';
     html += '<ul>';
@@ -539,6 +697,10 @@ async function uploadCartoFile(file, statusEl) {
     html += `<li>➕ Nouvelles activités: <strong>${sync.added || 0}</strong></li>`;
     html += `<li>✏️ Renommées: <strong>${sync.renamed || 0}</strong></li>`;
     html += `<li>⚠️ Supprimées du SVG: <strong>${sync.deleted_warning || 0}</strong></li>`;
+    if (sync.slim) {
+      const kb = n => Math.round(n / 1024);
+      html += `<li>🗜️ SVG allégé: <strong>${kb(sync.slim.original_bytes)} Ko → ${kb(sync.slim.slimmed_bytes)} Ko</strong> (-${sync.slim.saved_percent} %)</li>`;
+    }
     html += '</ul>';
     
     // Afficher les renommages
@@ -589,8 +751,13 @@ function initResyncButton() {
         return;
       }
 
+      const sync = data.job_url
+        ? await waitForJob(data.job_url, job => {
+            btn.textContent = "⏳ " + formatJobProgress(job);
+          })
+        : (data.sync || {});
+
       // Construire le message avec les nouvelles stats
-      const sync = data.sync || {};
       let msg = `Re-synchronisation terminée!\n\n`;
       msg += `📊 Total dans SVG: ${sync.total_in_svg || 0}\n`;
       msg += `➕ Nouvelles activités: ${sync.added || 0}\n`;
@@ -969,6 +1136,12 @@ async function uploadEntitySvg(file, status) {
       return;
     }
 
+    if (data.job_url) {
+      await waitForJob(data.job_url, job => {
+        status.innerHTML = "⏳ " + formatJobProgress(job);
+      });
+    }
+
     status.innerHTML = "✓ Cartographie installée — rechargement...";
     status.className = "dropzone-status success";
     setTimeout(() => window.location.reload(), 1200);
@@ -6,6 +6,7 @@
   const spinner = document.getElementById("spinner");
   const filterInput = document.getElementById("job-filter");
   const detailPanel = document.getElementById("job-detail-panel");
+  const loaderLabel = document.querySelector(".pm-loader-label");
 
   const fullCount = document.getElementById("full-count");
   const partialCount = document.getElementById("partial-count");
@@ -21,6 +22,7 @@
   let partialOffset = 0;
   let fullTotal = 0;
   let partialTotal = 0;
+  let currentStream = null;
 
   function showAlert(msg) {
     if (!alertBox) return;
@@ -28,6 +30,17 @@
     alertBox.style.display = msg ? "block" : "none";
   }
 
+  function showResultAge(info) {
+    if (!loaderLabel || !info?.computed_at) return;
+    const age = info.age_seconds || 0;
+    const when =
+      age < 60 ? "à l’instant" :
+      age < 3600 ? `il y a ${Math.floor(age / 60)} min` :
+      `il y a ${Math.floor(age / 3600)} h`;
+    loaderLabel.textContent =
+      info.cache === "hit" ? `Résultat enregistré, calculé ${when}.` : "Résultat calculé à l’instant.";
+  }
+
   function setLoading(isLoading) {
     if (spinner) spinner.classList.toggle("show", isLoading);
   }
@@ -258,10 +271,63 @@
     return res.json();
   }
 
-  async function initialLoad(userId) {
+  function closeStream() {
+    if (currentStream) currentStream.close();
+    currentStream = null;
+  }
+
+  // Analyse progressive (SSE) : métiers affichés au fil des fiches scorées,
+  // puis première page définitive (triée, paginée) relue depuis le résultat enregistré.
+  function streamLoad(userId) {
+    if (!window.EventSource) {
+      initialLoad(userId);
+      return;
+    }
+    closeStream();
     setLoading(true);
     showAlert("");
     clearLists();
+
+    const streamed = { full: [], partial: [] };
+    const source = new EventSource(
+      window.location.origin + `/projection_metier/analyze/${encodeURIComponent(userId)}/stream`
+    );
+    currentStream = source;
+
+    source.addEventListener("pool", (evt) => {
+      const pool = JSON.parse(evt.data);
+      if (loaderLabel) loaderLabel.textContent = `Analyse de ${pool.fiches} fiches ROME…`;
+    });
+
+    source.addEventListener("job", (evt) => {
+      if (source !== currentStream) return;
+      const { kind, job } = JSON.parse(evt.data);
+      const items = streamed[kind];
+      const list = kind === "full" ? fullList : partialList;
+      const count = kind === "full" ? fullCount : partialCount;
+      const at = items.findIndex((other) => (other.score || 0) < (job.score || 0));
+      items.splice(at < 0 ? items.length : at, 0, job);
+      if (list && ((at >= 0 && at < INITIAL_LIMIT) || items.length <= INITIAL_LIMIT)) {
+        list.innerHTML = "";
+        list.appendChild(makeList(items.slice(0, INITIAL_LIMIT), kind));
+        applyFilter();
+      }
+      if (count) count.textContent = `${Math.min(items.length, INITIAL_LIMIT)}/${items.length}`;
+    });
+
+    const finish = () => {
+      if (source !== currentStream) return;
+      closeStream();
+      initialLoad(userId);
+    };
+    source.addEventListener("summary", finish);
+    // Flux interrompu : analyse classique (résultat enregistré s'il est complet)
+    source.onerror = finish;
+  }
+
+  async function initialLoad(userId) {
+    setLoading(true);
+    showAlert("");
     try {
       const data = await fetchPage({
         userId,
@@ -270,6 +336,8 @@
         partialLim: INITIAL_LIMIT,
         partialOff: 0,
       });
+      if (userId !== currentUserId) return;
+      clearLists();
 
       const full = Array.isArray(data.full) ? data.full : [];
       const partial = Array.isArray(data.partial) ? data.partial : [];
@@ -303,6 +371,7 @@
         showAlert("Aucun métier trouvé avec les données actuelles.");
       }
 
+      showResultAge(data?.info);
       updateCounters();
       applyFilter();
     } catch (e) {
@@ -388,12 +457,13 @@
       const val = e.target.value;
       if (!val || val === "0") {
         currentUserId = null;
+        closeStream();
         clearLists();
         showAlert("");
         return;
       }
       currentUserId = val;
-      initialLoad(currentUserId);
+      streamLoad(currentUserId);
     });
   }
 